@@ -0,0 +1,395 @@
+# worker/benchmarks/run.py
+"""
+End-to-end pipeline benchmark.
+
+Generates synthetic sources with FFmpeg lavfi, uploads them to a local S3
+stand-in (moto server), and runs ``DRMProcessor.process`` against SQLite and a
+stub controller. For each scenario it reports, as JSON:
+- wall time, CPU time (worker + FFmpeg children) and peak RSS per pipeline stage
+- the per-step timings also exported on /metrics
+- scratch-disk bytes per job directory entry
+- output object count and bytes
+
+Run from the repository root:
+
+    pip install -r requirements.txt -r benchmarks/requirements.txt
+    python -m benchmarks.run --scenario 720p_60s --output before.json
+    python -m benchmarks.run --resolution 1920x1080 --duration 120 --audio 4 --subtitles 10
+
+Paid scenarios need Bento4 (mp4fragment/mp4dash) on PATH and are skipped otherwise.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("benchmarks")
+
+BUCKET = "bench"
+PIPELINE_STAGES = ("fetch", "subtitles", "transcode", "package", "upload")
+
+
+@dataclass
+class Scenario:
+    name: str
+    duration: int
+    resolution: str
+    audio_tracks: int = 0
+    subtitle_tracks: int = 0
+    is_paid: bool = False
+    package_cmaf: bool = False
+    source_audio: bool = True
+
+
+SCENARIOS = {
+    s.name: s for s in [
+        Scenario("360p_30s", 30, "640x360"),
+        Scenario("720p_60s", 60, "1280x720", audio_tracks=2, subtitle_tracks=3),
+        Scenario("1080p_120s", 120, "1920x1080", audio_tracks=4, subtitle_tracks=10),
+        Scenario("1080p_60s_paid", 60, "1920x1080", audio_tracks=2, subtitle_tracks=3, is_paid=True),
+        Scenario("1080p_60s_cmaf", 60, "1920x1080", audio_tracks=2, subtitle_tracks=3, is_paid=True, package_cmaf=True),
+    ]
+}
+
+
+# -- local stand-ins -------------------------------------------------------------
+
+class StubController:
+    """Accepts the worker's status/progress posts and counts them."""
+
+    def __init__(self):
+        self.requests: List[Dict] = []
+        controller = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                controller.requests.append({"path": self.path, "body": json.loads(body or b"{}")})
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def start_s3_server():
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+
+# -- synthetic media ---------------------------------------------------------------
+
+def _ffmpeg(*args: str) -> None:
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *args], check=True)
+
+
+def generate_sources(scenario: Scenario, media_dir: Path) -> Dict:
+    """Encode the source video, WAV audio tracks and SRT subtitles for a scenario."""
+    media_dir.mkdir(parents=True, exist_ok=True)
+    video = media_dir / "source.mp4"
+    inputs = ["-f", "lavfi", "-i", f"testsrc2=size={scenario.resolution}:rate=24:duration={scenario.duration}"]
+    if scenario.source_audio:
+        inputs += ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={scenario.duration}"]
+    _ffmpeg(
+        *inputs,
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-b:v", "8M",
+        *(["-c:a", "aac", "-b:a", "192k"] if scenario.source_audio else []),
+        "-movflags", "+faststart", str(video)
+    )
+
+    audio = []
+    for idx in range(scenario.audio_tracks):
+        path = media_dir / f"audio_{idx}.wav"
+        _ffmpeg("-f", "lavfi", "-i", f"sine=frequency={300 + 100 * idx}:sample_rate=48000:duration={scenario.duration}",
+                "-ac", "2", str(path))
+        audio.append((f"l{idx}", path))
+
+    subtitles = []
+    for idx in range(scenario.subtitle_tracks):
+        path = media_dir / f"subtitles_{idx}.srt"
+        with open(path, "w", encoding="utf-8") as f:
+            for cue, start in enumerate(range(0, scenario.duration, 3), start=1):
+                end = min(start + 2, scenario.duration)
+                f.write(f"{cue}\n00:{start // 60:02d}:{start % 60:02d},000 --> 00:{end // 60:02d}:{end % 60:02d},500\n")
+                f.write(f"Track {idx} line {cue}\n\n")
+        subtitles.append((f"s{idx}", path))
+    return {"video": video, "audio": audio, "subtitles": subtitles}
+
+
+# -- measurement -------------------------------------------------------------------
+
+def _rusage() -> Dict:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "user": own.ru_utime + children.ru_utime,
+        "system": own.ru_stime + children.ru_stime,
+        # ru_maxrss is KiB on Linux; for children it is the largest single child so far
+        "worker_rss_mb": own.ru_maxrss / 1024,
+        "child_rss_mb": children.ru_maxrss / 1024,
+    }
+
+
+def _measure(fn, results: Dict, stage: str):
+    before = _rusage()
+    started = time.monotonic()
+    try:
+        return fn()
+    finally:
+        after = _rusage()
+        results[stage] = {
+            "wall_seconds": round(time.monotonic() - started, 3),
+            "cpu_user_seconds": round(after["user"] - before["user"], 3),
+            "cpu_system_seconds": round(after["system"] - before["system"], 3),
+            "peak_worker_rss_mb": round(after["worker_rss_mb"], 1),
+            "peak_child_rss_mb": round(after["child_rss_mb"], 1),
+        }
+
+
+def make_processor(stage_results: Dict):
+    from core.processor import DRMProcessor
+
+    class InstrumentedProcessor(DRMProcessor):
+        def _stage_fetch(self):
+            return _measure(super()._stage_fetch, stage_results, "fetch")
+
+        def _stage_subtitles(self):
+            return _measure(super()._stage_subtitles, stage_results, "subtitles")
+
+        def _stage_transcode(self):
+            return _measure(super()._stage_transcode, stage_results, "transcode")
+
+        def _stage_package(self):
+            return _measure(super()._stage_package, stage_results, "package")
+
+        def _stage_upload(self):
+            return _measure(super()._stage_upload, stage_results, "upload")
+
+    return InstrumentedProcessor()
+
+
+def disk_usage(job_dir: Path) -> Dict:
+    usage = {}
+    for entry in sorted(job_dir.iterdir()):
+        files = [entry] if entry.is_file() else [p for p in entry.rglob("*") if p.is_file()]
+        usage[entry.name] = {"files": len(files), "bytes": sum(p.stat().st_size for p in files)}
+    usage["total_bytes"] = sum(v["bytes"] for v in usage.values())
+    return usage
+
+
+def s3_output_summary(s3, prefix: str) -> Dict:
+    objects, total = 0, 0
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects += 1
+            total += obj["Size"]
+    return {"objects": objects, "bytes": total}
+
+
+# -- runner ------------------------------------------------------------------------
+
+def run_scenario(scenario: Scenario, work_dir: Path, s3, credential_id: int, keep: bool) -> Dict:
+    from config.settings import settings
+    from core.database import SessionLocal
+    from core.models import AudioTrack, SubtitleTrack
+    from main import JobData
+    from services.metrics import add_stage_listener, remove_stage_listener
+
+    if scenario.is_paid and not (shutil.which("mp4fragment") and shutil.which("mp4dash")):
+        return {"scenario": asdict(scenario), "skipped": "Bento4 mp4fragment/mp4dash not on PATH"}
+
+    job_id = str(int(time.time() * 1000) % 1_000_000_000)
+    prefix = f"{scenario.name}/{uuid.uuid4().hex[:8]}"
+    media = generate_sources(scenario, work_dir / "media" / scenario.name)
+
+    s3.upload_file(str(media["video"]), BUCKET, f"{prefix}/source.mp4")
+    db = SessionLocal()
+    try:
+        for lang, path in media["audio"]:
+            s3.upload_file(str(path), BUCKET, f"{prefix}/{path.name}")
+            db.add(AudioTrack(job_id=int(job_id), language=lang, file_path=f"s3://{BUCKET}/{prefix}/{path.name}"))
+        for lang, path in media["subtitles"]:
+            s3.upload_file(str(path), BUCKET, f"{prefix}/{path.name}")
+            db.add(SubtitleTrack(job_id=int(job_id), language=lang, file_path=f"s3://{BUCKET}/{prefix}/{path.name}"))
+        db.commit()
+    finally:
+        db.close()
+
+    job = JobData(
+        job_id=job_id, content_id="bench", client_id="bench",
+        s3_input_id=str(credential_id), s3_output_id=str(credential_id),
+        is_paid=scenario.is_paid, upload_to_s3=True,
+        s3_source=f"s3://{BUCKET}/{prefix}/source.mp4",
+        s3_destination=f"s3://{BUCKET}/{prefix}/out",
+        already_transcoded=False, package_cmaf=scenario.package_cmaf
+    )
+
+    stage_results: Dict = {}
+    steps: Dict = {}
+
+    def on_step(stage: str, rung: str, seconds: float):
+        step = steps.setdefault(f"{stage}:{rung}" if rung else stage, {"count": 0, "seconds": 0.0})
+        step["count"] += 1
+        step["seconds"] = round(step["seconds"] + seconds, 3)
+
+    add_stage_listener(on_step)
+    started = time.monotonic()
+    error = None
+    try:
+        _measure(lambda: make_processor(stage_results).process(job), stage_results, "total")
+    except Exception as e:
+        error = str(e)
+        logger.exception(f"Scenario {scenario.name} failed")
+    finally:
+        remove_stage_listener(on_step)
+
+    job_dir = Path(settings.OUTPUT_DIR) / f"job_{job_id}"
+    result = {
+        "scenario": asdict(scenario),
+        "status": "failed" if error else "completed",
+        "error": error,
+        "wall_seconds": round(time.monotonic() - started, 3),
+        "stages": {stage: stage_results[stage] for stage in (*PIPELINE_STAGES, "total") if stage in stage_results},
+        "steps": steps,
+        "disk": disk_usage(job_dir) if job_dir.exists() else {},
+        "s3_output": s3_output_summary(s3, f"{prefix}/out"),
+    }
+    if not keep:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        shutil.rmtree(work_dir / "media" / scenario.name, ignore_errors=True)
+    return result
+
+
+def environment() -> Dict:
+    try:
+        ffmpeg_version = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ffmpeg_version = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version,
+        "git_commit": commit or None,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Predefined scenario (repeatable)")
+    parser.add_argument("--list", action="store_true", help="List predefined scenarios and exit")
+    parser.add_argument("--resolution", help="Ad-hoc scenario: source WxH")
+    parser.add_argument("--duration", type=int, default=60, help="Ad-hoc scenario: seconds")
+    parser.add_argument("--audio", type=int, default=0, help="Ad-hoc scenario: external audio tracks")
+    parser.add_argument("--subtitles", type=int, default=0, help="Ad-hoc scenario: subtitle tracks")
+    parser.add_argument("--paid", action="store_true", help="Ad-hoc scenario: DRM packaging")
+    parser.add_argument("--cmaf", action="store_true", help="Ad-hoc scenario: package_cmaf")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario")
+    parser.add_argument("--transcode-cache", action="store_true", help="Leave the shared transcode cache enabled")
+    parser.add_argument("--work-dir", type=Path, help="Scratch directory (default: a new temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep generated media and job directories")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here as well as to stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.list:
+        for scenario in SCENARIOS.values():
+            print(json.dumps(asdict(scenario)))
+        return 0
+
+    scenarios = [SCENARIOS[name] for name in args.scenario or []]
+    if args.resolution:
+        scenarios.append(Scenario(
+            f"custom_{args.resolution}_{args.duration}s", args.duration, args.resolution,
+            args.audio, args.subtitles, args.paid, args.cmaf
+        ))
+    if not scenarios:
+        scenarios = [SCENARIOS["360p_30s"], SCENARIOS["720p_60s"]]
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="drm-bench-"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    s3_server, s3_endpoint = start_s3_server()
+    controller = StubController()
+
+    # Settings are read at import time, so point the worker at the stand-ins first
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{work_dir / 'bench.sqlite3'}",
+        "OUTPUT_DIR": str(work_dir / "output"),
+        "CONTROLLER_API_URL": controller.url,
+        "S3_ENDPOINT_URL": s3_endpoint,
+        "AWS_ACCESS_KEY_ID": "bench", "AWS_SECRET_ACCESS_KEY": "bench",
+        "TRANSCODE_CACHE": "true" if args.transcode_cache else "false",
+        "ADMISSION_CONTROL": "false",
+        # Leave the job directory in place so its disk usage can be reported
+        "WORKSPACE_KEEP_COMPLETED": "true",
+    })
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from core.database import Base, SessionLocal, engine
+    from core.models import S3Credential
+    from services.s3_service import get_s3_client
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    credential = S3Credential(access_key="bench", secret_key="bench", region="us-east-1")
+    db.add(credential)
+    db.commit()
+    credential_id = credential.id
+    db.close()
+
+    s3 = get_s3_client("bench", "bench", "us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+
+    report = {"environment": environment(), "runs": []}
+    try:
+        for scenario in scenarios:
+            for attempt in range(args.repeat):
+                logger.warning(f"Running {scenario.name} ({attempt + 1}/{args.repeat})")
+                report["runs"].append(run_scenario(scenario, work_dir, s3, credential_id, args.keep))
+        report["controller_requests"] = len(controller.requests)
+    finally:
+        controller.stop()
+        s3_server.stop()
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output, encoding="utf-8")
+    return 1 if any(run.get("status") == "failed" for run in report["runs"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,11 +21,108 @@ class Settings:
     DB_PORT: int = int(os.getenv("DB_PORT", 3306))
     DB_NAME: str = os.getenv("DB_NAME", "drm_system")
 
-    DATABASE_URL: ClassVar[str] = f"mysql+pymysql://{os.getenv('DB_USER', 'root')}:{quote_plus(os.getenv('DB_PASSWORD', ''))}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'drm_system')}"
+    # DATABASE_URL overrides the MySQL settings (e.g. sqlite:///bench.db for benchmarks)
+    DATABASE_URL: ClassVar[str] = os.getenv("DATABASE_URL") or f"mysql+pymysql://{os.getenv('DB_USER', 'root')}:{quote_plus(os.getenv('DB_PASSWORD', ''))}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'drm_system')}"
 
 
     API_BASE_URL = os.getenv("CONTROLLER_API_URL")
     POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "10"))
-    OUTPUT_DIR: Path = Path("output")
+    OUTPUT_DIR: Path = Path(os.getenv("OUTPUT_DIR", "output"))
+
+    # Decode the source once and encode every ladder rung in the same FFmpeg process
+    TRANSCODE_SINGLE_PASS: bool = os.getenv("TRANSCODE_SINGLE_PASS", "true").lower() in ("1", "true", "yes")
+
+    # Write GOP-aligned fragmented MP4 from FFmpeg for DRM/CMAF jobs so mp4fragment can be skipped
+    TRANSCODE_FRAGMENTED_MP4: bool = os.getenv("TRANSCODE_FRAGMENTED_MP4", "true").lower() in ("1", "true", "yes")
+
+    # AAC audio ladder (stereo bitrates) and the 5.1 rendition added for multichannel sources ("" disables it)
+    AUDIO_LADDER: str = os.getenv("AUDIO_LADDER", "64k,128k,192k")
+    AUDIO_SURROUND_BITRATE: str = os.getenv("AUDIO_SURROUND_BITRATE", "384k")
+
+    # Concurrency: jobs per worker and the node-wide core budget shared by all FFmpeg processes
+    MAX_CONCURRENT_JOBS: int = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+    FFMPEG_CORE_BUDGET: int = int(os.getenv("FFMPEG_CORE_BUDGET", str(os.cpu_count() or 4)))
+    FFMPEG_PIXELS_PER_THREAD: int = int(os.getenv("FFMPEG_PIXELS_PER_THREAD", "518400"))
+
+    # Durable job queue: SQLite file, max waiting jobs before /api/run-job answers 429, Retry-After seconds
+    JOB_QUEUE_PATH: Path = Path(os.getenv("JOB_QUEUE_PATH", str(OUTPUT_DIR / "job_queue.sqlite3")))
+    JOB_QUEUE_MAX_DEPTH: int = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "32"))
+    JOB_QUEUE_RETRY_AFTER: int = int(os.getenv("JOB_QUEUE_RETRY_AFTER", "30"))
+
+    # Cost-aware admission (opt-in): jobs are admitted against a CPU budget (media seconds x renditions
+    # in flight) and free scratch disk instead of MAX_CONCURRENT_JOBS; ADMISSION_MAX_JOBS is a hard cap
+    ADMISSION_CONTROL: bool = os.getenv("ADMISSION_CONTROL", "false").lower() in ("1", "true", "yes")
+    ADMISSION_CPU_BUDGET: float = float(os.getenv("ADMISSION_CPU_BUDGET", str(4 * 3600 * 4)))
+    ADMISSION_MAX_JOBS: int = int(os.getenv("ADMISSION_MAX_JOBS", "16"))
+    ADMISSION_DEFAULT_DURATION: float = float(os.getenv("ADMISSION_DEFAULT_DURATION", "3600"))
+    ADMISSION_DISK_SAFETY_FACTOR: float = float(os.getenv("ADMISSION_DISK_SAFETY_FACTOR", "1.25"))
+    ADMISSION_DISK_RESERVE_BYTES: int = int(os.getenv("ADMISSION_DISK_RESERVE_BYTES", str(5 * 1024 ** 3)))
+    ADMISSION_OVERTAKE_WINDOW: float = float(os.getenv("ADMISSION_OVERTAKE_WINDOW", "600"))
+
+    # Lower ladder bitrates to the source bitrate (rungs above the source resolution are always dropped)
+    LADDER_CAP_TO_SOURCE_BITRATE: bool = os.getenv("LADDER_CAP_TO_SOURCE_BITRATE", "false").lower() in ("1", "true", "yes")
+
+    # MPEG-TS timestamp (90 kHz) of media time zero in segmented video, for WebVTT X-TIMESTAMP-MAP.
+    # FFmpeg's MPEG-TS muxer starts at 1.4s.
+    HLS_SUBTITLE_MPEGTS_OFFSET: int = int(os.getenv("HLS_SUBTITLE_MPEGTS_OFFSET", "126000"))
+
+    # SRT -> WebVTT conversion: bytes sampled for charset detection, tracks converted in parallel
+    SUBTITLE_DETECT_SAMPLE_BYTES: int = int(os.getenv("SUBTITLE_DETECT_SAMPLE_BYTES", str(64 * 1024)))
+    SUBTITLE_CONVERT_CONCURRENCY: int = int(os.getenv("SUBTITLE_CONVERT_CONCURRENCY", "4"))
+
+    # Controller notifications: background outbox, per-request timeout, retries with exponential backoff
+    NOTIFY_OUTBOX_SIZE: int = int(os.getenv("NOTIFY_OUTBOX_SIZE", "1000"))
+    NOTIFY_TIMEOUT: float = float(os.getenv("NOTIFY_TIMEOUT", "5"))
+    NOTIFY_RETRIES: int = int(os.getenv("NOTIFY_RETRIES", "4"))
+    NOTIFY_RETRY_BACKOFF: float = float(os.getenv("NOTIFY_RETRY_BACKOFF", "0.5"))
+    NOTIFY_FLUSH_TIMEOUT: float = float(os.getenv("NOTIFY_FLUSH_TIMEOUT", "10"))
+
+    # Content-addressed cache of transcode outputs shared across jobs (LRU byte budget). Opt-in: the
+    # cache's disk is not part of WORKSPACE_QUOTA_BYTES or the admission disk estimate
+    TRANSCODE_CACHE: bool = os.getenv("TRANSCODE_CACHE", "false").lower() in ("1", "true", "yes")
+    TRANSCODE_CACHE_DIR: Path = Path(os.getenv("TRANSCODE_CACHE_DIR", str(OUTPUT_DIR / "transcode_cache")))
+    TRANSCODE_CACHE_MAX_BYTES: int = int(os.getenv("TRANSCODE_CACHE_MAX_BYTES", str(50 * 1024 ** 3)))
+
+    # Job scratch space: node quota for job_<id>/ directories (0 = unlimited, finished jobs are removed
+    # oldest first above it), deleting intermediates once their last consumer stage is done, keeping
+    # directories of uploaded jobs, and an optional tmpfs directory for subtitles
+    WORKSPACE_QUOTA_BYTES: int = int(os.getenv("WORKSPACE_QUOTA_BYTES", "0"))
+    WORKSPACE_EARLY_CLEANUP: bool = os.getenv("WORKSPACE_EARLY_CLEANUP", "true").lower() in ("1", "true", "yes")
+    WORKSPACE_KEEP_COMPLETED: bool = os.getenv("WORKSPACE_KEEP_COMPLETED", "false").lower() in ("1", "true", "yes")
+    WORKSPACE_TMPFS_DIR = os.getenv("WORKSPACE_TMPFS_DIR") or None
+
+    # Limits pre-transcoded renditions must meet to be packaged without re-encoding (level 42 = 4.2)
+    PRETRANSCODED_MAX_LEVEL: int = int(os.getenv("PRETRANSCODED_MAX_LEVEL", "42"))
+    PRETRANSCODED_MAX_GOP_SECONDS: float = float(os.getenv("PRETRANSCODED_MAX_GOP_SECONDS", "6"))
+
+    # Number of ffprobe results kept in memory, keyed by (path, size, mtime)
+    PROBE_CACHE_SIZE: int = int(os.getenv("PROBE_CACHE_SIZE", "256"))
+
+    # Concurrent S3 downloads when fetching a job's video, audio and subtitle assets
+    S3_DOWNLOAD_CONCURRENCY: int = int(os.getenv("S3_DOWNLOAD_CONCURRENCY", "4"))
+    # Seconds a cached S3 credential row / boto3 client is reused before re-reading the DB
+    S3_CLIENT_CACHE_TTL: int = int(os.getenv("S3_CLIENT_CACHE_TTL", "900"))
+
+    # Optional S3-compatible endpoint (MinIO, moto server) instead of AWS
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+    # Feed faststart sources and WAV tracks to ffmpeg through presigned URLs instead of downloading them
+    STREAM_S3_INPUT: bool = os.getenv("STREAM_S3_INPUT", "false").lower() in ("1", "true", "yes")
+    S3_PRESIGNED_URL_EXPIRY: int = int(os.getenv("S3_PRESIGNED_URL_EXPIRY", str(12 * 3600)))
+
+    # Bulk upload: parallel files, multipart tuning for large files and per-file retries
+    S3_UPLOAD_CONCURRENCY: int = int(os.getenv("S3_UPLOAD_CONCURRENCY", "16"))
+    S3_MULTIPART_THRESHOLD: int = int(os.getenv("S3_MULTIPART_THRESHOLD", str(16 * 1024 * 1024)))
+    S3_MULTIPART_CHUNKSIZE: int = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(16 * 1024 * 1024)))
+    S3_MULTIPART_CONCURRENCY: int = int(os.getenv("S3_MULTIPART_CONCURRENCY", "8"))
+    S3_UPLOAD_RETRIES: int = int(os.getenv("S3_UPLOAD_RETRIES", "3"))
+    S3_UPLOAD_RETRY_BACKOFF: float = float(os.getenv("S3_UPLOAD_RETRY_BACKOFF", "1.0"))
+    S3_MAX_POOL_CONNECTIONS: int = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+
+    # Upload finished segments while packaging is still running; manifests are committed last. Clear
+    # HLS jobs only: DRM and CMAF packaging (mp4dash on-demand) writes each rendition as one file
+    STREAMING_UPLOAD: bool = os.getenv("STREAMING_UPLOAD", "false").lower() in ("1", "true", "yes")
+    STREAMING_UPLOAD_POLL_INTERVAL: float = float(os.getenv("STREAMING_UPLOAD_POLL_INTERVAL", "2"))
+    STREAMING_UPLOAD_SETTLE_SECONDS: float = float(os.getenv("STREAMING_UPLOAD_SETTLE_SECONDS", "2"))
 
 settings = Settings()
@@ -0,0 +1,171 @@
+# worker/core/admission.py
+import logging
+import shutil
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from config.settings import settings
+from core.database import SessionLocal
+from services.ffmpeg_service import audio_ladder, bitrate_to_bps, select_ladder
+from services.probe import probe
+from services.s3_service import get_cached_s3_client
+
+logger = logging.getLogger(__name__)
+
+# Relative CPU cost of packaging on top of the ladder encode
+PAID_PACKAGING_FACTOR = 1.3   # mp4fragment + mp4dash encryption
+FREE_PACKAGING_FACTOR = 1.1   # HLS segmenting (stream copy)
+
+
+class AdmissionError(Exception):
+    """A job can never be admitted on this node (e.g. it needs more scratch disk than exists)."""
+
+
+@dataclass
+class JobCost:
+    duration: float
+    renditions: int
+    source_bytes: int
+    cpu_units: float   # media seconds x renditions x packaging factor
+    disk_bytes: int    # predicted peak scratch usage under OUTPUT_DIR
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def estimate_job_cost(payload: Dict) -> JobCost:
+    """
+    Predict a job's encode work and scratch-disk footprint before it starts.
+
+    Duration is probed from a presigned URL (ffprobe only reads the header) and the
+    source size comes from HeadObject. When S3 can't be reached the configured
+    default duration is assumed so the job is still admitted conservatively.
+    """
+    parsed = urlparse(payload["s3_source"])
+    bucket, key = parsed.netloc, parsed.path.lstrip("/")
+    duration = float(settings.ADMISSION_DEFAULT_DURATION)
+    source_bytes = 0
+    source = None
+
+    db = SessionLocal()
+    try:
+        s3 = get_cached_s3_client(payload["s3_input_id"], db)
+        source_bytes = s3.head_object(Bucket=bucket, Key=key).get("ContentLength", 0)
+        url = s3.generate_presigned_url("get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=600)
+        source = probe(url)
+        duration = source.duration or duration
+    except Exception as e:
+        logger.warning(f"Could not probe {payload['s3_source']} for admission, assuming {duration:.0f}s: {e}")
+    finally:
+        db.close()
+
+    ladder = select_ladder(source, payload.get("ladder"))
+    renditions = len(ladder)
+    cmaf = payload.get("package_cmaf", False)
+    packaging = PAID_PACKAGING_FACTOR if payload.get("is_paid") or cmaf else FREE_PACKAGING_FACTOR
+    # Rungs are video-only and share one audio ladder
+    audio_bps = sum(bitrate_to_bps(params[params.index("-b:a") + 1]) for params in audio_ladder(source).values())
+    ladder_bps = sum(bitrate_to_bps(s["bitrate"]) for s in ladder) + audio_bps
+    ladder_bytes = int(ladder_bps * duration / 8)
+    # transcoded ladder + packaged copy (+ fragmented copy for paid jobs), plus the source itself;
+    # CMAF jobs package the shared fragments once per published tree
+    copies = 3 if payload.get("is_paid") or cmaf else 2
+    if cmaf and payload.get("is_paid"):
+        copies += 1
+    if (payload.get("is_paid") or cmaf) and settings.TRANSCODE_FRAGMENTED_MP4 and not payload.get("already_transcoded"):
+        copies -= 1  # FFmpeg writes the fragments itself; they are hard-linked, not rewritten
+    disk_bytes = int((source_bytes + ladder_bytes * copies) * settings.ADMISSION_DISK_SAFETY_FACTOR)
+    # Pre-transcoded renditions are only repackaged (stream copy), not encoded per rung
+    cpu_units = duration * packaging if payload.get("already_transcoded") else duration * renditions * packaging
+
+    return JobCost(
+        duration=duration,
+        renditions=renditions,
+        source_bytes=source_bytes,
+        cpu_units=cpu_units,
+        disk_bytes=disk_bytes
+    )
+
+
+class AdmissionController:
+    """
+    Admits jobs against a CPU budget (media-seconds x renditions in flight) and the
+    free space under ``settings.OUTPUT_DIR`` instead of a fixed job count.
+
+    A job larger than the whole CPU budget is admitted only when nothing else runs.
+    When a job doesn't fit on disk, ``reclaim(bytes, job_id)`` (if given) is asked to
+    free space, e.g. by removing workspaces of finished jobs other than ``job_id``'s,
+    before the job is deferred.
+    """
+
+    def __init__(self, cpu_budget: float, disk_reserve_bytes: int, output_dir: Path,
+                 reclaim: Optional[Callable[[int, str], int]] = None):
+        self.cpu_budget = cpu_budget
+        self.disk_reserve_bytes = disk_reserve_bytes
+        self.output_dir = Path(output_dir)
+        self.reclaim = reclaim
+        self._lock = threading.Lock()
+        self._estimates: Dict[str, JobCost] = {}
+        self._admitted: Dict[str, JobCost] = {}
+
+    def estimate(self, job_id: str, payload: Dict) -> JobCost:
+        cost = self._estimates.get(job_id)
+        if cost is None:
+            cost = estimate_job_cost(payload)
+            self._estimates[job_id] = cost
+            logger.info(
+                f"Job {job_id} estimate: {cost.duration:.0f}s x {cost.renditions} renditions, "
+                f"{cost.cpu_units:.0f} cpu units, {cost.disk_bytes / 1e9:.2f} GB scratch"
+            )
+        return cost
+
+    def _free_disk_bytes(self) -> int:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        return shutil.disk_usage(self.output_dir).free
+
+    def try_admit(self, job_id: str, payload: Dict) -> bool:
+        """
+        Reserve CPU and disk for a job if both budgets allow it.
+
+        Raises:
+            AdmissionError: If the job doesn't fit on disk even with nothing else running.
+        """
+        cost = self.estimate(job_id, payload)
+        with self._lock:
+            cpu_in_flight = sum(c.cpu_units for c in self._admitted.values())
+            disk_reserved = sum(c.disk_bytes for c in self._admitted.values())
+            disk_available = self._free_disk_bytes() - self.disk_reserve_bytes - disk_reserved
+            if cost.disk_bytes > disk_available and self.reclaim is not None:
+                if self.reclaim(cost.disk_bytes - disk_available, job_id):
+                    disk_available = self._free_disk_bytes() - self.disk_reserve_bytes - disk_reserved
+
+            if cost.disk_bytes > disk_available:
+                if not self._admitted:
+                    raise AdmissionError(
+                        f"Job {job_id} needs {cost.disk_bytes / 1e9:.2f} GB scratch, "
+                        f"only {max(disk_available, 0) / 1e9:.2f} GB free under {self.output_dir}"
+                    )
+                return False
+            if self._admitted and cpu_in_flight + cost.cpu_units > self.cpu_budget:
+                return False
+
+            self._admitted[job_id] = cost
+        logger.info(f"Admitted job {job_id} ({len(self._admitted)} running, {cpu_in_flight + cost.cpu_units:.0f}/{self.cpu_budget:.0f} cpu units)")
+        return True
+
+    def release(self, job_id: str) -> None:
+        with self._lock:
+            self._admitted.pop(job_id, None)
+        self._estimates.pop(job_id, None)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "cpu_budget": self.cpu_budget,
+                "cpu_in_flight": sum(c.cpu_units for c in self._admitted.values()),
+                "disk_reserved_bytes": sum(c.disk_bytes for c in self._admitted.values()),
+                "admitted": {job_id: cost.as_dict() for job_id, cost in self._admitted.items()}
+            }
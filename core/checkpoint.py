@@ -0,0 +1,188 @@
+# worker/core/checkpoint.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "checkpoint.json"
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+# Outputs up to this size (playlists, MPDs, subtitles, keys) are hashed when recorded; media files are
+# fingerprinted by size and mtime, and hashed only when their content hash is asked for
+HASH_MAX_BYTES = 1024 * 1024
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def digest_of(value: Any) -> str:
+    """Stable hash of a JSON-serialisable value."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _expand(paths: List[str]) -> List[Path]:
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.is_file()))
+        else:
+            files.append(path)
+    return files
+
+
+class JobCheckpoint:
+    """
+    Manifest of completed pipeline stages in ``job_<id>/checkpoint.json``.
+
+    Each stage records the key of the inputs it was built from, a size/mtime
+    fingerprint of every output file (plus a sha256 of small ones), and the data
+    later stages need (paths, duration...). A stage is reusable while its inputs
+    key is unchanged and every output still matches its fingerprint.
+    """
+
+    def __init__(self, job_dir: Path):
+        self.job_dir = Path(job_dir)
+        self.path = self.job_dir / CHECKPOINT_FILE
+        self.stages: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            try:
+                self.stages = json.loads(self.path.read_text(encoding="utf-8")).get("stages", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps({"stages": self.stages}, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def digest(self, stage: str) -> Optional[str]:
+        """Identity of a completed stage's result, used in the inputs key of the stages after it."""
+        record = self.stages.get(stage)
+        return record["digest"] if record else None
+
+    def data(self, stage: str) -> Dict:
+        return self.stages.get(stage, {}).get("data", {})
+
+    def _path(self, rel_path: str) -> Path:
+        return self.job_dir / rel_path if not os.path.isabs(rel_path) else Path(rel_path)
+
+    def _rel_path(self, path: Path) -> str:
+        resolved = Path(path).resolve()
+        try:
+            return str(resolved.relative_to(self.job_dir.resolve()))
+        except ValueError:
+            return str(resolved)
+
+    def file_sha256(self, stage: str, path: str) -> Optional[str]:
+        """
+        Content hash of one of a stage's output files, if it has one. Large files are
+        hashed on first request (while they still match their fingerprint) and remembered.
+        """
+        rel_path = self._rel_path(Path(path))
+        record = self.stages.get(stage, {}).get("outputs", {}).get(rel_path)
+        if record is None:
+            return None
+        if record.get("sha256"):
+            return record["sha256"]
+        file_path = self._path(rel_path)
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (record["size"], record["mtime_ns"]):
+            return None
+        sha256 = sha256_file(file_path)
+        with self._lock:
+            record["sha256"] = sha256
+            self._save()
+        return sha256
+
+    def output_paths(self, stage: str) -> List[Path]:
+        """Files recorded as a stage's outputs."""
+        outputs = self.stages.get(stage, {}).get("outputs", {})
+        return [self._path(rel_path) for rel_path in outputs]
+
+    def outputs_intact(self, stage: str) -> bool:
+        record = self.stages.get(stage)
+        if record is None:
+            return False
+        for rel_path, expected in record["outputs"].items():
+            path = self._path(rel_path)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                logger.info(f"Checkpoint '{stage}': {path} is missing")
+                return False
+            if stat.st_size != expected["size"]:
+                logger.info(f"Checkpoint '{stage}': {path} changed size")
+                return False
+            # A touched file is only re-read when there is a hash to compare against
+            if stat.st_mtime_ns != expected["mtime_ns"] and (
+                not expected.get("sha256") or sha256_file(path) != expected["sha256"]
+            ):
+                logger.info(f"Checkpoint '{stage}': {path} content changed")
+                return False
+        return True
+
+    def is_valid(self, stage: str, inputs_key: str) -> bool:
+        record = self.stages.get(stage)
+        if record is None or record["inputs_key"] != inputs_key:
+            return False
+        if record.get("expires_at") and record["expires_at"] < time.time():
+            return False
+        return self.outputs_intact(stage)
+
+    def record(self, stage: str, inputs_key: str, outputs: List[str], data: Optional[Dict] = None,
+               identity: Any = None, valid_for: Optional[float] = None) -> str:
+        """
+        Mark a stage complete.
+
+        Args:
+            outputs: Files or directories the stage produced (directories are expanded).
+            data: JSON-serialisable values restored when the stage is skipped.
+            identity: Extra stable values folded into the stage digest, for results that
+                are not files (e.g. streamed S3 sources).
+            valid_for: Seconds after which the record is stale (e.g. presigned URLs).
+        """
+        fingerprints = {}
+        for path in _expand(outputs):
+            stat = path.stat()
+            fingerprints[self._rel_path(path)] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256_file(path) if stat.st_size <= HASH_MAX_BYTES else None,
+            }
+
+        digest = digest_of({
+            "inputs_key": inputs_key,
+            "outputs": {p: f["sha256"] or f"{f['size']}:{f['mtime_ns']}" for p, f in fingerprints.items()},
+            "identity": identity
+        })
+        with self._lock:
+            self.stages[stage] = {
+                "inputs_key": inputs_key,
+                "digest": digest,
+                "outputs": fingerprints,
+                "data": data or {},
+                "completed_at": time.time(),
+                "expires_at": time.time() + valid_for if valid_for else None
+            }
+            self._save()
+        logger.info(f"✔️ Checkpoint '{stage}' recorded ({len(fingerprints)} files)")
+        return digest
+
+    def invalidate(self, stage: str) -> None:
+        with self._lock:
+            if self.stages.pop(stage, None) is not None:
+                self._save()
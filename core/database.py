@@ -5,7 +5,9 @@ from sqlalchemy.orm import sessionmaker
 from config.settings import settings
 
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+# SQLite sessions are used from the job queue's worker threads
+connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
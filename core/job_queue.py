@@ -0,0 +1,274 @@
+# worker/core/job_queue.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised by enqueue() when the queue is at its configured depth."""
+
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Job queue is full ({depth} jobs waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class QueueUnavailableError(Exception):
+    """Raised by enqueue() when the queue is not accepting work (not started or shutting down)."""
+
+
+class JobQueue:
+    """
+    Durable FIFO of worker jobs backed by SQLite.
+
+    Jobs are persisted before they are acknowledged, so a restart resumes every
+    job that was queued or running. A dispatcher thread hands jobs to a bounded
+    thread pool. With an ``admission`` controller, each job must also fit the
+    node's CPU and disk budgets; smaller jobs may overtake a waiting head job for
+    up to ``overtake_window`` seconds. An unexpected error while dispatching (a
+    locked database, a failing admission estimate) is logged and retried after
+    ``dispatch_backoff`` seconds instead of stopping the dispatcher.
+    """
+
+    def __init__(self, db_path: str, handler: Callable[[Dict], None], max_depth: int,
+                 max_workers: int, retry_after: int = 30, poll_interval: float = 1.0,
+                 admission=None, overtake_window: float = 0, on_rejected: Optional[Callable[[str, str], None]] = None,
+                 dispatch_backoff: float = 5.0):
+        self.db_path = Path(db_path)
+        self.handler = handler
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+        self.admission = admission
+        self.overtake_window = overtake_window
+        self.on_rejected = on_rejected
+        self.dispatch_backoff = dispatch_backoff
+
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._running = 0
+        self._accepting = False
+        self._dispatcher: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    error TEXT
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, enqueued_at)")
+
+    # -- persistence helpers -------------------------------------------------
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job.pop("payload", None)
+        return job
+
+    def depth(self) -> int:
+        """Number of jobs waiting to start."""
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (QUEUED,))[0][0]
+
+    def pending_ids(self) -> List[str]:
+        """Jobs that are queued or running, including ones interrupted by a restart."""
+        return [row[0] for row in self._execute("SELECT job_id FROM jobs WHERE state IN (?, ?)", (QUEUED, RUNNING))]
+
+    def running_count(self) -> int:
+        with self._cond:
+            return self._running
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        rows = self._execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        if not rows:
+            return None
+        job = self._row_to_dict(rows[0])
+        if job["state"] == QUEUED:
+            ahead = self._execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND enqueued_at < ?", (QUEUED, job["enqueued_at"])
+            )[0][0]
+            job["position"] = ahead + 1
+        return job
+
+    # -- public API ----------------------------------------------------------
+
+    def enqueue(self, job_id: str, payload: Dict) -> Dict:
+        """
+        Persist a job and wake the dispatcher.
+
+        Re-submitting a job that is already queued or running is a no-op; a finished
+        job is queued again.
+
+        Raises:
+            QueueFullError: If ``max_depth`` jobs are already waiting.
+            QueueUnavailableError: If the queue is not started.
+        """
+        if not self._accepting:
+            raise QueueUnavailableError("Job queue is not accepting jobs")
+        with self._cond:
+            existing = self.get(job_id)
+            if existing and existing["state"] in (QUEUED, RUNNING):
+                logger.info(f"Job {job_id} is already {existing['state']}, ignoring duplicate submission")
+                return existing
+            depth = self.depth()
+            if depth >= self.max_depth:
+                raise QueueFullError(depth, self.retry_after)
+            self._execute(
+                """
+                INSERT INTO jobs (job_id, payload, state, attempts, enqueued_at)
+                VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT(job_id) DO UPDATE SET
+                    payload = excluded.payload, state = excluded.state, enqueued_at = excluded.enqueued_at,
+                    started_at = NULL, finished_at = NULL, error = NULL
+                """,
+                (job_id, json.dumps(payload), QUEUED, time.time())
+            )
+            self._cond.notify_all()
+        logger.info(f"📥 Queued job {job_id} (depth {depth + 1}/{self.max_depth})")
+        return self.get(job_id)
+
+    def start(self) -> None:
+        """Recover interrupted jobs and start dispatching."""
+        interrupted = self._execute("SELECT job_id FROM jobs WHERE state = ?", (RUNNING,))
+        if interrupted:
+            self._execute("UPDATE jobs SET state = ?, started_at = NULL WHERE state = ?", (QUEUED, RUNNING))
+            logger.info(f"Re-queued {len(interrupted)} jobs interrupted by a restart")
+        logger.info(f"Job queue started with {self.depth()} queued jobs")
+
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._dispatcher.start()
+        self._accepting = True
+
+    def stop(self) -> None:
+        """Stop accepting and dispatching. Running jobs stay 'running' and are resumed on the next start."""
+        self._accepting = False
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._dispatcher:
+            self._dispatcher.join()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    # -- dispatching -----------------------------------------------------------
+
+    def _queued_jobs(self) -> List[sqlite3.Row]:
+        return self._execute("SELECT * FROM jobs WHERE state = ? ORDER BY enqueued_at", (QUEUED,))
+
+    def _can_start(self, job: sqlite3.Row) -> bool:
+        """Admission hook: without a controller any job may start while a worker slot is free."""
+        if self.admission is None:
+            return True
+        return self.admission.try_admit(job["job_id"], json.loads(job["payload"]))
+
+    def _reject(self, job_id: str, reason: str) -> None:
+        logger.error(f"Job {job_id} rejected: {reason}")
+        self._execute(
+            "UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE job_id = ?",
+            (FAILED, time.time(), reason, job_id)
+        )
+        if self.admission is not None:
+            self.admission.release(job_id)
+        if self.on_rejected:
+            self.on_rejected(job_id, reason)
+
+    def _next_job(self) -> Optional[sqlite3.Row]:
+        queued = self._queued_jobs()
+        if not queued:
+            return None
+        head_waited = time.time() - queued[0]["enqueued_at"]
+        allow_overtake = self.admission is not None and head_waited < self.overtake_window
+        for job in queued:
+            try:
+                if self._can_start(job):
+                    return job
+            except Exception as e:
+                self._reject(job["job_id"], str(e))
+                continue
+            if not allow_overtake:
+                return None  # FIFO: later jobs wait behind the head
+        return None
+
+    def _dispatch_once(self) -> None:
+        # Admission may probe S3, so it runs without holding the condition lock;
+        # only this thread moves jobs from queued to running.
+        job = self._next_job() if self.running_count() < self.max_workers else None
+        with self._cond:
+            if job is None:
+                self._cond.wait(self.poll_interval)
+                return
+            self._running += 1
+            try:
+                self._execute(
+                    "UPDATE jobs SET state = ?, started_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+                    (RUNNING, time.time(), job["job_id"])
+                )
+            except Exception:
+                self._running -= 1
+                if self.admission is not None:
+                    self.admission.release(job["job_id"])
+                raise
+        self._executor.submit(self._run, job["job_id"], json.loads(job["payload"]))
+
+    def _dispatch_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._dispatch_once()
+            except Exception as e:
+                # e.g. "database is locked" or a failing admission estimate: keep dispatching
+                logger.exception(f"Job dispatch failed, retrying in {self.dispatch_backoff:g}s: {e}")
+                self._stop.wait(self.dispatch_backoff)
+
+    def _run(self, job_id: str, payload: Dict) -> None:
+        try:
+            self.handler(payload)
+            self._execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, error = NULL WHERE job_id = ?",
+                (COMPLETED, time.time(), job_id)
+            )
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self._execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE job_id = ?",
+                (FAILED, time.time(), str(e)[:2000], job_id)
+            )
+        finally:
+            if self.admission is not None:
+                self.admission.release(job_id)
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
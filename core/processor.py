@@ -1,159 +1,108 @@
 # worker/core/processor.py
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from config.settings import settings
-from services.s3_service import download_from_s3, upload_to_s3
+from services.s3_service import download_many_from_s3, upload_to_s3, is_s3_object_faststart, list_s3_objects
 from core.database import get_db
-from services.ffmpeg_service import transcode_video, transcode_audio
+from core.checkpoint import JobCheckpoint, digest_of
+from core.progress import track_job, untrack_job
+from core.workspace import workspace_manager
+from services.ffmpeg_service import (
+    transcode_video, transcode_audio, transcode_plan, audio_ladder, audio_transcode_params, has_audio_stream,
+    ProgressAggregator, MAIN_AUDIO_LANGUAGE
+)
+from services.probe import probe
+from services.transcode_cache import transcode_cache
+from services.pretranscoded import prepare_renditions, top_rendition
 from services.drm_service import DRMService
-from services.notify_controller import update_status, update_progress
+from services.notify_controller import update_status, update_progress, flush_notifications
 from services.email_service import send_email_report
+from services.segment_uploader import SegmentUploader
+from services.metrics import JOBS_TOTAL
 from services.video_utils import get_video_duration, convert_srt_to_vtt_batch
 import shutil
 from core.models import AudioTrack, SubtitleTrack
 
 logger = logging.getLogger(__name__)
 
+# Stages and the stages whose results they consume. A retried job skips every
+# stage whose checkpoint is still valid and re-runs only what is stale.
+STAGE_DEPENDENCIES = {
+    "fetch": [],
+    "subtitles": ["fetch"],
+    "transcode": ["fetch"],
+    "package": ["subtitles", "transcode"],
+    "upload": ["package"],
+}
+
+
 class DRMProcessor:
     def process(self, job):
         job_id = job.job_id
+        workspace = None
+        completed = False
+        self.segment_uploaders = []
 
         try:
             update_status(job_id, "processing")
-            input_s3_url = job.s3_source
-            output_s3_url = job.s3_destination
-            input_credential_id = job.s3_input_id
-            output_credential_id = job.s3_output_id or job.s3_input_id
+            self.job = job
+            self.input_s3_url = job.s3_source
+            self.output_s3_url = job.s3_destination
+            self.input_credential_id = job.s3_input_id
+            self.output_credential_id = job.s3_output_id or job.s3_input_id
 
-            output_dir = Path(settings.OUTPUT_DIR) / f"job_{job_id}"
-            output_dir.mkdir(parents=True, exist_ok=True)
+            workspace = workspace_manager.open(job_id)
+            self.workspace = workspace
+            output_dir = workspace.root
+            self.output_dir = output_dir
 
-            local_input = output_dir / "input.mp4"
-            subtitle_dir = output_dir / "subtitles"
-            subtitle_dir.mkdir(parents=True, exist_ok=True)
-            transcoding_dir = output_dir / "transcoded"
-            transcoding_dir.mkdir(parents=True, exist_ok=True)
+            self.local_input = output_dir / "input.mp4"
+            # Subtitles are small and read repeatedly; they live on tmpfs when one is configured
+            self.subtitle_dir = workspace.dir("subtitles", small=True)
+            self.transcoding_dir = workspace.dir("transcoded")
 
             db = next(get_db())
+            self.db = db
 
-            # Step 1: Download input and associated files
-            update_progress(job_id, 10)
-            logger.info(f"Downloading video from {input_s3_url}")
-            download_from_s3(str(input_s3_url), str(local_input), input_credential_id, db)
-            if not local_input.exists() or local_input.stat().st_size == 0:
-                raise FileNotFoundError(f"Downloaded input.mp4 not found or empty: {local_input}")
-
-            video_duration = get_video_duration(str(local_input))
-
-            audio_tracks = db.query(AudioTrack).filter(AudioTrack.job_id == job_id).all()
-            audio_files = []
-            for track in audio_tracks:
-                local_audio_path = output_dir / f"{track.language}.wav"
-                logger.info(f"Downloading audio from {track.file_path}")
-                download_from_s3(track.file_path, str(local_audio_path), input_credential_id, db)
-                if not local_audio_path.exists() or local_audio_path.stat().st_size == 0:
-                    logger.warning(f"Audio track missing or empty: {local_audio_path}")
-                    continue
-                audio_files.append({"file_path": str(local_audio_path), "language": track.language})
-            if not audio_files:
-                logger.info("No external audio tracks found, relying on default audio in video.")
-
-            subtitle_tracks = db.query(SubtitleTrack).filter(SubtitleTrack.job_id == job_id).all()
-            subtitle_files = []
-            for track in subtitle_tracks:
-                local_subtitle_path = output_dir / f"{track.language}.srt"
-                logger.info(f"Downloading subtitle from {track.file_path}")
-                download_from_s3(track.file_path, str(local_subtitle_path), input_credential_id, db)
-                if not local_subtitle_path.exists() or local_subtitle_path.stat().st_size == 0:
-                    logger.warning(f"Subtitle track missing or empty: {local_subtitle_path}")
-                    continue
-                subtitle_files.append({"file_path": str(local_subtitle_path), "language": track.language})
-            if not subtitle_files:
-                logger.info("No subtitle tracks found for job.")
-
-            update_progress(job_id, 30)
-
-            # Step 2: Convert subtitles and transcode
-            vtt_paths = convert_srt_to_vtt_batch(subtitle_files, str(subtitle_dir)) if subtitle_files else []
-            logger.info(f"Converted subtitles to VTT: {vtt_paths}")
+            if job.upload_to_s3 and (not self.output_s3_url or not self.output_s3_url.startswith("s3://")):
+                raise ValueError(f"Invalid or missing s3_destination URL: {self.output_s3_url}")
 
-            try:
-                logger.info("Starting video transcoding...")
-                transcoded_files = transcode_video(str(local_input), str(transcoding_dir))
-                if not transcoded_files:
-                    raise RuntimeError("Transcoding video returned no output files.")
-                
-                audio_files_dict = {}  # Renamed from audio_outputs
-                for track in audio_files:
-                    lang = track["language"]
-                    logger.info(f"Transcoding audio for {lang}")
-                    audio_files_dict[lang] = transcode_audio(
-                        track["file_path"],
-                        str(transcoding_dir / "audio"),
-                        lang, 
-                        job.is_paid
-                    )["128k"]  # Use 128k bitrate
-            except Exception as ffmpeg_error:
-                logger.error(f"Transcoding failed: {ffmpeg_error}")
-                raise RuntimeError(f"FFmpeg transcoding failed: {ffmpeg_error}")
-
-            for f in transcoded_files:
-                path = Path(f)
-                if not path.exists() or path.stat().st_size == 0:
-                    raise FileNotFoundError(f"Invalid transcoded file: {f}")
-
-            # Step 3: DRM/HLS Packaging
-            update_progress(job_id, 60)
-            try:
-                drm_service = DRMService(str(output_dir))
-                drm_service.process(
-                    input_path=str(transcoding_dir),
-                    job=job,
-                    vtt_paths=vtt_paths,
-                    audio_files=audio_files_dict,  # Fixed argument name
-                    video_duration=video_duration
-                )
-            except Exception as drm_error:
-                logger.error(f"DRM/HLS processing failed: {drm_error}")
-                raise RuntimeError(f"DRM/HLS processing failed: {drm_error}")
-
-            # Step 4: Upload to S3
-            update_progress(job_id, 90)
-            if job.upload_to_s3:
-                if not output_s3_url or not output_s3_url.startswith("s3://"):
-                    raise ValueError(f"Invalid or missing s3_destination URL: {output_s3_url}")
-
-                if job.is_paid:
-                    dash_folder = output_dir / "dash"
-                    drm_keys_file = output_dir / "drm_keys.txt"
-                    if not dash_folder.exists():
-                        raise FileNotFoundError(f"DASH folder not found: {dash_folder}")
-                    if not drm_keys_file.exists():
-                        raise FileNotFoundError(f"DRM keys file not found: {drm_keys_file}")
-                    upload_to_s3(str(dash_folder), output_s3_url, output_credential_id, db)
-                    upload_to_s3(str(drm_keys_file), output_s3_url, output_credential_id, db)
-                else:
-                    hls_folder = output_dir / "hls"
-                    if not hls_folder.exists():
-                        raise FileNotFoundError(f"HLS folder not found: {hls_folder}")
-                    logger.info(f"Uploading HLS output to {output_s3_url}")
-                    upload_to_s3(str(hls_folder), output_s3_url, output_credential_id, db)
-
-                # try:
-                #     shutil.rmtree(output_dir)
-                #     logger.info(f"Cleaned up local directory: {output_dir}")
-                # except Exception as cleanup_err:
-                #     logger.warning(f"Failed to delete output directory: {cleanup_err}")
+            self.audio_tracks = db.query(AudioTrack).filter(AudioTrack.job_id == job_id).all()
+            self.subtitle_tracks = db.query(SubtitleTrack).filter(SubtitleTrack.job_id == job_id).all()
+
+            self.checkpoint = JobCheckpoint(output_dir)
+            self.state = {}
+            self.completed_stages = set()
+            self.progress = track_job(job_id)
+            self._materialize("upload")
 
             update_progress(job_id, 100)
             update_status(job_id, "completed")
+            JOBS_TOTAL.labels(status="completed").inc()
+            completed = True
 
         except Exception as e:
             logger.exception("Job failed")
             logger.error(f"Error processing job {job_id}: {e}")
             update_status(job_id, "failed")
+            JOBS_TOTAL.labels(status="failed").inc()
             raise
         finally:
+            # A job that failed after packaging started must not keep publishing its tree
+            for uploader in self.segment_uploaders:
+                uploader.abort()
+            self.segment_uploaders = []
+            untrack_job(job_id)
+            flush_notifications(job_id)
+            if workspace is not None:
+                # Failed jobs keep their checkpointed workspace to resume from; output that was
+                # not uploaded is the job's result
+                keep = not completed or not job.upload_to_s3 or settings.WORKSPACE_KEEP_COMPLETED
+                try:
+                    workspace_manager.finish(job_id, keep=keep)
+                except Exception as cleanup_err:
+                    logger.warning(f"Failed to clean up workspace of job {job_id}: {cleanup_err}")
             try:
                 db.close()
             except Exception as db_close_err:
@@ -163,4 +112,378 @@ class DRMProcessor:
             #     try:
             #         send_email_report(job, "DRM Processing Report", "The DRM processing job has completed.")
             #     except Exception as email_err:
-            #         logger.error(f"Failed to send email report: {email_err}")
\ No newline at end of file
+            #         logger.error(f"Failed to send email report: {email_err}")
+
+    # -- stage orchestration ---------------------------------------------------
+
+    def _inputs_key(self, stage: str) -> str:
+        """What a stage's result depends on: its dependencies' results plus the job options it reads."""
+        job = self.job
+        params = {
+            "fetch": {
+                "source": job.s3_source,
+                "stream_input": settings.STREAM_S3_INPUT,
+                "already_transcoded": job.already_transcoded,
+                "audio": sorted((t.language, t.file_path) for t in self.audio_tracks),
+                "subtitles": sorted((t.language, t.file_path) for t in self.subtitle_tracks),
+            },
+            "subtitles": {},
+            "transcode": {
+                "mp4_audio": self._mp4_audio,
+                "fragmented_mp4": self._fragmented_mp4,
+                "ladder": job.ladder,
+                "audio_ladder": [settings.AUDIO_LADDER, settings.AUDIO_SURROUND_BITRATE],
+                "already_transcoded": job.already_transcoded,
+            },
+            "package": {"is_paid": job.is_paid, "package_cmaf": job.package_cmaf},
+            "upload": {
+                "upload_to_s3": job.upload_to_s3,
+                "destination": job.s3_destination,
+                "credential": str(self.output_credential_id),
+            },
+        }[stage]
+        deps = {dep: self.checkpoint.digest(dep) for dep in STAGE_DEPENDENCIES[stage]}
+        return digest_of({"stage": stage, "deps": deps, "params": params})
+
+    def _materialize(self, stage: str) -> None:
+        """Make a stage's result available, reusing its checkpoint or (re)building it and its stale dependencies."""
+        if stage in self.completed_stages:
+            return
+        deps_recorded = all(self.checkpoint.digest(dep) for dep in STAGE_DEPENDENCIES[stage])
+        if deps_recorded and self.checkpoint.is_valid(stage, self._inputs_key(stage)):
+            logger.info(f"⏭️ Stage '{stage}' is up to date for job {self.job.job_id}, skipping")
+            # Skipped dependencies are never visited, but later stages still read their data
+            for upstream in self._upstream_stages(stage):
+                self.state.update(self.checkpoint.data(upstream))
+            self.state.update(self.checkpoint.data(stage))
+            self.completed_stages.add(stage)
+            self.progress.skip_stage(stage)
+            self._release_consumed(stage)
+            return
+
+        for dep in STAGE_DEPENDENCIES[stage]:
+            self._materialize(dep)
+
+        self.progress.duration = self.state.get("video_duration")
+        self.progress.start_stage(stage)
+        inputs_key = self._inputs_key(stage)
+        result = getattr(self, f"_stage_{stage}")()
+        self.checkpoint.record(stage, inputs_key, **result)
+        self.state.update(result.get("data", {}))
+        self.completed_stages.add(stage)
+        self.progress.finish_stage(stage)
+        self._release_consumed(stage)
+
+    @staticmethod
+    def _upstream_stages(stage: str) -> list:
+        """Every stage ``stage`` depends on, directly or transitively, earliest first."""
+        upstream = []
+        for dep in STAGE_DEPENDENCIES[stage]:
+            for s in DRMProcessor._upstream_stages(dep) + [dep]:
+                if s not in upstream:
+                    upstream.append(s)
+        return upstream
+
+    def _release_consumed(self, stage: str) -> None:
+        """Delete the outputs of ``stage``'s dependencies once every stage reading them is done."""
+        if not settings.WORKSPACE_EARLY_CLEANUP:
+            return
+        for dep in STAGE_DEPENDENCIES[stage]:
+            consumers = [s for s, deps in STAGE_DEPENDENCIES.items() if dep in deps]
+            if not all(c in self.completed_stages for c in consumers):
+                continue
+            if dep == "package" and not self.job.upload_to_s3:
+                continue  # The packaged output is the result
+            # A resumed run rebuilds only stale stages, so later checkpoints never need these again
+            self.workspace.release(f"'{dep}' outputs", self.checkpoint.output_paths(dep))
+
+    def _on_progress(self, stage: str, start: float = 0.0, end: float = 1.0):
+        """Progress callback mapping an FFmpeg run onto the ``start``-``end`` share of a stage."""
+        return lambda fraction, speed: self.progress.update(stage, start + (end - start) * fraction, speed)
+
+    # -- stages ------------------------------------------------------------------
+
+    def _stage_fetch(self) -> dict:
+        """Step 1: Download input and associated files concurrently."""
+        job_id = self.job.job_id
+        input_s3_url = self.input_s3_url
+        output_dir = self.output_dir
+
+        # Streamed inputs are read by ffmpeg straight from S3; a source whose moov box
+        # sits after mdat can't start encoding early, so it is downloaded as before.
+        # Pre-transcoded sources are always downloaded, they are probed repeatedly and
+        # may be packaged as they are.
+        stream_video = False
+        if settings.STREAM_S3_INPUT and not self.job.already_transcoded:
+            stream_video = is_s3_object_faststart(str(input_s3_url), self.input_credential_id, self.db)
+            if not stream_video:
+                logger.info(f"{input_s3_url} is not faststart, falling back to a full download")
+
+        if self._rendition_prefix:
+            # A folder of pre-encoded renditions: every one is needed locally for validation
+            renditions = list_s3_objects(str(input_s3_url), self.input_credential_id, self.db, suffix=".mp4")
+            if not renditions:
+                raise FileNotFoundError(f"No .mp4 renditions found under {input_s3_url}")
+            renditions_dir = self.workspace.dir("renditions")
+            transfers = [{
+                "kind": "rendition", "s3_url": obj["s3_url"], "required": True,
+                "destination": str(renditions_dir / Path(obj["key"]).name)
+            } for obj in renditions]
+        else:
+            transfers = [{
+                "kind": "video", "s3_url": str(input_s3_url), "destination": str(self.local_input),
+                "required": True, "stream": stream_video and not self.job.already_transcoded
+            }]
+        for track in self.audio_tracks:
+            transfers.append({
+                "kind": "audio", "language": track.language, "s3_url": track.file_path,
+                "destination": str(output_dir / f"{track.language}.wav"), "required": False,
+                "stream": settings.STREAM_S3_INPUT
+            })
+        for track in self.subtitle_tracks:
+            transfers.append({
+                "kind": "subtitle", "language": track.language, "s3_url": track.file_path,
+                "destination": str(self.subtitle_dir / f"{track.language}.srt"), "required": False
+            })
+
+        logger.info(f"Downloading {len(transfers)} assets for job {job_id} (video from {input_s3_url})")
+        downloaded = download_many_from_s3(transfers, self.input_credential_id, self.db)
+
+        audio_files = []
+        subtitle_files = []
+        renditions = []
+        for item in downloaded:
+            if item["kind"] == "video":
+                video_source = item["source"]
+                renditions.append(video_source)
+                continue
+            if item["kind"] == "rendition":
+                renditions.append(item["source"])
+                continue
+            if not item["valid"]:
+                logger.warning(f"{item['kind'].capitalize()} track missing or empty: {item['destination']}")
+                continue
+            entry = {"file_path": item["source"], "language": item["language"]}
+            (audio_files if item["kind"] == "audio" else subtitle_files).append(entry)
+        if not audio_files:
+            logger.info("No external audio tracks found, relying on default audio in video.")
+        if not subtitle_files:
+            logger.info("No subtitle tracks found for job.")
+
+        if self._rendition_prefix:
+            video_source = top_rendition(renditions)
+        video_duration = get_video_duration(video_source)
+
+        streamed = [item for item in downloaded if item.get("stream") and item["valid"]]
+        # Local files are identified by their sha256 (hashed by the checkpoint on demand); streamed ones by their ETag
+        content_ids = {item["source"]: f"etag:{item['etag']}:{item['size']}" for item in streamed}
+        return {
+            "outputs": [item["source"] for item in downloaded if item["valid"] and not item.get("stream")],
+            "data": {
+                "video_source": video_source,
+                "renditions": renditions if self.job.already_transcoded else [],
+                "audio_files": audio_files,
+                "subtitle_files": subtitle_files,
+                "video_duration": video_duration,
+                "content_ids": content_ids,
+            },
+            # Presigned URLs are only reusable while they are valid
+            "identity": sorted((item["s3_url"], item["size"]) for item in streamed),
+            "valid_for": settings.S3_PRESIGNED_URL_EXPIRY / 2 if streamed else None,
+        }
+
+    def _stage_subtitles(self) -> dict:
+        """Step 2a: Convert subtitles to WebVTT."""
+        subtitle_files = self.state["subtitle_files"]
+        vtt_paths = convert_srt_to_vtt_batch(subtitle_files, str(self.subtitle_dir)) if subtitle_files else []
+        logger.info(f"Converted subtitles to VTT: {vtt_paths}")
+        return {"outputs": [vtt["file_path"] for vtt in vtt_paths], "data": {"vtt_paths": vtt_paths}}
+
+    @property
+    def _rendition_prefix(self) -> bool:
+        """An already-transcoded job pointing at a folder of renditions rather than one file."""
+        return bool(self.job.already_transcoded) and str(self.input_s3_url).endswith("/")
+
+    @property
+    def _mp4_audio(self) -> bool:
+        """Audio goes through mp4fragment (MP4 container) for DRM and CMAF packaging, raw AAC otherwise."""
+        return self.job.is_paid or self.job.package_cmaf
+
+    @property
+    def _fragmented_mp4(self) -> bool:
+        """Have FFmpeg write fragmented MP4 for the renditions mp4dash packages."""
+        return self._mp4_audio and settings.TRANSCODE_FRAGMENTED_MP4
+
+    def _package_dirs(self) -> list:
+        job = self.job
+        dirs = []
+        if job.is_paid:
+            dirs.append(self.output_dir / "dash")
+        if not job.is_paid or job.package_cmaf:
+            dirs.append(self.output_dir / "hls")
+        return dirs
+
+    def _content_id(self, source: str) -> str:
+        content_id = self.state.get("content_ids", {}).get(source) or self.checkpoint.file_sha256("fetch", source)
+        if not content_id:
+            raise RuntimeError(f"No content hash recorded for {source}")
+        return content_id
+
+    def _cached(self, source: str, params: dict, dest_dir: str, build) -> list:
+        """Restore outputs of encoding ``source`` with ``params`` from the transcode cache, or build and store them."""
+        if not settings.TRANSCODE_CACHE:
+            return build()
+        # Hashing a multi-GB source is only worth it when the cache can use the result
+        key = transcode_cache.key(self._content_id(source), params)
+        with transcode_cache.locked(key):
+            files = transcode_cache.lookup(key, dest_dir)
+            if files is None:
+                files = build()
+                transcode_cache.store(key, files)
+        return files
+
+    def _transcode_audio_track(self, lang: str, audio_source: str, on_progress) -> dict:
+        """Encode (or restore from the transcode cache) the audio ladder for one language."""
+        try:
+            ladder = audio_ladder(probe(audio_source))
+        except Exception as e:
+            logger.warning(f"Could not probe {lang} audio, using the stereo ladder: {e}")
+            ladder = audio_ladder()
+        logger.info(f"Transcoding audio for {lang}: {', '.join(ladder)}")
+        audio_dir = self.transcoding_dir / "audio"
+        audio_params = audio_transcode_params(self._mp4_audio, ladder, self._fragmented_mp4)
+        files = self._cached(
+            audio_source, audio_params, str(audio_dir / lang),
+            lambda: list(transcode_audio(
+                audio_source, str(audio_dir), lang, self._mp4_audio, on_progress, ladder, self._fragmented_mp4
+            ).values())
+        )
+        by_name = {Path(f).stem: f for f in files}
+        return {name: by_name[name] for name in ladder}
+
+    def _stage_transcode(self) -> dict:
+        """Step 2b: Transcode the video ladder and audio tracks, reusing cached outputs."""
+        transcoding_dir = self.transcoding_dir
+        video_source = self.state["video_source"]
+        try:
+            # Rungs are video-only; without external tracks the source's own audio is
+            # encoded once here and shared by every rung and packaging mode
+            audio_inputs = [(track["language"], track["file_path"]) for track in self.state["audio_files"]]
+            if not audio_inputs and has_audio_stream(video_source):
+                audio_inputs = [(MAIN_AUDIO_LANGUAGE, video_source)]
+
+            # Audio encodes are cheap next to the ladder; give them a small slice of the stage
+            audio_count = len(audio_inputs)
+            video_share = 1.0 - min(0.05 * audio_count, 0.5)
+            audio_progress = ProgressAggregator(audio_count, self._on_progress("transcode", video_share, 1.0))
+
+            # Every language's audio ladder is encoded concurrently, alongside the video;
+            # the core budget decides how many FFmpeg processes actually run at once
+            with ThreadPoolExecutor(max_workers=max(audio_count, 1), thread_name_prefix="audio") as audio_pool:
+                audio_futures = {
+                    lang: audio_pool.submit(self._transcode_audio_track, lang, audio_source, audio_progress.part(idx))
+                    for idx, (lang, audio_source) in enumerate(audio_inputs)
+                }
+
+                transcoded_files = None
+                if self.job.already_transcoded:
+                    # Falls back to transcoding the top rendition (or a multi-rendition file's first stream)
+                    logger.info("Checking pre-transcoded renditions for packaging...")
+                    transcoded_files = prepare_renditions(self.state["renditions"], str(transcoding_dir))
+                    self.workspace.release("demuxed renditions", [transcoding_dir / "demuxed"])
+                if transcoded_files is None:
+                    plan = transcode_plan(video_source, self.job.ladder, fragmented=self._fragmented_mp4)
+                    video_params = {
+                        "bitrate_settings": plan["bitrate_settings"],
+                        "transcode_params": plan["transcode_params"],
+                        "rung_args": plan["rung_args"],
+                    }
+                    logger.info("Starting video transcoding...")
+                    transcoded_files = self._cached(
+                        video_source, video_params, str(transcoding_dir),
+                        lambda: transcode_video(video_source, str(transcoding_dir), plan=plan,
+                                                on_progress=self._on_progress("transcode", 0.0, video_share))
+                    )
+                if not transcoded_files:
+                    raise RuntimeError("Transcoding video returned no output files.")
+
+                # language -> {rendition: file}, e.g. {"en": {"64k": ..., "128k": ..., "192k": ...}}
+                audio_files_dict = {lang: future.result() for lang, future in audio_futures.items()}
+        except Exception as ffmpeg_error:
+            logger.error(f"Transcoding failed: {ffmpeg_error}")
+            raise RuntimeError(f"FFmpeg transcoding failed: {ffmpeg_error}")
+
+        for f in transcoded_files:
+            path = Path(f)
+            if not path.exists() or path.stat().st_size == 0:
+                raise FileNotFoundError(f"Invalid transcoded file: {f}")
+
+        if settings.TRANSCODE_CACHE:
+            logger.info(f"Transcode cache: {transcode_cache.usage()}")
+        audio_outputs = [path for renditions in audio_files_dict.values() for path in renditions.values()]
+        return {
+            "outputs": transcoded_files + audio_outputs,
+            "data": {"transcoded_files": transcoded_files, "audio_files_dict": audio_files_dict},
+        }
+
+    def _stage_package(self) -> dict:
+        """Step 3: DRM/HLS Packaging, optionally uploading segments as they are written."""
+        job = self.job
+        output_dir = self.output_dir
+        package_dirs = self._package_dirs()
+        # Only the FFmpeg HLS segmenter (clear, non-CMAF jobs) writes segments one by one;
+        # mp4dash's on-demand profile writes each rendition as a single file
+        if job.upload_to_s3 and settings.STREAMING_UPLOAD and not job.is_paid and not job.package_cmaf:
+            self.segment_uploaders = [
+                SegmentUploader(str(package_dir), self.output_s3_url, self.output_credential_id, self.db).start()
+                for package_dir in package_dirs
+            ]
+        try:
+            drm_service = DRMService(str(output_dir), on_progress=self._on_progress("package"))
+            drm_service.process(
+                input_path=str(self.transcoding_dir),
+                job=job,
+                video_files=self.state["transcoded_files"],
+                vtt_paths=self.state["vtt_paths"],
+                audio_files=self.state["audio_files_dict"],  # Fixed argument name
+                video_duration=self.state["video_duration"]
+            )
+        except Exception as drm_error:
+            for uploader in self.segment_uploaders:
+                uploader.abort()
+            self.segment_uploaders = []
+            logger.error(f"DRM/HLS processing failed: {drm_error}")
+            raise RuntimeError(f"DRM/HLS processing failed: {drm_error}")
+        # mp4dash copies the fragments into the published trees
+        self.workspace.release("fragments", [output_dir / "fragmented"])
+
+        outputs = [str(package_dir) for package_dir in package_dirs]
+        if job.is_paid:
+            outputs.append(str(output_dir / "drm_keys.txt"))
+        return {"outputs": outputs}
+
+    def _stage_upload(self) -> dict:
+        """Step 4: Upload to S3."""
+        job = self.job
+        output_dir = self.output_dir
+        output_s3_url = self.output_s3_url
+        output_credential_id = self.output_credential_id
+        db = self.db
+
+        if job.upload_to_s3 and self.segment_uploaders:
+            for uploader in self.segment_uploaders:
+                uploader.finish()
+            self.segment_uploaders = []
+        elif job.upload_to_s3:
+            for package_dir in self._package_dirs():
+                if not package_dir.exists():
+                    raise FileNotFoundError(f"{package_dir.name.upper()} folder not found: {package_dir}")
+                logger.info(f"Uploading {package_dir.name} output to {output_s3_url}")
+                upload_to_s3(str(package_dir), output_s3_url, output_credential_id, db)
+            if job.is_paid:
+                drm_keys_file = output_dir / "drm_keys.txt"
+                if not drm_keys_file.exists():
+                    raise FileNotFoundError(f"DRM keys file not found: {drm_keys_file}")
+                upload_to_s3(str(drm_keys_file), output_s3_url, output_credential_id, db)
+
+        return {"outputs": []}
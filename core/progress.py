@@ -0,0 +1,129 @@
+# worker/core/progress.py
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from services.notify_controller import update_progress
+
+logger = logging.getLogger(__name__)
+
+# Share of overall job progress each pipeline stage accounts for
+STAGE_WEIGHTS = {"fetch": 10, "subtitles": 2, "transcode": 60, "package": 18, "upload": 10}
+
+# Don't report more often than this unless the percentage moved
+REPORT_INTERVAL = 5.0
+
+
+class JobProgress:
+    """
+    Turns per-stage progress into overall job progress, an ETA and encode speed.
+
+    Stages report a 0-1 fraction (and, for FFmpeg runs, speed as a multiple of
+    realtime). Stages skipped on resume count as complete immediately, so the ETA
+    is extrapolated only from work done in this run.
+    """
+
+    def __init__(self, job_id: str, duration: Optional[float] = None):
+        self.job_id = job_id
+        self.duration = duration
+        self.stage: Optional[str] = None
+        self.stage_fraction = 0.0
+        self.speed: Optional[float] = None
+        self.completed = set()
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._baseline = 0.0
+        self._last_report = (0, 0.0)
+
+    def _percent(self) -> float:
+        total = sum(STAGE_WEIGHTS.values())
+        done = sum(STAGE_WEIGHTS[s] for s in self.completed)
+        if self.stage and self.stage not in self.completed:
+            done += STAGE_WEIGHTS[self.stage] * self.stage_fraction
+        return 100.0 * done / total
+
+    def _eta(self, percent: float) -> Optional[float]:
+        progressed = percent - self._baseline
+        if progressed <= 0.5:
+            return None
+        elapsed = time.monotonic() - self._started_at
+        return elapsed / progressed * (100.0 - percent)
+
+    def skip_stage(self, stage: str) -> None:
+        """A stage restored from its checkpoint: complete without any work in this run."""
+        with self._lock:
+            self.completed.add(stage)
+            self._baseline = self._percent()
+            self._started_at = time.monotonic()
+
+    def start_stage(self, stage: str) -> None:
+        with self._lock:
+            self.stage = stage
+            self.stage_fraction = 0.0
+            self.speed = None
+        self._report(force=True)
+
+    def update(self, stage: str, fraction: float, speed: Optional[float] = None) -> None:
+        with self._lock:
+            if stage != self.stage:
+                return
+            self.stage_fraction = max(self.stage_fraction, min(fraction, 1.0))
+            if speed is not None:
+                self.speed = speed
+        self._report()
+
+    def finish_stage(self, stage: str) -> None:
+        with self._lock:
+            self.completed.add(stage)
+            if self.stage == stage:
+                self.stage_fraction = 1.0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            percent = self._percent()
+            eta = self._eta(percent)
+            return {
+                "progress": round(percent, 1),
+                "stage": self.stage,
+                "stage_progress": round(self.stage_fraction, 3),
+                "speed": self.speed,
+                "eta_seconds": round(eta) if eta is not None else None,
+            }
+
+    def _report(self, force: bool = False) -> None:
+        snapshot = self.snapshot()
+        percent = int(snapshot["progress"])
+        now = time.monotonic()
+        # Encoder threads report concurrently; only one of them may claim each report
+        with self._lock:
+            last_percent, last_time = self._last_report
+            if not force and percent == last_percent and now - last_time < REPORT_INTERVAL:
+                return
+            self._last_report = (percent, now)
+        update_progress(
+            self.job_id, percent, self.duration,
+            eta_seconds=snapshot["eta_seconds"], speed=snapshot["speed"]
+        )
+
+
+_active: Dict[str, JobProgress] = {}
+_active_lock = threading.Lock()
+
+
+def track_job(job_id: str, duration: Optional[float] = None) -> JobProgress:
+    progress = JobProgress(job_id, duration)
+    with _active_lock:
+        _active[str(job_id)] = progress
+    return progress
+
+
+def untrack_job(job_id: str) -> None:
+    with _active_lock:
+        _active.pop(str(job_id), None)
+
+
+def get_job_progress(job_id: str) -> Optional[Dict]:
+    with _active_lock:
+        progress = _active.get(str(job_id))
+    return progress.snapshot() if progress else None
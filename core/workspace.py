@@ -0,0 +1,224 @@
+# worker/core/workspace.py
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _tree_bytes(path: Path, exclusive: bool = False) -> int:
+    """
+    Bytes of the files under ``path``; hard links to one inode are counted once, and
+    with ``exclusive`` files also linked from elsewhere (e.g. the transcode cache) not at all.
+    """
+    if path.is_file():
+        stat = path.stat()
+        return 0 if exclusive and stat.st_nlink > 1 else stat.st_size
+    total = 0
+    seen = set()
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            if exclusive and stat.st_nlink > 1:
+                continue
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def _remove(path: Path) -> int:
+    """Delete a file or directory tree, returning the disk space that frees."""
+    try:
+        freed = _tree_bytes(path, exclusive=True)
+    except FileNotFoundError:
+        return 0
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+    return freed
+
+
+class JobWorkspace:
+    """
+    Scratch space of one job: ``job_<id>/`` under OUTPUT_DIR for media, and a directory
+    on tmpfs (when ``WORKSPACE_TMPFS_DIR`` is set) for small artifacts such as subtitles.
+    """
+
+    def __init__(self, job_id: str, root: Path, small_root: Path):
+        self.job_id = job_id
+        self.root = root
+        self.small_root = small_root
+        self.freed_bytes = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.small_root.mkdir(parents=True, exist_ok=True)
+
+    def dir(self, name: str, small: bool = False) -> Path:
+        path = (self.small_root if small else self.root) / name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def release(self, label: str, paths: Iterable[Path]) -> int:
+        """Delete intermediates nothing will read again and prune the directories they leave empty."""
+        freed = 0
+        for path in paths:
+            path = Path(path)
+            if not self._owns(path):
+                continue
+            freed += _remove(path)
+            self._prune(path.parent)
+        if freed:
+            self.freed_bytes += freed
+            logger.info(f"🧹 Released {label} for job {self.job_id} ({freed / 1e6:.1f} MB)")
+        return freed
+
+    def _owns(self, path: Path) -> bool:
+        resolved = path.resolve()
+        return any(resolved.is_relative_to(root.resolve()) for root in (self.root, self.small_root))
+
+    def _prune(self, directory: Path) -> None:
+        roots = {self.root.resolve(), self.small_root.resolve()}
+        directory = directory.resolve()
+        while directory not in roots and self._owns(directory):
+            try:
+                directory.rmdir()
+            except OSError:
+                return  # Not empty (or already gone)
+            directory = directory.parent
+
+    def usage(self) -> int:
+        total = _tree_bytes(self.root) if self.root.exists() else 0
+        if self.small_root != self.root and self.small_root.exists():
+            total += _tree_bytes(self.small_root)
+        return total
+
+
+class WorkspaceManager:
+    """
+    Owns the ``job_<id>/`` directories under OUTPUT_DIR.
+
+    Running jobs are never touched, nor are the jobs ``pinned()`` returns (queued or
+    interrupted jobs that will resume from their checkpoints). Directories of finished
+    jobs (failed ones kept for checkpoint resume, or ones whose output was not
+    uploaded) are removed oldest first when the node exceeds ``quota_bytes`` or
+    admission needs disk back.
+    """
+
+    def __init__(self, root: Path, quota_bytes: int = 0, tmpfs_dir: Optional[str] = None):
+        self.root = Path(root)
+        self.quota_bytes = quota_bytes
+        self.tmpfs_root = self._usable_tmpfs(tmpfs_dir)
+        self._active: Dict[str, JobWorkspace] = {}
+        self._lock = threading.Lock()
+        self.pinned: Callable[[], Iterable[str]] = lambda: ()
+
+    @staticmethod
+    def _usable_tmpfs(tmpfs_dir: Optional[str]) -> Optional[Path]:
+        if not tmpfs_dir:
+            return None
+        path = Path(tmpfs_dir)
+        try:
+            path.mkdir(parents=True, exist_ok=True)
+            probe_file = path / ".write_test"
+            probe_file.write_bytes(b"")
+            probe_file.unlink()
+        except OSError as e:
+            logger.warning(f"⚠️ WORKSPACE_TMPFS_DIR {tmpfs_dir} is not writable, keeping small artifacts on disk: {e}")
+            return None
+        return path
+
+    def _job_dirs(self, job_id: str) -> List[Path]:
+        dirs = [self.root / f"job_{job_id}"]
+        if self.tmpfs_root is not None:
+            dirs.append(self.tmpfs_root / f"job_{job_id}")
+        return dirs
+
+    def open(self, job_id: str) -> JobWorkspace:
+        job_id = str(job_id)
+        root, *small = self._job_dirs(job_id)
+        with self._lock:  # Registered before it exists so a concurrent reclaim never sees it as finished
+            workspace = JobWorkspace(job_id, root, small[0] if small else root)
+            self._active[job_id] = workspace
+        return workspace
+
+    def finish(self, job_id: str, keep: bool) -> None:
+        """
+        Mark a job done. Its directories are deleted unless ``keep`` (failed jobs resume
+        from them; un-uploaded output is the job's result), in which case they stay
+        until the quota or admission reclaims them.
+        """
+        job_id = str(job_id)
+        with self._lock:
+            workspace = self._active.pop(job_id, None)
+        if keep:
+            for path in self._job_dirs(job_id):
+                if path.exists():
+                    os.utime(path)  # Most recently used for LRU cleanup
+        else:
+            freed = sum(_remove(path) for path in self._job_dirs(job_id))
+            logger.info(f"🧹 Removed workspace of job {job_id} ({freed / 1e6:.1f} MB)")
+        if workspace is not None and workspace.freed_bytes:
+            logger.info(f"Job {job_id} released {workspace.freed_bytes / 1e6:.1f} MB of intermediates early")
+        self.enforce_quota()
+
+    def _finished_jobs(self, exclude: Iterable[str] = ()) -> List[Path]:
+        """Directories of jobs not running, pinned or excluded on this worker, least recently used first."""
+        with self._lock:
+            active = {f"job_{job_id}" for job_id in self._active}
+        active.update(f"job_{job_id}" for job_id in (*self.pinned(), *exclude))
+        if not self.root.exists():
+            return []
+        dirs = [p for p in self.root.iterdir() if p.is_dir() and p.name.startswith("job_") and p.name not in active]
+        return sorted(dirs, key=lambda p: p.stat().st_mtime)
+
+    def total_bytes(self) -> int:
+        total = 0
+        for root in filter(None, (self.root, self.tmpfs_root)):
+            if root.exists():
+                total += sum(_tree_bytes(p) for p in root.iterdir() if p.is_dir() and p.name.startswith("job_"))
+        return total
+
+    def reclaim(self, needed_bytes: int, exclude: Iterable[str] = ()) -> int:
+        """
+        Delete finished job directories, oldest first, until ``needed_bytes`` are freed.
+        Jobs in ``exclude`` (e.g. one being admitted but not opened yet) are kept.
+        """
+        freed = 0
+        for job_dir in self._finished_jobs(exclude):
+            if freed >= needed_bytes:
+                break
+            job_id = job_dir.name[len("job_"):]
+            job_freed = sum(_remove(path) for path in self._job_dirs(job_id))
+            freed += job_freed
+            logger.info(f"🧹 Reclaimed workspace of finished job {job_id} ({job_freed / 1e6:.1f} MB)")
+        return freed
+
+    def enforce_quota(self) -> int:
+        if not self.quota_bytes:
+            return 0
+        excess = self.total_bytes() - self.quota_bytes
+        return self.reclaim(excess) if excess > 0 else 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            active = dict(self._active)
+        return {
+            "root": str(self.root),
+            "tmpfs": str(self.tmpfs_root) if self.tmpfs_root else None,
+            "quota_bytes": self.quota_bytes,
+            "total_bytes": self.total_bytes(),
+            "jobs": {job_id: workspace.usage() for job_id, workspace in active.items()},
+            "finished_jobs": len(self._finished_jobs()),
+        }
+
+
+workspace_manager = WorkspaceManager(settings.OUTPUT_DIR, settings.WORKSPACE_QUOTA_BYTES, settings.WORKSPACE_TMPFS_DIR)
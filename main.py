@@ -1,10 +1,20 @@
 # worker/main.py
-from fastapi import Depends, Request, FastAPI, BackgroundTasks
+from fastapi import Depends, Request, FastAPI, BackgroundTasks, HTTPException
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
+from typing import Dict, List, Optional
 from core.processor import DRMProcessor
+from core.job_queue import JobQueue, QueueFullError, QueueUnavailableError
+from core.admission import AdmissionController
+from core.progress import get_job_progress
+from core.workspace import workspace_manager
+from services.notify_controller import update_status, flush_notifications, notifier
+from services.transcode_cache import transcode_cache
+from services.ffmpeg_service import select_ladder
+from services.metrics import QUEUE_DEPTH, JOBS_RUNNING, render_metrics
+from config.settings import settings
 import logging
 import uvicorn
-from concurrent.futures import ThreadPoolExecutor
 
 import socket
 import platform
@@ -13,8 +23,6 @@ app = FastAPI()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 
-executor = ThreadPoolExecutor(max_workers=4)
-
 class JobData(BaseModel):
     job_id: str
     content_id: str
@@ -26,6 +34,61 @@ class JobData(BaseModel):
     s3_source: str
     s3_destination: str
     already_transcoded: bool
+    # Also publish clear HLS (hls/) from the fragments used for DRM packaging
+    package_cmaf: bool = False
+    # Ladder override, e.g. [{"resolution": "1280x720", "bitrate": "2000k"}]; rungs above the source are still dropped
+    ladder: Optional[List[Dict[str, str]]] = None
+
+
+def run_queued_job(payload: dict):
+    processor = DRMProcessor()
+    processor.process(JobData(**payload))
+
+
+admission = AdmissionController(
+    cpu_budget=settings.ADMISSION_CPU_BUDGET,
+    disk_reserve_bytes=settings.ADMISSION_DISK_RESERVE_BYTES,
+    output_dir=settings.OUTPUT_DIR,
+    # The job being admitted may resume from its own workspace
+    reclaim=lambda needed_bytes, job_id: workspace_manager.reclaim(needed_bytes, exclude=[job_id])
+) if settings.ADMISSION_CONTROL else None
+
+# Created on startup: opening the queue creates its SQLite file under OUTPUT_DIR
+job_queue: Optional[JobQueue] = None
+
+
+def _job_queue() -> JobQueue:
+    if job_queue is None:
+        raise QueueUnavailableError("Job queue is not started")
+    return job_queue
+
+
+@app.on_event("startup")
+def start_job_queue():
+    global job_queue
+    job_queue = JobQueue(
+        settings.JOB_QUEUE_PATH,
+        handler=run_queued_job,
+        max_depth=settings.JOB_QUEUE_MAX_DEPTH,
+        max_workers=settings.ADMISSION_MAX_JOBS if admission else settings.MAX_CONCURRENT_JOBS,
+        retry_after=settings.JOB_QUEUE_RETRY_AFTER,
+        admission=admission,
+        overtake_window=settings.ADMISSION_OVERTAKE_WINDOW,
+        on_rejected=lambda job_id, reason: update_status(job_id, "failed")
+    )
+    QUEUE_DEPTH.set_function(job_queue.depth)
+    JOBS_RUNNING.set_function(job_queue.running_count)
+    # Queued and interrupted jobs resume from their checkpointed workspaces
+    workspace_manager.pinned = job_queue.pending_ids
+    workspace_manager.enforce_quota()
+    job_queue.start()
+
+
+@app.on_event("shutdown")
+def stop_job_queue():
+    if job_queue is not None:
+        job_queue.stop()
+    flush_notifications()
 
 @app.get("/")
 def start():
@@ -37,6 +100,12 @@ def health():
     return {"status": "ok"}
     
    
+@app.get("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
+
 @app.get("/test-info")
 def get_machine_info(request: Request):
     client_ip = request.headers.get("x-forwarded-for") or request.client.host
@@ -55,12 +124,65 @@ def get_machine_info(request: Request):
 
 
 @app.post("/api/run-job")
-async def run_job(job: JobData, background_tasks: BackgroundTasks):
+def run_job(job: JobData, background_tasks: BackgroundTasks):
     logging.info(f"📥 Received job: {job.job_id}")
-    processor = DRMProcessor()
-    # background_tasks.add_task(processor.process, job)
-    executor.submit(processor.process, job)  # run in parallel thread
-    return {"message": "Job received and is being processed"}
+    if job.ladder is not None:
+        try:
+            select_ladder(None, job.ladder)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    try:
+        state = _job_queue().enqueue(job.job_id, job.model_dump())
+    except QueueFullError as e:
+        logging.warning(f"Rejecting job {job.job_id}: {e}")
+        return JSONResponse(
+            status_code=429,
+            content={"message": str(e), "queue_depth": e.depth},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except QueueUnavailableError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"message": str(e)},
+            headers={"Retry-After": str(settings.JOB_QUEUE_RETRY_AFTER)}
+        )
+    return {"message": "Job received and is being processed", "state": state["state"], "queue_depth": job_queue.depth()}
+
+
+@app.get("/api/admission")
+def get_admission():
+    if admission is None:
+        return {"enabled": False, "max_concurrent_jobs": settings.MAX_CONCURRENT_JOBS}
+    return {"enabled": True, **admission.snapshot()}
+
+
+@app.get("/api/notifications")
+def get_notifications():
+    return notifier.snapshot()
+
+
+@app.get("/api/transcode-cache")
+def get_transcode_cache():
+    return {"enabled": settings.TRANSCODE_CACHE, **transcode_cache.usage()}
+
+
+@app.get("/api/workspace")
+def get_workspace():
+    return workspace_manager.snapshot()
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    try:
+        job = _job_queue().get(job_id)
+    except QueueUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    progress = get_job_progress(job_id)
+    if progress is not None:
+        job["progress"] = progress
+    return job
 
 
 
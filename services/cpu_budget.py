@@ -0,0 +1,62 @@
+# worker/services/cpu_budget.py
+import logging
+import math
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CoreBudget:
+    """Node-wide pool of CPU cores shared by every encoder process the worker launches.
+
+    Reservations are granted in arrival order so a large 1080p request is not
+    starved by a stream of small ones.
+    """
+
+    def __init__(self, total_cores: int):
+        self.total = max(1, int(total_cores))
+        self._available = self.total
+        self._waiters = deque()
+        self._cond = threading.Condition()
+
+    def clamp(self, cores: int) -> int:
+        return max(1, min(int(cores), self.total))
+
+    @property
+    def in_use(self) -> int:
+        with self._cond:
+            return self.total - self._available
+
+    @contextmanager
+    def reserve(self, cores: int, label: str = "") -> Iterator[int]:
+        """Block until ``cores`` cores are free, hold them for the duration of the block."""
+        cores = self.clamp(cores)
+        ticket = object()
+        with self._cond:
+            self._waiters.append(ticket)
+            while self._waiters[0] is not ticket or self._available < cores:
+                self._cond.wait()
+            self._waiters.popleft()
+            self._available -= cores
+            self._cond.notify_all()
+        logger.debug(f"Reserved {cores}/{self.total} cores for {label or 'encoder'}")
+        try:
+            yield cores
+        finally:
+            with self._cond:
+                self._available += cores
+                self._cond.notify_all()
+
+
+def threads_for_resolution(resolution: str) -> int:
+    """Encoder thread count for a rung, proportional to its pixel count."""
+    width, height = (int(v) for v in resolution.split("x"))
+    return core_budget.clamp(math.ceil(width * height / settings.FFMPEG_PIXELS_PER_THREAD))
+
+
+core_budget = CoreBudget(settings.FFMPEG_CORE_BUDGET)
@@ -4,18 +4,33 @@ import subprocess
 import logging
 import shutil
 from pathlib import Path
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Optional
 import secrets
 import json
 import platform
 import time
+from services.probe import probe
+from services.subtitles import segment_webvtt
+from services.ffmpeg_service import run_ffmpeg, bitrate_to_bps, ProgressCallback, MAIN_AUDIO_LANGUAGE, SURROUND_SUFFIX
+from services.metrics import observe_stage
+from services.mp4_boxes import is_fragmented, file_reader
+from services.cpu_budget import core_budget
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
 class DRMService:
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, on_progress: Optional[ProgressCallback] = None):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Called with (fraction, speed) while HLS segmenting runs
+        self.on_progress = on_progress
+
+    def _step_progress(self, step: int, steps: int) -> Optional[ProgressCallback]:
+        """Progress callback for one of ``steps`` sequential FFmpeg runs."""
+        if self.on_progress is None:
+            return None
+        return lambda fraction, speed: self.on_progress((step + fraction) / steps, speed)
 
     def generate_hex_key(self) -> str:
         return secrets.token_hex(16)
@@ -29,26 +44,14 @@ class DRMService:
 
     def get_video_info(self, input_file: Path) -> Dict[str, any]:
         try:
-            cmd_res = [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "csv=p=0", str(input_file)
-            ]
-            res_output = subprocess.run(cmd_res, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            width, height = res_output.stdout.strip().split(',')
-
-            cmd_br = [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "format=bit_rate",
-                "-of", "csv=p=0", str(input_file)
-            ]
-            br_output = subprocess.run(cmd_br, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            bitrate = int(br_output.stdout.strip()) if br_output.stdout.strip().isdigit() else 3000000
+            result = probe(str(input_file))
+            video = result.video
+            if video is None or not video.width or not video.height:
+                raise ValueError("no video stream with dimensions")
+            bitrate = result.bit_rate or 3000000
 
             return {
-                "resolution": f"{width}x{height}",
+                "resolution": f"{video.width}x{video.height}",
                 "bitrate": bitrate
             }
         except Exception as e:
@@ -57,26 +60,18 @@ class DRMService:
 
     def _get_video_codec(self, video_path: str) -> str:
         try:
-            cmd = [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=codec_name,profile,level",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                str(video_path)
-            ]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            codec_info = result.stdout.strip().split('\n')
-            codec_name = codec_info[0].lower()
-            profile = codec_info[1].lower()
-            level = codec_info[2].split('.')[0]
-            
-            if codec_name == "h264":
+            video = probe(str(video_path)).video
+            codec_name = video.codec_name.lower()
+            if codec_name == "h264" and video.profile and video.level and video.level > 0:
+                profile = video.profile.lower()
+                level = str(video.level)
                 profile_map = {
                     "baseline": "4200",
                     "main": "4d00",
                     "high": "6400"
                 }
                 return f"avc1.{profile_map.get(profile, '6400')}{level}"
+            # Not H.264, or ffprobe reported no profile/level
             return "avc1.64001f"
         except Exception as e:
             logger.error(f"Error getting codec info: {e}")
@@ -84,16 +79,8 @@ class DRMService:
 
     def _get_video_resolution(self, video_path: str) -> str:
         try:
-            cmd = [
-                "ffprobe", "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "csv=p=0",
-                str(video_path)
-            ]
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-            width, height = result.stdout.strip().split(',')
-            return f"{width}x{height}"
+            video = probe(str(video_path)).video
+            return f"{video.width}x{video.height}"
         except Exception as e:
             logger.error(f"Error getting resolution: {e}")
             return "1920x1080"
@@ -102,34 +89,10 @@ class DRMService:
         base_bandwidth = bitrate
         return int(base_bandwidth * 1.2)
 
-    def has_audio_stream(self, input_path: str) -> bool:
-        """Check if the input file has an audio stream."""
-        try:
-            cmd = [
-                "ffprobe", "-v", "error", "-select_streams", "a",
-                "-show_entries", "stream=index", "-of", "json", str(input_path)
-            ]
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-            streams = json.loads(result.stdout).get("streams", [])
-            return len(streams) > 0
-        except subprocess.CalledProcessError as e:
-            logger.warning(f"Error checking audio streams in {input_path}: {e.stderr}")
-            return False
-
-
     def has_audio_stream(self, video_path: str) -> bool:
         """Check if a video file has an audio stream using ffprobe."""
-        cmd = [
-            "ffprobe", "-v", "error", "-show_streams",
-            "-select_streams", "a", "-print_format", "json",
-            str(video_path)
-        ]
         try:
-            result = subprocess.run(
-                cmd, check=True, capture_output=True, text=True
-            )
-            streams = json.loads(result.stdout).get("streams", [])
-            return len(streams) > 0
+            return probe(str(video_path)).has_audio
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to probe audio streams for {video_path}: {e.stderr}")
             return False
@@ -137,32 +100,81 @@ class DRMService:
             logger.error(f"Invalid ffprobe output for {video_path}")
             return False
 
-    def fragment_files(self, input_dir: Union[str, Path], audio_files: Dict[str, str] = None) -> List[str]:
-        """Fragment video and audio MP4 files."""
+    @staticmethod
+    def _audio_fragment_name(lang: str, rendition: str) -> str:
+        return f"frag_audio_{lang}_{rendition}.mp4"
+
+    def fragment_files(self, input_dir: Union[str, Path], audio_files: Dict[str, Dict[str, str]] = None, video_files: List[str] = None) -> List[str]:
+        """
+        Fragment video MP4 files (``video_files``, or every MP4 in ``input_dir``) and every audio rendition.
+
+        Files FFmpeg already wrote fragmented are linked into place instead of rewritten;
+        the rest go through mp4fragment in parallel.
+        """
         input_dir = Path(input_dir)
+        if video_files is None:
+            video_files = sorted(input_dir.glob("*.mp4"))
         fragmented_dir = self.output_dir / "fragmented"
         fragmented_dir.mkdir(exist_ok=True)
 
-        fragmented_files = []
-        # Fragment video files
-        for mp4_file in input_dir.glob("*.mp4"):
-            output_file = fragmented_dir / f"frag_{mp4_file.name}"
-            logger.info(f"Fragmenting video {mp4_file.name}")
-            subprocess.run(["mp4fragment", str(mp4_file), str(output_file)], check=True)
-            fragmented_files.append(str(output_file))
-
-        # Fragment audio files
-        if audio_files:
-            for lang, audio_path in audio_files.items():
-                audio_file = Path(audio_path)
-                output_file = fragmented_dir / f"frag_audio_{lang}.mp4"
-                logger.info(f"Fragmenting audio {audio_file.name} for {lang}")
-                subprocess.run(["mp4fragment", str(audio_file), str(output_file)], check=True)
-                fragmented_files.append(str(output_file))
-
-        return fragmented_files
-
-    def package_with_drm(self, fragmented_files: List[str], job: dict, audio_files: Dict[str, str], vtt_paths: List[Dict[str, str]]):
+        jobs = [(Path(mp4_file), fragmented_dir / f"frag_{Path(mp4_file).name}", "video") for mp4_file in video_files]
+        for lang, renditions in (audio_files or {}).items():
+            for rendition, audio_path in renditions.items():
+                jobs.append((Path(audio_path), fragmented_dir / self._audio_fragment_name(lang, rendition), "audio"))
+
+        # Each file is an independent single-threaded rewrite, so they run side by side
+        with ThreadPoolExecutor(max_workers=max(len(jobs), 1), thread_name_prefix="mp4fragment") as pool:
+            futures = [pool.submit(self._fragment_one, *job) for job in jobs]
+            return [future.result() for future in futures]
+
+    def _fragment_one(self, source: Path, output_file: Path, kind: str) -> str:
+        """Fragment one MP4, or just link it into place if FFmpeg already wrote it fragmented."""
+        if output_file.exists():
+            output_file.unlink()
+        if is_fragmented(file_reader(str(source)), source.stat().st_size):
+            logger.info(f"{source.name} is already fragmented, skipping mp4fragment")
+            try:
+                os.link(source, output_file)
+            except OSError:
+                shutil.copy2(source, output_file)
+            return str(output_file)
+
+        logger.info(f"Fragmenting {kind} {source.name}")
+        with core_budget.reserve(1, f"mp4fragment {source.name}"), observe_stage("fragment", kind):
+            subprocess.run(["mp4fragment", str(source), str(output_file)], check=True)
+        return str(output_file)
+
+    def _mp4dash_inputs(self, fragmented_files: List[str], audio_files: Dict[str, Dict[str, str]], vtt_paths: List[Dict[str, str]]) -> List[str]:
+        """mp4dash input arguments for fragmented renditions and WebVTT subtitles."""
+        # Every bitrate of a language becomes a representation in that language's adaptation set
+        audio_languages = {
+            self._audio_fragment_name(lang, rendition): lang
+            for lang, renditions in (audio_files or {}).items() for rendition in renditions
+        }
+        inputs = []
+        # Add fragmented video and audio files
+        for frag_file in fragmented_files:
+            frag_file = str(Path(frag_file).as_posix()) 
+            if Path(frag_file).name in audio_languages:
+                lang = audio_languages[Path(frag_file).name]
+                role = "main" if lang == list(audio_files.keys())[0] else "alternate"
+                # The source's own audio has no known language
+                language = "und" if lang == MAIN_AUDIO_LANGUAGE else lang
+                inputs.append(f"[+language={language},+role={role}]{frag_file}")
+            else:
+                inputs.append(frag_file)
+
+        # Add subtitle files
+        for subtitle in vtt_paths:
+            if not isinstance(subtitle, dict) or 'language' not in subtitle or 'file_path' not in subtitle:
+                logger.error(f"Invalid subtitle format: {subtitle}")
+                continue
+            lang = subtitle["language"]
+            vtt_file = str(Path(subtitle["file_path"]).as_posix()) 
+            inputs.append(f"[+format=webvtt,+language={lang}]{vtt_file}")
+        return inputs
+
+    def package_with_drm(self, fragmented_files: List[str], job: dict, audio_files: Dict[str, Dict[str, str]], vtt_paths: List[Dict[str, str]]):
         """Package DASH and HLS with DRM encryption, including audio and subtitles."""
         logger.info("Packaging with DRM (DASH + HLS)...")
 
@@ -212,30 +224,14 @@ class DRMService:
             '--hls-master-playlist-name=manifest.m3u8'
         ]
 
-        # Add fragmented video and audio files
-        for frag_file in fragmented_files:
-            frag_file = str(Path(frag_file).as_posix()) 
-            if "frag_audio" in Path(frag_file).name:
-                lang = Path(frag_file).name.replace("frag_audio_", "").replace(".mp4", "")
-                role = "main" if lang == list(audio_files.keys())[0] else "alternate"
-                command.append(f"[+language={lang},+role={role}]{frag_file}")
-            else:
-                command.append(frag_file)
-
-        # Add subtitle files
-        for subtitle in vtt_paths:
-            if not isinstance(subtitle, dict) or 'language' not in subtitle or 'file_path' not in subtitle:
-                logger.error(f"Invalid subtitle format: {subtitle}")
-                continue
-            lang = subtitle["language"]
-            vtt_file = str(Path(subtitle["file_path"]).as_posix()) 
-            command.append(f"[+format=webvtt,+language={lang}]{vtt_file}")
+        command.extend(self._mp4dash_inputs(fragmented_files, audio_files, vtt_paths))
 
         print(f"Running DASH+HLS DRM packaging: {' '.join(map(str, command))}")
         logger.debug(f"Running DASH+HLS DRM packaging: {' '.join(command)}")
         try:
             # subprocess.run(command, check=True, capture_output=True, text=True)
-            subprocess.run(' '.join(command), shell=True, check=True, capture_output=True, text=True)
+            with observe_stage("mp4dash", "drm"):
+                subprocess.run(' '.join(command), shell=True, check=True, capture_output=True, text=True)
             logger.info(f"DRM packaging completed in {dash_dir}")
         except subprocess.CalledProcessError as e:
             logger.error(f"mp4dash failed with return code {e.returncode}: {e.stderr}") 
@@ -254,8 +250,38 @@ class DRMService:
             logger.error(f"Unexpected error running mp4dash: {e}")
             raise
 
+    def package_clear_cmaf(self, fragmented_files: List[str], audio_files: Dict[str, Dict[str, str]], vtt_paths: List[Dict[str, str]]):
+        """
+        Package clear HLS from the same fragmented renditions used for the DRM output.
+
+        mp4dash only writes playlists and byte-range references into each fragmented
+        rendition, so no media is re-muxed and every rendition is a single object.
+        """
+        logger.info("Packaging clear HLS from CMAF fragments...")
+        hls_dir = self.output_dir / "hls"
+        if hls_dir.exists():
+            shutil.rmtree(hls_dir)
+
+        command = [
+            "mp4dash",
+            "--profiles=on-demand",
+            "--output", str(hls_dir.as_posix()),
+            "--mpd-name=manifest.mpd",
+            "--hls",
+            "--hls-master-playlist-name=master.m3u8",
+            *self._mp4dash_inputs(fragmented_files, audio_files, vtt_paths)
+        ]
+        logger.debug(f"Running clear CMAF packaging: {' '.join(command)}")
+        try:
+            with observe_stage("mp4dash", "clear"):
+                subprocess.run(command, check=True, capture_output=True, text=True)
+            logger.info(f"Clear CMAF packaging completed in {hls_dir}")
+        except subprocess.CalledProcessError as e:
+            logger.error(f"mp4dash failed with return code {e.returncode}: {e.stderr}")
+            raise RuntimeError(f"mp4dash failed: {e.stderr}")
+
    
-    def transcode_subtitles(self, audio_files: Dict[str, str], subtitle_files: List[Dict[str, str]], video_duration: float, hls_time: int = 6, hls_list_size: int = 0) -> Dict[str, str]:
+    def transcode_subtitles(self, audio_files: Dict[str, Dict[str, str]], subtitle_files: List[Dict[str, str]], video_duration: float, hls_time: int = 6, hls_list_size: int = 0) -> Dict[str, str]:
         """Generate HLS playlists for subtitles with segmentation."""
         subtitle_manifests = {}
         if not subtitle_files:
@@ -274,133 +300,60 @@ class DRMService:
             subtitle_output_dir = hls_dir / subtitle_name
             subtitle_output_dir.mkdir(exist_ok=True)
 
-            vtt_file = subtitle["file_path"]
-            playlist_path = subtitle_output_dir / "playlist.m3u8"
+            playlist_path = segment_webvtt(subtitle["file_path"], str(subtitle_output_dir), video_duration, hls_time)
+
+            # Normalize path to use forward slashes
+            relative_path = str(playlist_path.relative_to(hls_dir)).replace('\\', '/')
+            subtitle_manifests[subtitle["language"]] = relative_path
+
+        return subtitle_manifests
 
-            # Generate HLS playlist for WebVTT
-            ffmpeg_cmd_hls = [
-                "ffmpeg", "-y",
-                "-f", "lavfi", "-i", f"anullsrc=channel_layout=stereo:sample_rate=48000:duration={video_duration}",
-                "-i", vtt_file,
+    def package_without_drm(self, video_files: List[str], audio_files: Dict[str, Dict[str, str]], subtitles: List[Dict[str, str]], video_duration: float):
+        """Package HLS from video-only renditions, the transcoded audio tracks and subtitles."""
+        hls_dir = self.output_dir / "hls"
+        shutil.rmtree(hls_dir, ignore_errors=True)
+        hls_dir.mkdir(parents=True, exist_ok=True)
 
-                "-map", "0:a", "-map", "1:s",
-                "-c:a", "aac", "-b:a", "128k",
+        hls_time = 6
+        hls_list_size = 0
 
-                "-c:s", "webvtt",
-                "-copyts", "-start_at_zero",
+        audio_renditions = [
+            (lang, rendition, audio_path)
+            for lang, renditions in (audio_files or {}).items() for rendition, audio_path in renditions.items()
+        ]
+        steps = len(audio_renditions) + len(video_files)
+        step = 0
+
+        # Process audio tracks (external tracks, or the source's own audio encoded once as "original");
+        # each rendition (bitrate/channel layout) becomes its own group: {rendition: {lang: uri}}
+        audio_manifests = {}
+        for lang, rendition, audio_path in audio_renditions:
+            lang_dir = hls_dir / "audio" / lang / rendition
+            lang_dir.mkdir(parents=True, exist_ok=True)
+            playlist_path = lang_dir / "playlist.m3u8"
+
+            cmd = [
+                "ffmpeg", "-y", "-i", str(audio_path),
+                "-c:a", "copy",  # Already AAC, only segmented
                 "-f", "hls",
                 "-hls_time", str(hls_time),
                 "-hls_list_size", str(hls_list_size),
                 "-hls_playlist_type", "vod",
-                # "-hls_segment_filename", str(subtitle_output_dir / "segment%d.vtt"),
+                "-hls_segment_type", "mpegts",
                 str(playlist_path)
             ]
-
             try:
-                result = subprocess.run(ffmpeg_cmd_hls, check=True, capture_output=True, text=True)
-                logger.info(f"Subtitle HLS processing completed for {subtitle_name}: {result.stdout}")
-
-                # Post-process playlist to ensure correct durations
-                with open(playlist_path, "r", encoding="utf-8") as f:
-                    playlist_content = f.readlines()
-
-                total_duration = video_duration
-                num_segments = int(total_duration // hls_time) + (1 if total_duration % hls_time else 0)
-                fixed_content = [
-                    "#EXTM3U\n",
-                    "#EXT-X-VERSION:6\n",
-                    f"#EXT-X-TARGETDURATION:{hls_time}\n",
-                    "#EXT-X-MEDIA-SEQUENCE:0\n",
-                    "#EXT-X-PLAYLIST-TYPE:VOD\n"
-                ]
-                remaining_duration = total_duration
-                for i in range(num_segments):
-                    duration = min(remaining_duration, hls_time)
-                    fixed_content.append(f"#EXTINF:{duration:.6f},\n")
-                    fixed_content.append(f"playlist{i}.vtt\n")
-                    remaining_duration -= duration
-                fixed_content.append("#EXT-X-ENDLIST\n")
-
-                with open(playlist_path, "w", encoding="utf-8") as f:
-                    f.writelines(fixed_content)
-
-                # Normalize path to use forward slashes
+                with observe_stage("hls_segment", "audio"):
+                    run_ffmpeg(cmd, video_duration, self._step_progress(step, steps))
+                step += 1
                 relative_path = str(playlist_path.relative_to(hls_dir)).replace('\\', '/')
-                subtitle_manifests[subtitle["language"]] = relative_path
-
+                audio_manifests.setdefault(rendition, {})[lang] = relative_path
+                logger.info(f"Generated {rendition} audio HLS playlist for {lang} at {playlist_path}")
             except subprocess.CalledProcessError as e:
-                logger.error(f"Subtitle HLS processing failed for {subtitle_name}: {e.stderr}")
+                logger.error(f"Failed to generate {rendition} audio HLS for {lang}: {e.stderr}")
                 raise
-
-        return subtitle_manifests
-
-    def package_without_drm(self, video_files: List[str], audio_files: Dict[str, str], subtitles: List[Dict[str, str]], video_duration: float):
-        """Package HLS with audio, video, and subtitles, using original video audio if no external audio provided."""
-        hls_dir = self.output_dir / "hls"
-        shutil.rmtree(hls_dir, ignore_errors=True)
-        hls_dir.mkdir(parents=True, exist_ok=True)
-
-        hls_time = 6
-        hls_list_size = 0
-
-        # Process audio tracks
-        audio_manifests = {}
-        if audio_files:
-            # External audio tracks provided
-            for lang, audio_path in audio_files.items():
-                lang_dir = hls_dir / "audio" / lang
-                lang_dir.mkdir(parents=True, exist_ok=True)
-                playlist_path = lang_dir / "playlist.m3u8"
-
-                cmd = [
-                    "ffmpeg", "-y", "-i", str(audio_path),
-                    "-c:a", "copy" if audio_path.endswith(".mp4") else "aac",
-                    "-b:a", "128k",
-                    "-f", "hls",
-                    "-hls_time", str(hls_time),
-                    "-hls_list_size", str(hls_list_size),
-                    "-hls_playlist_type", "vod",
-                    "-hls_segment_type", "mpegts",
-                    str(playlist_path)
-                ]
-                try:
-                    subprocess.run(cmd, check=True, capture_output=True, text=True)
-                    relative_path = str(playlist_path.relative_to(hls_dir)).replace('\\', '/')
-                    audio_manifests[lang] = relative_path
-                    logger.info(f"Generated audio HLS playlist for {lang} at {playlist_path}")
-                except subprocess.CalledProcessError as e:
-                    logger.error(f"Failed to generate audio HLS for {lang}: {e.stderr}")
-                    raise
-        else:
-            # No external audio; try to extract audio from first video with audio
-            for video in video_files:
-                if self.has_audio_stream(video):
-                    lang = "original"
-                    lang_dir = hls_dir / "audio" / lang
-                    lang_dir.mkdir(parents=True, exist_ok=True)
-                    playlist_path = lang_dir / "playlist.m3u8"
-
-                    cmd = [
-                        "ffmpeg", "-y", "-i", str(video),
-                        "-vn", "-c:a", "aac", "-b:a", "128k",  # Encode to AAC for HLS compatibility
-                        "-f", "hls",
-                        "-hls_time", str(hls_time),
-                        "-hls_list_size", str(hls_list_size),
-                        "-hls_playlist_type", "vod",
-                        "-hls_segment_type", "mpegts",
-                        str(playlist_path)
-                    ]
-                    try:
-                        subprocess.run(cmd, check=True, capture_output=True, text=True)
-                        relative_path = str(playlist_path.relative_to(hls_dir)).replace('\\', '/')
-                        audio_manifests[lang] = relative_path
-                        logger.info(f"Generated original audio HLS playlist from {video} at {playlist_path}")
-                        break  # Use audio from first video with audio
-                    except subprocess.CalledProcessError as e:
-                        logger.error(f"Failed to generate original audio HLS from {video}: {e.stderr}")
-                        raise
-            if not audio_manifests:
-                logger.warning("No audio tracks provided, and no audio found in input videos")
+        if not audio_manifests:
+            logger.warning("No audio tracks provided, and no audio found in the source")
 
         # Process subtitles
         subtitle_manifests = self.transcode_subtitles(audio_files, subtitles, video_duration, hls_time, hls_list_size)
@@ -429,7 +382,9 @@ class DRMService:
                 str(playlist_path)
             ]
             try:
-                subprocess.run(cmd, check=True, capture_output=True, text=True)
+                with observe_stage("hls_segment", resolution):
+                    run_ffmpeg(cmd, video_duration, self._step_progress(step, steps))
+                step += 1
                 # Normalize path to use forward slashes
                 relative_path = str(playlist_path.relative_to(hls_dir)).replace('\\', '/')
                 video_manifests.append({
@@ -450,12 +405,14 @@ class DRMService:
             f.write("#EXT-X-VERSION:6\n")
             f.write("#EXT-X-INDEPENDENT-SEGMENTS\n")
 
-            # Audio entries
-            for idx, (lang, uri) in enumerate(audio_manifests.items()):
-                default = "YES" if idx == 0 else "NO"
-                f.write(
-                    f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",LANGUAGE="{lang}",NAME="{lang.capitalize()}",DEFAULT={default},AUTOSELECT=YES,URI="{uri}"\n'
-                )
+            # Audio entries, one group per rendition
+            for rendition, languages in audio_manifests.items():
+                channels = 6 if rendition.endswith(SURROUND_SUFFIX) else 2
+                for idx, (lang, uri) in enumerate(languages.items()):
+                    default = "YES" if idx == 0 else "NO"
+                    f.write(
+                        f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio_{rendition}",LANGUAGE="{lang}",NAME="{lang.capitalize()}",CHANNELS="{channels}",DEFAULT={default},AUTOSELECT=YES,URI="{uri}"\n'
+                    )
 
             # Subtitle entries
             if subtitle_manifests:
@@ -465,29 +422,43 @@ class DRMService:
                         f'#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="{lang.capitalize()}",LANGUAGE="{lang}",DEFAULT={default},AUTOSELECT=YES,URI="{uri}"\n'
                     )
 
-            # Video streams
+            # Video streams, each paired with every audio group so players can trade audio bitrate too
+            audio_groups = [(f"audio_{rendition}", bitrate_to_bps(rendition.split("_")[0])) for rendition in audio_manifests] or [(None, 0)]
             for video in video_manifests:
-                stream_inf = (
-                    f'#EXT-X-STREAM-INF:BANDWIDTH={video["bandwidth"]},AVERAGE-BANDWIDTH={int(video["bandwidth"] * 0.8)},RESOLUTION={video["resolution"]},CODECS="{video["codec"]}"'
-                )
-                if audio_manifests:
-                    stream_inf += ',AUDIO="audio"'
-                if subtitle_manifests:
-                    stream_inf += ',SUBTITLES="subs"'
-                stream_inf += '\n'
-                f.write(stream_inf)
-                f.write(f'{video["path"]}\n')
+                for group, audio_bps in audio_groups:
+                    bandwidth = video["bandwidth"] + audio_bps
+                    codecs = video["codec"] + (",mp4a.40.2" if group else "")
+                    stream_inf = (
+                        f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},AVERAGE-BANDWIDTH={int(bandwidth * 0.8)},RESOLUTION={video["resolution"]},CODECS="{codecs}"'
+                    )
+                    if group:
+                        stream_inf += f',AUDIO="{group}"'
+                    if subtitle_manifests:
+                        stream_inf += ',SUBTITLES="subs"'
+                    stream_inf += '\n'
+                    f.write(stream_inf)
+                    f.write(f'{video["path"]}\n')
 
         logger.info(f"Created HLS master playlist at {master_playlist_path}")
 
-    def process(self, input_path: Union[str, Path], job: dict, vtt_paths: List[Dict[str, str]], audio_files: Dict[str, str], video_duration: float):
+    def process(self, input_path: Union[str, Path], job: dict, vtt_paths: List[Dict[str, str]], audio_files: Dict[str, Dict[str, str]], video_duration: float,
+                video_files: List[str] = None):
+        """Package the renditions in ``video_files`` (default: every MP4 in ``input_path``), so manifests list exactly the encoded ladder."""
         input_path = Path(input_path)
+        if video_files is None:
+            video_files = [str(f) for f in input_path.glob("*.mp4")]
         
-        if job.is_paid:
-            fragmented_files = self.fragment_files(input_path, audio_files)
+        if job.package_cmaf:
+            # One set of fragments feeds the clear HLS tree and, for paid jobs, the DRM tree
+            fragmented_files = self.fragment_files(input_path, audio_files, video_files)
+            if job.is_paid:
+                self.package_with_drm(fragmented_files, job, audio_files, vtt_paths)
+            self.package_clear_cmaf(fragmented_files, audio_files, vtt_paths)
+        elif job.is_paid:
+            fragmented_files = self.fragment_files(input_path, audio_files, video_files)
             self.package_with_drm(fragmented_files, job, audio_files, vtt_paths)
         else:
-            transcoded_files = [str(f) for f in input_path.glob("*.mp4")]
+            transcoded_files = list(video_files)
             if not transcoded_files:
                 logger.error("No transcoded files found for HLS packaging.")
                 raise RuntimeError("No transcoded files found.")
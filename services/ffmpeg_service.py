@@ -1,61 +1,71 @@
 # worker/services/ffmpeg_service.py
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 import logging
 import subprocess
+import threading
+from collections import deque
 from pathlib import Path
 import json
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import settings
+from services.cpu_budget import core_budget, threads_for_resolution
+from services.probe import probe, is_remote_source, ProbeResult
+from services.metrics import observe_stage, track_ffmpeg
 
 logger = logging.getLogger(__name__)
 
+def input_args(input_path: str) -> List[str]:
+    """``-i`` arguments for an input, adding HTTP reconnect options for streamed sources."""
+    if is_remote_source(input_path):
+        return [
+            "-reconnect", "1", "-reconnect_streamed", "1",
+            "-reconnect_on_network_error", "1", "-reconnect_delay_max", "10",
+            "-i", str(input_path)
+        ]
+    return ["-i", str(input_path)]
+
 def validate_input_file(input_path: str) -> bool:
     """Validate that the input file exists and is a valid video."""
-    input_path = Path(input_path)
-    if not input_path.exists() or input_path.stat().st_size == 0:
-        logger.error(f"Input file {input_path} does not exist or is empty.")
-        return False
+    if not is_remote_source(input_path):
+        input_path = Path(input_path)
+        if not input_path.exists() or input_path.stat().st_size == 0:
+            logger.error(f"Input file {input_path} does not exist or is empty.")
+            return False
     try:
-        cmd = [
-            "ffprobe", "-v", "error", "-show_format",
-            "-show_streams", "-of", "json", str(input_path)
-        ]
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        probe(str(input_path))
         logger.info(f"Input file {input_path} is valid.")
         return True
     except subprocess.CalledProcessError as e:
         logger.error(f"Invalid input file {input_path}: {e.stderr}")
         return False
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid ffprobe output for {input_path}: {e}")
+        return False
 
 def has_audio_stream(input_path: str) -> bool:
     """Check if the input file has an audio stream."""
     try:
-        cmd = [
-            "ffprobe", "-v", "error", "-select_streams", "a",
-            "-show_entries", "stream=index", "-of", "json", str(input_path)
-        ]
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        streams = json.loads(result.stdout).get("streams", [])
-        return len(streams) > 0
+        return probe(input_path).has_audio
     except subprocess.CalledProcessError as e:
         logger.warning(f"Error checking audio streams in {input_path}: {e.stderr}")
         return False
+    except json.JSONDecodeError:
+        logger.warning(f"Invalid ffprobe output for {input_path}")
+        return False
 
 def get_video_stream_info(input_path: str) -> Dict:
     """Get video stream details (pixel format, profile)."""
     try:
-        cmd = [
-            "ffprobe", "-v", "error", "-select_streams", "v:0",
-            "-show_entries", "stream=pix_fmt,profile",
-            "-of", "json", str(input_path)
-        ]
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        stream_info = json.loads(result.stdout).get("streams", [{}])[0]
-        return {
-            "pix_fmt": stream_info.get("pix_fmt", ""),
-            "profile": stream_info.get("profile", "").lower()
-        }
+        video = probe(input_path).video
     except subprocess.CalledProcessError as e:
         logger.warning(f"Error getting video stream info for {input_path}: {e.stderr}")
         return {"pix_fmt": "", "profile": ""}
+    if video is None:
+        return {"pix_fmt": "", "profile": ""}
+    return {
+        "pix_fmt": video.pix_fmt,
+        "profile": video.profile.lower()
+    }
 
 def select_transcode_params(stream_info: Dict) -> Dict:
     """Select H.264 profile and pixel format based on input."""
@@ -123,23 +133,304 @@ def select_transcode_params(stream_info: Dict) -> Dict:
 #     return outputs
 
 
-def transcode_video(input_path: str, output_dir: str) -> List[str]:
+# Output settings for the streaming ladder, highest rung first
+BITRATE_SETTINGS = [
+    {"resolution": "1920x1080", "bitrate": "3000k", "output_name": "output_1080p.mp4"},
+    {"resolution": "1280x720", "bitrate": "2000k", "output_name": "output_720p.mp4"},
+    {"resolution": "854x480", "bitrate": "1000k", "output_name": "output_480p.mp4"},
+    {"resolution": "640x360", "bitrate": "600k", "output_name": "output_360p.mp4"},
+]
+
+
+def bitrate_to_bps(bitrate: str) -> int:
+    """Parse an FFmpeg bitrate string such as ``3000k`` or ``2.5M``."""
+    bitrate = str(bitrate).lower()
+    if bitrate.endswith("k"):
+        return int(float(bitrate[:-1]) * 1000)
+    if bitrate.endswith("m"):
+        return int(float(bitrate[:-1]) * 1_000_000)
+    return int(bitrate)
+
+
+def _rung(width: int, height: int, bitrate_bps: int) -> Dict:
+    return {
+        "resolution": f"{width}x{height}",
+        "bitrate": f"{max(1, bitrate_bps // 1000)}k",
+        "output_name": f"output_{height}p.mp4"
+    }
+
+
+def select_ladder(source: Optional[ProbeResult], override: Optional[List[Dict]] = None,
+                  cap_to_source_bitrate: Optional[bool] = None) -> List[Dict]:
     """
-    Transcode video into multiple resolutions with optimized FFmpeg settings for streaming.
-    
+    Pick the renditions to encode for a source.
+
+    Rungs taller than the source are dropped so nothing is upscaled; a source smaller
+    than every rung gets a single rendition at its own (even-rounded) resolution.
+
     Args:
-        input_path (str): Path to input video file.
-        output_dir (str): Directory to save transcoded outputs.
-        
+        source: Probe of the input. Without a video stream the ladder is used as is.
+        override: Per-job ladder, a list of ``{"resolution": "WxH", "bitrate": "2000k"}``.
+            Defaults to ``BITRATE_SETTINGS``.
+        cap_to_source_bitrate: Never give a rung more bitrate than the source has.
+            Defaults to ``settings.LADDER_CAP_TO_SOURCE_BITRATE``.
+
     Returns:
-        List[str]: List of paths to transcoded video files.
-        
+        Rungs, highest first, with ``resolution``, ``bitrate`` and ``output_name``.
+
     Raises:
-        RuntimeError: If input validation or FFmpeg transcoding fails.
+        ValueError: If the override is malformed.
     """
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    if cap_to_source_bitrate is None:
+        cap_to_source_bitrate = settings.LADDER_CAP_TO_SOURCE_BITRATE
+
+    rungs = []
+    for entry in override or BITRATE_SETTINGS:
+        try:
+            width, height = (int(v) for v in entry["resolution"].lower().split("x"))
+            bitrate = bitrate_to_bps(entry["bitrate"])
+        except (KeyError, ValueError, AttributeError) as e:
+            raise ValueError(f"Invalid ladder rung {entry}: {e}")
+        if width <= 0 or height <= 0 or bitrate <= 0:
+            raise ValueError(f"Invalid ladder rung {entry}")
+        rungs.append((width, height, bitrate))
+    if len({r[1] for r in rungs}) != len(rungs):
+        raise ValueError("Ladder rungs must have distinct heights")
+    rungs.sort(key=lambda r: r[1], reverse=True)
+
+    video = source.video if source else None
+    if video is None or not video.width or not video.height:
+        return [_rung(*r) for r in rungs]
+
+    selected = [r for r in rungs if r[1] <= video.height]
+    if not selected:
+        # Tiny source: one rendition at source size with the lowest rung's bitrate
+        selected = [(video.width - video.width % 2, video.height - video.height % 2, rungs[-1][2])]
+        logger.info(f"Source {video.width}x{video.height} is below every rung, encoding a single rendition")
+
+    source_bitrate = video.bit_rate or source.bit_rate
+    if cap_to_source_bitrate and source_bitrate:
+        selected = [(w, h, min(b, source_bitrate)) for w, h, b in selected]
+
+    dropped = len(rungs) - len(selected)
+    if dropped > 0:
+        logger.info(f"Dropped {dropped} rungs above the {video.height}p source")
+    return [_rung(*r) for r in selected]
+
+
+# Rungs are encoded with a fixed 48-frame GOP at 24 fps
+GOP_SECONDS = 2
+# Fragmented MP4 as mp4fragment writes it: empty moov, a moof per GOP, tfdt-based offsets
+FRAGMENTED_MOVFLAGS = "+frag_keyframe+empty_moov+default_base_moof"
+
+
+def _rung_output_args(setting: Dict, transcode_params: Dict, threads: int) -> List[str]:
+    """
+    Encoder options for one ladder rung (everything after the video map).
+
+    Rungs are video-only: the source's audio is encoded once as its own track
+    (``MAIN_AUDIO_LANGUAGE``) and shared by every rung.
+    """
+    args = [
+        "-c:v", "libx264",
+        "-threads", str(threads),
+        "-preset", "medium",
+        "-pix_fmt", transcode_params["pix_fmt"],
+        "-r", "24",  # Frame rate
+        "-b:v", setting["bitrate"],
+        "-g", "48",  # GOP size (2 seconds at 24 fps)
+        "-keyint_min", "48",  # Minimum keyframe interval
+        "-sc_threshold", "0",  # Disable scene-based keyframes
+        # Fragmented output (one fragment per GOP) for mp4dash, else moov up front for the web
+        "-movflags", FRAGMENTED_MOVFLAGS if transcode_params.get("fragmented") else "+faststart",
+        "-profile:v", transcode_params["profile"],
+        "-level", "4.0",
+        "-an",
+    ]
+    return args
+
+
+ProgressCallback = Callable[[float, Optional[float]], None]
+
+
+def _parse_speed(value: str) -> Optional[float]:
+    try:
+        return float(value.rstrip("x"))
+    except ValueError:
+        return None  # "N/A" until the first frames are out
+
+
+def run_ffmpeg(cmd: List[str], duration: Optional[float] = None, on_progress: Optional[ProgressCallback] = None) -> None:
+    """
+    Run an FFmpeg command, reporting progress from its ``-progress`` pipe.
+
+    ``-progress pipe:1 -nostats`` is added to the command and the key=value blocks
+    FFmpeg prints on stdout are parsed as they arrive; each completed block calls
+    ``on_progress(fraction, speed)`` with the fraction of ``duration`` encoded and
+    the encode speed as a multiple of realtime. stderr is drained concurrently and
+    only its tail is kept for error messages.
+
+    Raises:
+        subprocess.CalledProcessError: If FFmpeg exits non-zero (``stderr`` holds the tail of its log).
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    stderr_tail = deque(maxlen=200)
+    with track_ffmpeg():
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, encoding="utf-8", errors="replace"
+        )
+        stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+        stderr_reader.start()
+
+        block = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key != "progress":
+                block[key] = value
+                continue
+            if on_progress:
+                out_time_us = block.get("out_time_us") or block.get("out_time_ms")  # both are microseconds
+                fraction = 1.0 if value == "end" else 0.0
+                if duration and out_time_us and out_time_us.lstrip("-").isdigit():
+                    fraction = max(fraction, min(1.0, int(out_time_us) / 1e6 / duration))
+                on_progress(fraction, _parse_speed(block.get("speed", "N/A")))
+            block = {}
+
+        returncode = process.wait()
+        stderr_reader.join()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr="".join(stderr_tail))
+
+
+def _run_ffmpeg(cmd: List[str], label: str, duration: Optional[float] = None,
+                on_progress: Optional[ProgressCallback] = None) -> None:
+    """Run an FFmpeg command, converting failures into RuntimeError."""
+    try:
+        run_ffmpeg(cmd, duration, on_progress)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg failed for {label}: {e.stderr}")
+        raise RuntimeError(f"FFmpeg transcoding failed for {label}: {e.stderr}")
+    except UnicodeEncodeError as e:
+        logger.error(f"Encoding error during FFmpeg execution: {e}")
+        raise RuntimeError(f"Encoding error: {e}")
+
+
+class ProgressAggregator:
+    """Combine progress from several concurrent FFmpeg runs into one callback."""
+
+    def __init__(self, count: int, on_progress: Optional[ProgressCallback]):
+        self.on_progress = on_progress
+        self._fractions = [0.0] * count
+        self._speeds: List[Optional[float]] = [None] * count
+        self._lock = threading.Lock()
+
+    def part(self, idx: int) -> Optional[ProgressCallback]:
+        if self.on_progress is None:
+            return None
+
+        def report(fraction: float, speed: Optional[float]) -> None:
+            with self._lock:
+                self._fractions[idx] = fraction
+                self._speeds[idx] = speed
+                overall = sum(self._fractions) / len(self._fractions)
+                # The slowest run still going decides when the stage ends
+                running = [s for s, f in zip(self._speeds, self._fractions) if s and f < 1.0]
+                slowest = min(running) if running else speed
+            self.on_progress(overall, slowest)
+        return report
+
+
+def _split_threads(bitrate_settings: List[Dict], cores: int) -> List[int]:
+    """
+    Share ``cores`` between rungs in proportion to their own thread demand.
+
+    The shares never add up to more than ``cores`` (unless there are more rungs than
+    cores, each rung still getting one thread); rounding leftovers go to the largest rung.
+    """
+    demand = [threads_for_resolution(setting["resolution"]) for setting in bitrate_settings]
+    total = sum(demand)
+    if total <= cores:
+        return demand
+    shares = [max(1, cores * d // total) for d in demand]
+    largest = demand.index(max(demand))
+    shares[largest] += max(cores - sum(shares), 0)
+    while sum(shares) > cores and max(shares) > 1:
+        shares[shares.index(max(shares))] -= 1
+    return shares
+
+
+def _build_single_pass_command(input_path: str, output_dir: Path, bitrate_settings: List[Dict],
+                               transcode_params: Dict, cores: int) -> List[str]:
+    """Decode the input once and fan it out to every rung through a split/scale graph."""
+    count = len(bitrate_settings)
+    rung_threads = _split_threads(bitrate_settings, cores)
+    split_labels = "".join(f"[s{idx}]" for idx in range(count))
+    graph = [f"[0:v:0]split={count}{split_labels}"]
+    for idx, setting in enumerate(bitrate_settings):
+        width, height = setting["resolution"].split("x")
+        graph.append(f"[s{idx}]scale={width}:{height}[v{idx}]")
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-threads", str(max(rung_threads)), *input_args(input_path),
+        "-filter_complex_threads", str(max(rung_threads)),
+        "-filter_complex", ";".join(graph),
+    ]
+    for idx, setting in enumerate(bitrate_settings):
+        cmd.extend(["-map", f"[v{idx}]"])
+        cmd.extend(_rung_output_args(setting, transcode_params, rung_threads[idx]))
+        cmd.append(str(output_dir / setting["output_name"]))
+    return cmd
+
+
+def _build_rung_command(input_path: str, output_path: Path, setting: Dict,
+                        transcode_params: Dict, threads: int) -> List[str]:
+    """Standalone FFmpeg command for a single rung."""
+    cmd = [
+        "ffmpeg", "-y", "-threads", str(threads), *input_args(input_path),
+        "-map", "0:v",  # Map video stream
+        "-s:v", setting["resolution"],
+    ]
+    cmd.extend(_rung_output_args(setting, transcode_params, threads))
+    cmd.append(str(output_path))
+    return cmd
+
+
+def _unlink_outputs(paths: List[str]) -> None:
+    """
+    Remove existing outputs before FFmpeg writes them. ``-y`` truncates in place, and
+    an output left by an earlier attempt may be a hard link into the transcode cache.
+    """
+    for path in paths:
+        Path(path).unlink(missing_ok=True)
+
+
+def _transcode_rung(input_path: str, output_path: str, setting: Dict, transcode_params: Dict,
+                    duration: Optional[float] = None, on_progress: Optional[ProgressCallback] = None) -> str:
+    """Encode one rung once the core budget grants its threads."""
+    with core_budget.reserve(threads_for_resolution(setting["resolution"]), output_path) as threads:
+        cmd = _build_rung_command(input_path, Path(output_path), setting, transcode_params, threads)
+        _unlink_outputs([output_path])
+        with observe_stage("video_transcode", setting["resolution"]):
+            _run_ffmpeg(cmd, output_path, duration, on_progress)
+    logger.info(f"Transcoded video to {output_path}")
+    return output_path
+
+
+def transcode_plan(input_path: str, ladder: Optional[List[Dict]] = None, fragmented: bool = False) -> Dict:
+    """
+    Validate the input and decide how it will be encoded.
+
+    The plan holds everything that determines the transcoded output (ladder, profile,
+    pixel format, audio handling and the per-rung encoder arguments), so it doubles
+    as the parameter part of the transcode cache key. ``ladder`` overrides the default
+    rungs; either way rungs above the source resolution are dropped. ``fragmented``
+    writes GOP-aligned fragmented MP4 that mp4dash can package without mp4fragment.
 
+    Raises:
+        RuntimeError: If the input is not a valid media file.
+    """
     # Validate input file
     if not validate_input_file(input_path):
         logger.error(f"Invalid input file: {input_path}")
@@ -152,93 +443,155 @@ def transcode_video(input_path: str, output_dir: str) -> List[str]:
     # Get video stream info and transcode parameters
     stream_info = get_video_stream_info(input_path)
     transcode_params = select_transcode_params(stream_info)
+    transcode_params["fragmented"] = fragmented
     logger.info(f"Selected transcode params: profile={transcode_params['profile']}, pix_fmt={transcode_params['pix_fmt']}")
 
-    # Define output settings for different resolutions
-    bitrate_settings = [
-        {"resolution": "1920x1080", "bitrate": "3000k", "output_name": "output_1080p.mp4"},
-        {"resolution": "1280x720", "bitrate": "2000k", "output_name": "output_720p.mp4"},
-        {"resolution": "854x480", "bitrate": "1000k", "output_name": "output_480p.mp4"},
-        {"resolution": "640x360", "bitrate": "600k", "output_name": "output_360p.mp4"},
-    ]
+    source = probe(input_path)
+    bitrate_settings = select_ladder(source, ladder)
+    logger.info(f"Ladder for {input_path}: {', '.join(r['resolution'] + '@' + r['bitrate'] for r in bitrate_settings)}")
+    return {
+        "bitrate_settings": bitrate_settings,
+        "transcode_params": transcode_params,
+        "has_audio": has_audio,
+        "duration": source.duration,
+        # Thread counts don't change the output, so they are left out
+        "rung_args": [_rung_output_args(setting, transcode_params, 0) for setting in bitrate_settings],
+    }
 
-    outputs = []
-    for setting in bitrate_settings:
-        output_path = output_dir / setting["output_name"]
-        
-        # Base FFmpeg command
-        cmd = [
-            "ffmpeg", "-y", "-i", str(input_path),
-            "-map", "0:v",  # Map video stream
-            "-c:v", "libx264",
-            "-preset", "medium",
-            "-pix_fmt", transcode_params["pix_fmt"],
-            "-r", "24",  # Frame rate
-            "-b:v", setting["bitrate"],
-            "-s:v", setting["resolution"],
-            "-g", "48",  # GOP size (2 seconds at 24 fps)
-            "-keyint_min", "48",  # Minimum keyframe interval
-            "-sc_threshold", "0",  # Disable scene-based keyframes
-            "-movflags", "+faststart",  # Optimize for web
-            "-profile:v", transcode_params["profile"],
-            "-level", "4.0",
-        ]
 
-        # Add audio if present
-        if has_audio:
-            cmd.extend(["-map", "0:a", "-c:a", "aac", "-b:a", "128k", "-ac", "2"])
-        else:
-            cmd.append("-an")  # No audio
+def transcode_video(input_path: str, output_dir: str, single_pass: Optional[bool] = None, plan: Optional[Dict] = None,
+                    on_progress: Optional[ProgressCallback] = None) -> List[str]:
+    """
+    Transcode video into multiple resolutions with optimized FFmpeg settings for streaming.
+    
+    Args:
+        input_path (str): Path to input video file, or a presigned URL for a streamed source.
+        output_dir (str): Directory to save transcoded outputs.
+        single_pass (bool, optional): Decode the input once and encode every rung in one
+            FFmpeg process. Otherwise rungs run as separate processes in parallel. Either
+            way threads are granted from the node-wide core budget.
+            Defaults to ``settings.TRANSCODE_SINGLE_PASS``.
+        plan (dict, optional): Result of ``transcode_plan`` if the caller already has it.
+        on_progress (callable, optional): Called with ``(fraction, speed)`` as the ladder encodes.
+        
+    Returns:
+        List[str]: List of paths to transcoded (video-only) files.
+        
+    Raises:
+        RuntimeError: If input validation or FFmpeg transcoding fails.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if single_pass is None:
+        single_pass = settings.TRANSCODE_SINGLE_PASS
+    if plan is None:
+        plan = transcode_plan(input_path)
 
-        cmd.append(str(output_path))
+    bitrate_settings = plan["bitrate_settings"]
+    transcode_params = plan["transcode_params"]
+    duration = plan.get("duration")
+    outputs = [str(output_dir / setting["output_name"]) for setting in bitrate_settings]
 
-        try:
-            result = subprocess.run(
-                cmd,
-                check=True,
-                capture_output=True,
-                text=True,
-                encoding="utf-8"  # Ensure UTF-8 for logs
-            )
+    if single_pass:
+        demand = sum(threads_for_resolution(setting["resolution"]) for setting in bitrate_settings)
+        with core_budget.reserve(demand, str(input_path)) as cores:
+            cmd = _build_single_pass_command(input_path, output_dir, bitrate_settings, transcode_params, cores)
+            _unlink_outputs(outputs)
+            with observe_stage("video_transcode", *(setting["resolution"] for setting in bitrate_settings)):
+                _run_ffmpeg(cmd, f"{len(bitrate_settings)} renditions of {input_path}", duration, on_progress)
+        for output_path in outputs:
             logger.info(f"Transcoded video to {output_path}")
-            outputs.append(str(output_path))
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg failed for {output_path}: {e.stderr}")
-            raise RuntimeError(f"FFmpeg transcoding failed for {output_path}: {e.stderr}")
-        except UnicodeEncodeError as e:
-            logger.error(f"Encoding error during FFmpeg execution: {e}")
-            raise RuntimeError(f"Encoding error: {e}")
+        return outputs
+
+    progress = ProgressAggregator(len(bitrate_settings), on_progress)
+    with ThreadPoolExecutor(max_workers=len(bitrate_settings)) as pool:
+        futures = [
+            pool.submit(_transcode_rung, input_path, output_path, setting, transcode_params, duration, progress.part(idx))
+            for idx, (setting, output_path) in enumerate(zip(bitrate_settings, outputs))
+        ]
+        for future in futures:
+            future.result()
 
     return outputs
 
 
-def transcode_audio(input_path: str, output_dir: str, language: str, isPaid: bool) -> Dict[str, str]:
+# Track name of the source's own audio when no external audio tracks are supplied
+MAIN_AUDIO_LANGUAGE = "original"
+SURROUND_SUFFIX = "_51"
+
+
+def audio_ladder(source: Optional[ProbeResult] = None) -> Dict[str, List[str]]:
+    """
+    AAC renditions to encode for an audio input, lowest bitrate first.
+
+    Stereo renditions come from ``settings.AUDIO_LADDER``; a source with at least six
+    channels also gets a 5.1 rendition (named e.g. ``384k_51``).
+    """
+    ladder = {
+        bitrate: ["-b:a", bitrate, "-ac", "2"]
+        for bitrate in (b.strip() for b in settings.AUDIO_LADDER.split(","))
+        if bitrate
+    }
+    streams = source.audio_streams if source else []
+    if settings.AUDIO_SURROUND_BITRATE and streams and (streams[0].channels or 0) >= 6:
+        ladder[f"{settings.AUDIO_SURROUND_BITRATE}{SURROUND_SUFFIX}"] = ["-b:a", settings.AUDIO_SURROUND_BITRATE, "-ac", "6"]
+    if not ladder:
+        raise ValueError("AUDIO_LADDER must list at least one bitrate")
+    return ladder
+
+
+def audio_transcode_params(isPaid: bool, ladder: Dict[str, List[str]], fragmented: bool = False) -> Dict:
+    """Everything that determines transcode_audio output, for cache keys."""
+    return {"codec": "aac", "ladder": ladder, "container": "mp4" if isPaid else "aac", "fragmented": isPaid and fragmented}
+
+
+def transcode_audio(input_path: str, output_dir: str, language: str, isPaid: bool,
+                    on_progress: Optional[ProgressCallback] = None,
+                    ladder: Optional[Dict[str, List[str]]] = None, fragmented: bool = False) -> Dict[str, str]:
+    """
+    Encode the audio ladder for one track.
+
+    The input is decoded once and every rendition is written by the same FFmpeg
+    process, one output per entry of ``ladder`` (default: ``audio_ladder`` for the input).
+    With ``fragmented`` MP4 outputs are cut into fragments of one video GOP.
+
+    Returns:
+        Dict[str, str]: Rendition name (e.g. ``128k``) -> encoded file.
+    """
     output_dir = Path(output_dir) / language
     output_dir.mkdir(parents=True, exist_ok=True)
-    
-    bitrates = {
-        "128k": ["-b:a", "128k"]
-    }
-    
+
+    try:
+        source = probe(input_path)
+    except (subprocess.CalledProcessError, json.JSONDecodeError):
+        source = None
+    if ladder is None:
+        ladder = audio_ladder(source)
+    duration = source.duration if source else None
+
     outputs = {}
-    for br, params in bitrates.items():
-        output_path = output_dir / f"{br}.{'mp4' if isPaid else 'aac'}"
-        cmd = [
-            "ffmpeg", "-y", "-i", input_path,
+    cmd = ["ffmpeg", "-y", "-threads", "1", *input_args(input_path)]
+    for name, params in ladder.items():
+        output_path = output_dir / f"{name}.{'mp4' if isPaid else 'aac'}"
+        cmd.extend([
+            "-map", "0:a:0",  # First audio stream, also when the input is the video source
             "-c:a", "aac", *params,
             "-vn"  # Exclude video for both MP4 and AAC
-        ]
+        ])
         if isPaid:
-            cmd.append("-f")
-            cmd.append("mp4")
+            cmd.extend(["-f", "mp4"])
+            if fragmented:
+                # Every AAC frame is a sync sample, so fragments are cut by duration instead
+                cmd.extend(["-movflags", FRAGMENTED_MOVFLAGS, "-frag_duration", str(GOP_SECONDS * 1_000_000)])
         cmd.append(str(output_path))
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-            outputs[br] = str(output_path).replace('\\', '/')  # Normalize path
-            logger.info(f"Transcoded audio to {output_path}")
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg audio transcoding failed for {output_path}: {e.stderr}")
-            raise RuntimeError(f"FFmpeg audio transcoding failed: {e.stderr}")
-    return outputs
+        outputs[name] = str(output_path).replace('\\', '/')  # Normalize path
 
+    _unlink_outputs(list(outputs.values()))
+    try:
+        with core_budget.reserve(1, f"{language} audio"), observe_stage("audio_transcode", language):
+            run_ffmpeg(cmd, duration, on_progress)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg audio transcoding failed for {language}: {e.stderr}")
+        raise RuntimeError(f"FFmpeg audio transcoding failed: {e.stderr}")
+    logger.info(f"Transcoded {language} audio to {', '.join(outputs)}")
+    return outputs
@@ -0,0 +1,112 @@
+# worker/services/metrics.py
+import logging
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from config.settings import settings
+from core.workspace import workspace_manager
+
+logger = logging.getLogger(__name__)
+
+# Pipeline steps span sub-second probes to hour-long ladder encodes
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400)
+
+STAGE_SECONDS = Histogram(
+    "drm_worker_stage_seconds",
+    "Wall time of pipeline steps (download, probe, subtitle_convert, video_transcode, audio_transcode, "
+    "fragment, mp4dash, hls_segment, upload)",
+    ["stage", "rung"],
+    buckets=STAGE_BUCKETS
+)
+STAGE_FAILURES = Counter("drm_worker_stage_failures_total", "Pipeline steps that raised", ["stage"])
+JOBS_TOTAL = Counter("drm_worker_jobs_total", "Finished jobs by outcome", ["status"])
+
+QUEUE_DEPTH = Gauge("drm_worker_queue_depth", "Jobs waiting in the durable job queue")
+JOBS_RUNNING = Gauge("drm_worker_jobs_running", "Jobs currently being processed")
+FFMPEG_ACTIVE = Gauge("drm_worker_ffmpeg_processes", "FFmpeg processes currently running")
+SCRATCH_DISK_BYTES = Gauge("drm_worker_scratch_disk_bytes", "Bytes in job_<id>/ workspaces (running and kept finished jobs)")
+OUTPUT_FILESYSTEM_BYTES = Gauge("drm_worker_output_filesystem_bytes", "Filesystem holding OUTPUT_DIR", ["kind"])
+
+S3_BYTES = Counter("drm_worker_s3_bytes_total", "Bytes moved to/from S3", ["direction"])
+S3_BYTES_PER_SECOND = Gauge("drm_worker_s3_bytes_per_second", "Throughput of the most recent S3 batch", ["direction"])
+
+_listeners: List[Callable[[str, str, float], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def add_stage_listener(listener: Callable[[str, str, float], None]) -> None:
+    """Also send every observed ``(stage, rung, seconds)`` to ``listener`` (used by the benchmarks)."""
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_stage_listener(listener: Callable[[str, str, float], None]) -> None:
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+@contextmanager
+def observe_stage(stage: str, *rungs: str) -> Iterator[None]:
+    """
+    Time a pipeline step into ``drm_worker_stage_seconds``; failures are counted but not timed.
+
+    A step producing several rungs at once (single-pass FFmpeg writes every rung of the
+    ladder) records the wall time under each rung, as rungs encoded in parallel do.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    except BaseException:
+        STAGE_FAILURES.labels(stage=stage).inc()
+        raise
+    seconds = time.monotonic() - started
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for rung in rungs or ("",):
+        STAGE_SECONDS.labels(stage=stage, rung=rung).observe(seconds)
+        for listener in listeners:
+            try:
+                listener(stage, rung, seconds)
+            except Exception as e:
+                logger.warning(f"Stage listener failed: {e}")
+
+
+@contextmanager
+def track_ffmpeg() -> Iterator[None]:
+    FFMPEG_ACTIVE.inc()
+    try:
+        yield
+    finally:
+        FFMPEG_ACTIVE.dec()
+
+
+def count_s3_bytes(direction: str, total_bytes: int) -> None:
+    S3_BYTES.labels(direction=direction).inc(total_bytes)
+
+
+def record_s3_throughput(direction: str, total_bytes: int, seconds: float) -> None:
+    if seconds > 0:
+        S3_BYTES_PER_SECOND.labels(direction=direction).set(total_bytes / seconds)
+
+
+def _disk_usage(kind: str) -> float:
+    path = Path(settings.OUTPUT_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return getattr(shutil.disk_usage(path), kind)
+
+
+for _kind in ("used", "free", "total"):
+    OUTPUT_FILESYSTEM_BYTES.labels(kind=_kind).set_function(lambda kind=_kind: _disk_usage(kind))
+SCRATCH_DISK_BYTES.set_function(workspace_manager.total_bytes)
+
+
+def render_metrics():
+    """Body and content type for the ``/metrics`` endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,64 @@
+# worker/services/mp4_boxes.py
+import struct
+from typing import Callable, Iterator, Optional, Tuple
+
+# read_at(offset, length) -> bytes; may return fewer bytes at end of file
+ReadAt = Callable[[int, int], bytes]
+
+
+def iter_top_level_boxes(read_at: ReadAt, file_size: Optional[int] = None, max_boxes: int = 64) -> Iterator[Tuple[str, int, int]]:
+    """
+    Walk the top-level ISO-BMFF boxes of a file, reading only box headers.
+
+    Yields:
+        (box_type, offset, size) for each box. A size of 0 means "to end of file".
+    """
+    offset = 0
+    for _ in range(max_boxes):
+        if file_size is not None and offset >= file_size:
+            return
+        header = read_at(offset, 16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header[:8])
+        box_type = box_type.decode("latin-1")
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack(">Q", header[8:16])[0]
+        elif size == 0:
+            yield box_type, offset, 0
+            return
+        if size < 8:
+            return  # Corrupt header, stop rather than loop
+        yield box_type, offset, size
+        offset += size
+
+
+def is_faststart(read_at: ReadAt, file_size: Optional[int] = None) -> bool:
+    """True if the ``moov`` box comes before the first ``mdat`` (progressive download friendly)."""
+    for box_type, _, _ in iter_top_level_boxes(read_at, file_size):
+        if box_type == "moov":
+            return True
+        if box_type == "mdat":
+            return False
+    return False
+
+
+def is_fragmented(read_at: ReadAt, file_size: Optional[int] = None) -> bool:
+    """True if the file carries its media in ``moof`` fragments (as mp4fragment would write it)."""
+    for box_type, _, _ in iter_top_level_boxes(read_at, file_size):
+        if box_type == "moof":
+            return True
+        if box_type == "mdat":
+            return False
+    return False
+
+
+def file_reader(path: str) -> ReadAt:
+    """read_at() over a local file; opens the file per call so it is safe to share between threads."""
+    def read_at(offset: int, length: int) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+    return read_at
@@ -1,26 +1,159 @@
 # worker/services/notify_controller.py
 import requests
 import logging
+import threading
+import time
+from collections import deque
+from requests.adapters import HTTPAdapter
 from config.settings import settings
 
-from typing import Optional
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+
+class ControllerNotifier:
+    """
+    Sends status/progress updates to the controller from a background thread.
+
+    Calls only append to a bounded in-memory outbox, so the job pipeline never waits
+    on the controller. A progress update replaces the job's previous one if that is
+    still queued, failed posts are retried with exponential backoff (in order, so a
+    job's final status never overtakes its progress), and ``flush`` lets a finished
+    job wait briefly for its updates to go out.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, max_outbox: Optional[int] = None, timeout: Optional[float] = None,
+                 retries: Optional[int] = None, backoff: Optional[float] = None):
+        self.base_url = base_url
+        self.max_outbox = max_outbox or settings.NOTIFY_OUTBOX_SIZE
+        self.timeout = timeout or settings.NOTIFY_TIMEOUT
+        self.retries = settings.NOTIFY_RETRIES if retries is None else retries
+        self.backoff = settings.NOTIFY_RETRY_BACKOFF if backoff is None else backoff
+        self._outbox = deque()
+        self._last_entry: Dict[str, Dict] = {}
+        self._pending: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.stats = {"sent": 0, "coalesced": 0, "retried": 0, "dropped": 0, "failed": 0}
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="controller-notifier", daemon=True)
+            self._thread.start()
+
+    def _drop_one(self) -> None:
+        """Make room in a full outbox, sacrificing the oldest progress update before any status."""
+        victim = next((e for e in self._outbox if e["kind"] == "progress"), self._outbox[0])
+        self._outbox.remove(victim)
+        self._settle(victim)
+        self.stats["dropped"] += 1
+        logger.warning(f"⚠️ Controller outbox full, dropped {victim['kind']} update for job {victim['job_id']}")
+
+    def _settle(self, entry: Dict) -> None:
+        job_id = entry["job_id"]
+        self._pending[job_id] -= 1
+        if not self._pending[job_id]:
+            del self._pending[job_id]
+        if self._last_entry.get(job_id) is entry:
+            del self._last_entry[job_id]
+        self._cond.notify_all()
+
+    def submit(self, job_id: str, kind: str, payload: Dict) -> None:
+        job_id = str(job_id)
+        with self._cond:
+            last = self._last_entry.get(job_id)
+            if kind == "progress" and last is not None and last["kind"] == "progress" and last["queued"]:
+                last["payload"] = payload
+                self.stats["coalesced"] += 1
+                return
+            if len(self._outbox) >= self.max_outbox:
+                self._drop_one()
+            entry = {"job_id": job_id, "kind": kind, "payload": payload, "queued": True}
+            self._outbox.append(entry)
+            self._last_entry[job_id] = entry
+            self._pending[job_id] = self._pending.get(job_id, 0) + 1
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def _post(self, entry: Dict) -> bool:
+        base_url = self.base_url or settings.API_BASE_URL
+        url = f"{base_url}/queue/{entry['job_id']}/{entry['kind']}"
+        for attempt in range(self.retries + 1):
+            try:
+                response = self._session.post(url, json=entry["payload"], timeout=self.timeout)
+                if response.status_code < 500 and response.status_code != 429:
+                    if response.status_code >= 400:
+                        logger.warning(f"⚠️ Controller rejected {entry['kind']} for job {entry['job_id']}: HTTP {response.status_code}")
+                    return response.status_code < 400
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt < self.retries:
+                delay = self.backoff * (2 ** attempt)
+                self.stats["retried"] += 1
+                logger.warning(f"⚠️ Failed to send {entry['kind']} for job {entry['job_id']} ({error}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        logger.warning(f"⚠️ Giving up on {entry['kind']} for job {entry['job_id']}: {error}")
+        return False
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._outbox:
+                    self._cond.wait()
+                entry = self._outbox.popleft()
+                entry["queued"] = False
+            try:
+                sent = self._post(entry)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to send {entry['kind']}: {e}")
+                sent = False
+            with self._cond:
+                self.stats["sent" if sent else "failed"] += 1
+                self._settle(entry)
+
+    def flush(self, job_id: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """Wait until the job's (or every) queued update has been delivered or given up on."""
+        if timeout is None:
+            timeout = settings.NOTIFY_FLUSH_TIMEOUT
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (str(job_id) in self._pending) if job_id is not None else self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"⚠️ Timed out flushing controller updates for {job_id or 'all jobs'}")
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {**self.stats, "outbox": len(self._outbox), "jobs_pending": len(self._pending)}
+
+
+notifier = ControllerNotifier()
+
+
 def update_status(job_id, status):
-    try:
-        logger.info(f"📡 Reporting status '{status}' for job {job_id}")
-        requests.post(f"{settings.API_BASE_URL}/queue/{job_id}/status", json={"status": status}, timeout=10)
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to send status: {e}")
+    logger.info(f"📡 Reporting status '{status}' for job {job_id}")
+    notifier.submit(job_id, "status", {"status": status})
 
-def update_progress(job_id: str, percent: int, duration: Optional[float] = None):
+def update_progress(job_id: str, percent: int, duration: Optional[float] = None,
+                    eta_seconds: Optional[float] = None, speed: Optional[float] = None):
     payload = {"progress": percent}
     if duration is not None:
         payload["duration"] = duration
+    if eta_seconds is not None:
+        payload["eta_seconds"] = eta_seconds
+    if speed is not None:
+        payload["speed"] = speed
+
+    logger.info(f"📶 Reporting progress {percent}% for job {job_id}")
+    notifier.submit(job_id, "progress", payload)
 
-    try:
-        logger.info(f"📶 Reporting progress {percent}% for job {job_id}")
-        requests.post(f"{settings.API_BASE_URL}/queue/{job_id}/progress", json=payload, timeout=10)
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to send progress: {e}")
+def flush_notifications(job_id: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+    return notifier.flush(job_id, timeout)
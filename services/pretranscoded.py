@@ -0,0 +1,170 @@
+# worker/services/pretranscoded.py
+import logging
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+from config.settings import settings
+from services.ffmpeg_service import run_ffmpeg
+from services.metrics import observe_stage
+from services.probe import probe, probe_keyframes
+
+logger = logging.getLogger(__name__)
+
+# What mp4fragment/mp4dash and the HLS segmenter can package without re-encoding
+ALLOWED_CODECS = ("h264",)
+ALLOWED_PROFILES = ("baseline", "constrained baseline", "main", "high")
+ALLOWED_PIX_FMTS = ("yuv420p",)
+# Keyframes of different renditions must line up within this many seconds
+KEYFRAME_TOLERANCE = 0.05
+
+
+class RenditionCheckError(Exception):
+    """Pre-encoded renditions can't be packaged as delivered."""
+
+
+def demux_renditions(input_path: str, output_dir: str) -> List[str]:
+    """
+    Split a multi-rendition source into one MP4 per video stream without re-encoding.
+
+    Renditions are video-only, like the ones ``transcode_video`` writes; the audio is
+    encoded separately from the source. A source with a single video stream is
+    returned as is.
+    """
+    video_streams = [s for s in probe(input_path).streams if s.codec_type == "video"]
+    if len(video_streams) <= 1:
+        return [str(input_path)]
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    outputs = []
+    for idx in range(len(video_streams)):
+        output_path = output_dir / f"rendition_{idx}.mp4"
+        cmd = [
+            "ffmpeg", "-y", "-i", str(input_path),
+            "-map", f"0:v:{idx}", "-an",
+            "-c", "copy", "-movflags", "+faststart",
+            str(output_path)
+        ]
+        with observe_stage("demux"):
+            run_ffmpeg(cmd)
+        outputs.append(str(output_path))
+    logger.info(f"Demuxed {len(outputs)} renditions from {input_path}")
+    return outputs
+
+
+def _check_stream(path: str) -> List[str]:
+    video = probe(path).video
+    if video is None:
+        return [f"{path}: no video stream"]
+    problems = []
+    if video.codec_name not in ALLOWED_CODECS:
+        problems.append(f"{path}: codec {video.codec_name} is not H.264")
+    if (video.profile or "").lower() not in ALLOWED_PROFILES:
+        problems.append(f"{path}: profile {video.profile} is not supported")
+    if video.level and video.level > settings.PRETRANSCODED_MAX_LEVEL:
+        problems.append(f"{path}: level {video.level / 10:.1f} is above {settings.PRETRANSCODED_MAX_LEVEL / 10:.1f}")
+    if video.pix_fmt not in ALLOWED_PIX_FMTS:
+        problems.append(f"{path}: pixel format {video.pix_fmt} is not yuv420p")
+    return problems
+
+
+def _check_gops(paths: List[str]) -> List[str]:
+    """Keyframes must be frequent enough to cut segments and sit at the same times in every rendition."""
+    problems = []
+    reference_path, reference = None, None
+    for path in paths:
+        keyframes = probe_keyframes(path)
+        if not keyframes:
+            problems.append(f"{path}: no keyframes found")
+            continue
+        gops = [b - a for a, b in zip(keyframes, keyframes[1:])]
+        if gops and max(gops) > settings.PRETRANSCODED_MAX_GOP_SECONDS + KEYFRAME_TOLERANCE:
+            problems.append(f"{path}: GOP of {max(gops):.2f}s exceeds {settings.PRETRANSCODED_MAX_GOP_SECONDS}s")
+        if reference is None:
+            reference_path, reference = path, keyframes
+            continue
+        overlap = min(len(reference), len(keyframes))
+        if abs(len(reference) - len(keyframes)) > 1 or any(
+            abs(a - b) > KEYFRAME_TOLERANCE for a, b in zip(reference[:overlap], keyframes[:overlap])
+        ):
+            problems.append(f"{path}: keyframes are not aligned with {reference_path}")
+    return problems
+
+
+def check_renditions(paths: List[str]) -> None:
+    """
+    Verify pre-encoded renditions meet the packaging requirements.
+
+    Raises:
+        RenditionCheckError: Listing every problem found.
+    """
+    problems = []
+    for path in paths:
+        problems.extend(_check_stream(path))
+    heights = [probe(path).video.height for path in paths if probe(path).video]
+    if len(set(heights)) != len(heights):
+        problems.append("renditions must have distinct heights")
+    if not problems:
+        problems.extend(_check_gops(paths))
+    if problems:
+        raise RenditionCheckError("; ".join(problems))
+
+
+def top_rendition(paths: List[str]) -> str:
+    """The rendition with the most pixels, used as the transcode input on fallback."""
+    def pixels(path: str) -> int:
+        video = probe(path).video
+        return (video.width or 0) * (video.height or 0) if video else 0
+    return max(paths, key=pixels)
+
+
+def prepare_renditions(sources: List[str], output_dir: str) -> Optional[List[str]]:
+    """
+    Turn delivered renditions into the ladder packaging expects, without encoding.
+
+    Args:
+        sources: Downloaded rendition files, or a single (possibly multi-rendition) file.
+        output_dir: Transcode directory; renditions are linked in as ``output_<height>p.mp4``.
+
+    Returns:
+        Rendition paths, highest first, or None if the renditions failed validation or
+        could not be remuxed (partial outputs are removed) and the job has to be transcoded.
+    """
+    try:
+        renditions = demux_renditions(sources[0], str(Path(output_dir) / "demuxed")) if len(sources) == 1 else list(sources)
+        check_renditions(renditions)
+    except RenditionCheckError as e:
+        logger.warning(f"⚠️ Pre-transcoded renditions rejected, falling back to transcoding: {e}")
+        return None
+    except (subprocess.CalledProcessError, RuntimeError) as e:
+        logger.warning(f"⚠️ Could not inspect pre-transcoded renditions, falling back to transcoding: {e}")
+        return None
+
+    output_dir = Path(output_dir)
+    outputs = []
+    try:
+        for path in sorted(renditions, key=lambda p: probe(p).video.height, reverse=True):
+            target = output_dir / f"output_{probe(path).video.height}p.mp4"
+            if target.exists():
+                target.unlink()
+            outputs.append(str(target))
+            if probe(path).has_audio:
+                # Audio is packaged from its own track; keep the rungs video-only
+                with observe_stage("demux"):
+                    run_ffmpeg(["ffmpeg", "-y", "-i", str(path), "-map", "0:v:0", "-an", "-c", "copy",
+                                "-movflags", "+faststart", str(target)])
+            else:
+                try:
+                    os.link(path, target)
+                except OSError:
+                    shutil.copy2(path, target)
+    except (subprocess.CalledProcessError, RuntimeError, OSError) as e:
+        logger.warning(f"⚠️ Could not prepare pre-transcoded renditions, falling back to transcoding: {e}")
+        for target in outputs:
+            Path(target).unlink(missing_ok=True)
+        return None
+    logger.info(f"✅ Using {len(outputs)} pre-transcoded renditions: {[Path(o).name for o in outputs]}")
+    return outputs
@@ -0,0 +1,207 @@
+# worker/services/probe.py
+import json
+import logging
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class StreamInfo:
+    """One stream from ``ffprobe -show_streams``."""
+    index: int
+    codec_type: str
+    codec_name: str = ""
+    profile: str = ""
+    level: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    pix_fmt: str = ""
+    bit_rate: Optional[int] = None
+    channels: Optional[int] = None
+    sample_rate: Optional[int] = None
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "StreamInfo":
+        return cls(
+            index=_to_int(data.get("index")) or 0,
+            codec_type=data.get("codec_type", ""),
+            codec_name=data.get("codec_name", ""),
+            profile=data.get("profile", ""),
+            level=_to_int(data.get("level")),
+            width=_to_int(data.get("width")),
+            height=_to_int(data.get("height")),
+            pix_fmt=data.get("pix_fmt", ""),
+            bit_rate=_to_int(data.get("bit_rate")),
+            channels=_to_int(data.get("channels")),
+            sample_rate=_to_int(data.get("sample_rate")),
+            raw=data,
+        )
+
+
+@dataclass
+class ProbeResult:
+    """Format and stream details of a media file from a single ffprobe run."""
+    path: str
+    format_name: str
+    duration: Optional[float]
+    bit_rate: Optional[int]
+    size: Optional[int]
+    streams: List[StreamInfo]
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_json(cls, path: str, data: Dict[str, Any]) -> "ProbeResult":
+        fmt = data.get("format", {})
+        return cls(
+            path=path,
+            format_name=fmt.get("format_name", ""),
+            duration=_to_float(fmt.get("duration")),
+            bit_rate=_to_int(fmt.get("bit_rate")),
+            size=_to_int(fmt.get("size")),
+            streams=[StreamInfo.from_json(s) for s in data.get("streams", [])],
+            raw=data,
+        )
+
+    @property
+    def video(self) -> Optional[StreamInfo]:
+        """First video stream, if any."""
+        return next((s for s in self.streams if s.codec_type == "video"), None)
+
+    @property
+    def audio_streams(self) -> List[StreamInfo]:
+        return [s for s in self.streams if s.codec_type == "audio"]
+
+    @property
+    def has_audio(self) -> bool:
+        return bool(self.audio_streams)
+
+
+class _ProbeCache:
+    """LRU of probe results keyed by (path, size, mtime)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, ProbeResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[ProbeResult]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Tuple, result: ProbeResult) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _ProbeCache(settings.PROBE_CACHE_SIZE)
+
+
+def is_remote_source(path: str) -> bool:
+    """True for inputs ffmpeg reads over HTTP (e.g. presigned S3 URLs)."""
+    return str(path).startswith(("http://", "https://"))
+
+
+def _cache_key(path: str) -> Tuple:
+    if is_remote_source(path):
+        # A presigned URL names one object version for its lifetime
+        return (path,)
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def probe(path: str) -> ProbeResult:
+    """Run ``ffprobe -show_format -show_streams`` once per file version and memoize the result.
+
+    ``path`` may also be an HTTP(S) URL; only the header is read in that case.
+
+    Raises:
+        subprocess.CalledProcessError: If ffprobe rejects the file or a local file can't be read.
+        json.JSONDecodeError: If ffprobe output is not valid JSON.
+    """
+    path = str(path)
+    try:
+        key = _cache_key(path)
+    except OSError as e:
+        # Fail the way ffprobe itself would, so callers handle a missing file as before
+        raise subprocess.CalledProcessError(1, ["ffprobe", path], output="", stderr=f"{path}: {e.strerror}") from e
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    cmd = [
+        "ffprobe", "-v", "error", "-show_format",
+        "-show_streams", "-of", "json", path
+    ]
+    with observe_stage("probe"):
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    probed = ProbeResult.from_json(path, json.loads(result.stdout))
+    _cache.put(key, probed)
+    logger.debug(f"Probed {path}: {len(probed.streams)} streams, duration={probed.duration}")
+    return probed
+
+
+def probe_keyframes(path: str, stream: str = "v:0") -> List[float]:
+    """Presentation times of the keyframes in a video stream, read from packet flags (no decoding).
+
+    Raises:
+        subprocess.CalledProcessError: If ffprobe rejects the file.
+    """
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", stream,
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(path)
+    ]
+    with observe_stage("probe", "keyframes"):
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def get_probe_cache_stats() -> Dict[str, int]:
+    return {"hits": _cache.hits, "misses": _cache.misses, "entries": len(_cache._entries)}
+
+
+def clear_probe_cache() -> None:
+    _cache.clear()
@@ -101,13 +101,21 @@
 import boto3
 import os
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from typing import Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 from pathlib import Path
 from sqlalchemy.orm import Session
 from botocore.exceptions import ClientError, EndpointConnectionError
 from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 from core.database import get_db
 from core.models import S3Credential
+from config.settings import settings
+from services.mp4_boxes import is_faststart
+from services.metrics import observe_stage, count_s3_bytes, record_s3_throughput
 
 logger = logging.getLogger(__name__)
 
@@ -119,13 +127,15 @@ def get_s3_client(aws_access_key_id, aws_secret_access_key, region_name="ap-sout
             'mode': 'standard'
         },
         connect_timeout=10,
-        read_timeout=30
+        read_timeout=30,
+        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS
     )
     return boto3.client(
         "s3",
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
         region_name=region_name,
+        endpoint_url=settings.S3_ENDPOINT_URL,
         config=config
     )
 
@@ -140,18 +150,103 @@ def get_s3_credentials_from_db(s3_credential_id: int, db: Session):
         "region": credentials.region or "us-east-1"
     }
 
+# S3 error codes that mean cached credentials should be re-read from the DB
+AUTH_ERROR_CODES = {"InvalidAccessKeyId", "SignatureDoesNotMatch", "ExpiredToken", "AccessDenied"}
+
+
+class _S3ClientCache:
+    """Process-wide cache of S3 credential rows and ready boto3 clients.
+
+    boto3 clients are thread-safe, so one client (and its connection pool) is
+    shared by every executor thread using the same credentials.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._credentials: Dict[str, tuple] = {}
+        self._clients: Dict[tuple, tuple] = {}
+        self.stats = {"credential_hits": 0, "credential_misses": 0, "client_hits": 0, "client_misses": 0}
+
+    def get_client(self, s3_credential_id, db: Session):
+        # The DB query and client construction run outside the lock so a slow DB or
+        # client build for one credential doesn't stall threads using the others
+        cred_key = str(s3_credential_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._credentials.get(cred_key)
+            credentials = cached[0] if cached and cached[1] > now else None
+            self.stats["credential_hits" if credentials else "credential_misses"] += 1
+        if credentials is None:
+            credentials = get_s3_credentials_from_db(s3_credential_id, db)
+            with self._lock:
+                self._credentials[cred_key] = (credentials, now + self.ttl_seconds)
+                # Rotated keys must not keep using a client built from the old ones
+                for client_key in [k for k, v in self._clients.items() if k[0] == cred_key and v[2] != credentials]:
+                    del self._clients[client_key]
+
+        client_key = (cred_key, credentials["region"])
+        with self._lock:
+            cached = self._clients.get(client_key)
+            if cached and cached[1] > now and cached[2] == credentials:
+                self.stats["client_hits"] += 1
+                return cached[0]
+            self.stats["client_misses"] += 1
+        client = get_s3_client(
+            aws_access_key_id=credentials["access_key"],
+            aws_secret_access_key=credentials["secret_key"],
+            region_name=credentials["region"]
+        )
+        with self._lock:
+            cached = self._clients.get(client_key)
+            if cached and cached[1] > now and cached[2] == credentials:
+                return cached[0]  # Another thread built one meanwhile; share its connection pool
+            self._clients[client_key] = (client, now + self.ttl_seconds, credentials)
+        return client
+
+    def invalidate(self, s3_credential_id=None) -> None:
+        with self._lock:
+            if s3_credential_id is None:
+                self._credentials.clear()
+                self._clients.clear()
+                return
+            cred_key = str(s3_credential_id)
+            self._credentials.pop(cred_key, None)
+            for client_key in [k for k in self._clients if k[0] == cred_key]:
+                del self._clients[client_key]
+
+
+_client_cache = _S3ClientCache(settings.S3_CLIENT_CACHE_TTL)
+
+
+def get_cached_s3_client(s3_credential_id, db: Session):
+    """Return a shared S3 client for the credential id, querying the DB only on a cache miss."""
+    return _client_cache.get_client(s3_credential_id, db)
+
+
+def invalidate_s3_cache(s3_credential_id=None) -> None:
+    """Drop cached credentials and clients for one credential id, or for all of them."""
+    _client_cache.invalidate(s3_credential_id)
+
+
+def get_s3_cache_stats() -> Dict[str, int]:
+    with _client_cache._lock:
+        return dict(_client_cache.stats)
+
+
+def _invalidate_on_auth_error(error: ClientError, s3_credential_id) -> None:
+    if error.response.get("Error", {}).get("Code") in AUTH_ERROR_CODES:
+        logger.warning(f"S3 rejected credentials {s3_credential_id}, dropping cached client")
+        invalidate_s3_cache(s3_credential_id)
+
+
 def download_from_s3(s3_url: str, destination_path: str, s3_credential_id: int, db: Session):
     """Download a file from S3 with retry logic."""
     parsed = urlparse(s3_url)
     bucket = parsed.netloc
     key = parsed.path.lstrip("/")
 
-    credentials = get_s3_credentials_from_db(s3_credential_id, db)
-    s3 = get_s3_client(
-        aws_access_key_id=credentials["access_key"],
-        aws_secret_access_key=credentials["secret_key"],
-        region_name=credentials["region"]
-    )
+    s3 = get_cached_s3_client(s3_credential_id, db)
 
     logger.info(f"⬇️ Downloading from s3://{bucket}/{key} to {destination_path}")
     try:
@@ -162,11 +257,243 @@ def download_from_s3(s3_url: str, destination_path: str, s3_credential_id: int,
     except ClientError as e:
         error_code = e.response['Error']['Code']
         logger.error(f"S3 ClientError: {error_code} - {e}")
+        _invalidate_on_auth_error(e, s3_credential_id)
         raise
     except Exception as e:
         logger.error(f"Unexpected error downloading from S3: {e}")
         raise
 
+def _s3_range_reader(s3, bucket: str, key: str):
+    """read_at() for mp4_boxes backed by ranged GETs."""
+    def read_at(offset: int, length: int) -> bytes:
+        try:
+            response = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return b""
+            raise
+        return response["Body"].read()
+    return read_at
+
+
+def is_s3_object_faststart(s3_url: str, s3_credential_id: int, db: Session) -> bool:
+    """Check with a few ranged reads whether an MP4 on S3 has its moov box before mdat."""
+    parsed = urlparse(s3_url)
+    bucket = parsed.netloc
+    key = parsed.path.lstrip("/")
+    s3 = get_cached_s3_client(s3_credential_id, db)
+    size = s3.head_object(Bucket=bucket, Key=key).get("ContentLength")
+    return is_faststart(_s3_range_reader(s3, bucket, key), size)
+
+
+def list_s3_objects(s3_url: str, s3_credential_id: int, db: Session, suffix: str = "") -> List[Dict]:
+    """
+    List the objects under an ``s3://bucket/prefix/`` URL.
+
+    Returns:
+        Dicts with ``s3_url``, ``key`` and ``size``, sorted by key; empty objects and
+        keys not ending in ``suffix`` are left out.
+    """
+    parsed = urlparse(s3_url)
+    bucket = parsed.netloc
+    prefix = parsed.path.lstrip("/")
+    s3 = get_cached_s3_client(s3_credential_id, db)
+    objects = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if obj["Size"] and obj["Key"].lower().endswith(suffix.lower()):
+                objects.append({"s3_url": f"s3://{bucket}/{obj['Key']}", "key": obj["Key"], "size": obj["Size"]})
+    return sorted(objects, key=lambda o: o["key"])
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a transfer callback to abort a download after another one failed."""
+
+
+def _download_one(s3, transfer: Dict, abort: threading.Event) -> Dict:
+    """Download and validate a single asset of a batch."""
+    parsed = urlparse(transfer["s3_url"])
+    bucket = parsed.netloc
+    key = parsed.path.lstrip("/")
+    destination = Path(transfer["destination"])
+    required = transfer.get("required", True)
+
+    if abort.is_set():
+        raise DownloadCancelled(f"Download of s3://{bucket}/{key} cancelled")
+
+    head = s3.head_object(Bucket=bucket, Key=key)
+    expected_size = head.get("ContentLength")
+    etag = head.get("ETag", "").strip('"')
+    if expected_size == 0:
+        if required:
+            raise FileNotFoundError(f"S3 object is empty: s3://{bucket}/{key}")
+        logger.warning(f"Skipping empty S3 object: s3://{bucket}/{key}")
+        return {**transfer, "valid": False, "size": 0}
+
+    if transfer.get("stream"):
+        source = s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=settings.S3_PRESIGNED_URL_EXPIRY
+        )
+        logger.info(f"🔗 Streaming s3://{bucket}/{key} ({expected_size} bytes) without a local copy")
+        return {**transfer, "valid": True, "size": expected_size, "source": source, "etag": etag}
+
+    def check_abort(_bytes_transferred):
+        if abort.is_set():
+            raise DownloadCancelled(f"Download of s3://{bucket}/{key} cancelled")
+
+    logger.info(f"⬇️ Downloading from s3://{bucket}/{key} to {destination}")
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    s3.download_file(bucket, key, str(destination), Callback=check_abort)
+
+    size = destination.stat().st_size if destination.exists() else 0
+    if size == 0 or (expected_size is not None and size != expected_size):
+        message = f"Downloaded {destination} is {size} bytes, expected {expected_size}"
+        if required:
+            raise FileNotFoundError(message)
+        logger.warning(message)
+        return {**transfer, "valid": False, "size": size}
+    return {**transfer, "valid": True, "size": size, "source": str(destination), "etag": etag}
+
+
+def download_many_from_s3(transfers: List[Dict], s3_credential_id: int, db: Session, max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Download several S3 objects concurrently with one credential lookup and one client.
+
+    Args:
+        transfers: Dicts with ``s3_url``, ``destination`` and optional ``required`` (default True).
+            With ``stream`` set the object is only validated and a presigned URL is returned
+            instead of downloading it. Extra keys are passed through to the result.
+        s3_credential_id: ID for S3 credentials.
+        db: Database session (only used from the calling thread, on a cache miss).
+        max_workers: Concurrent downloads, defaults to ``settings.S3_DOWNLOAD_CONCURRENCY``.
+
+    Returns:
+        The transfers, in input order, with ``valid``, ``size``, ``etag`` and ``source`` (local
+        path or presigned URL to hand to ffmpeg) added. Optional assets that came back missing
+        or empty have ``valid`` set to False.
+
+    Raises:
+        Exception: The first download error, or an empty/short required asset. Pending
+            downloads are cancelled as soon as one fails.
+    """
+    if not transfers:
+        return []
+
+    s3 = get_cached_s3_client(s3_credential_id, db)
+
+    abort = threading.Event()
+    started = time.monotonic()
+    workers = max(1, min(max_workers or settings.S3_DOWNLOAD_CONCURRENCY, len(transfers)))
+    with observe_stage("download"), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_download_one, s3, transfer, abort) for transfer in transfers]
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = next((f for f in futures if f in done and f.exception() is not None), None)
+        if failed is not None:
+            abort.set()
+            for future in pending:
+                future.cancel()
+            error = failed.exception()
+            logger.error(f"Asset download failed, cancelling {len(pending)} pending downloads: {error}")
+            if isinstance(error, ClientError):
+                _invalidate_on_auth_error(error, s3_credential_id)
+            raise error
+    results = [future.result() for future in futures]
+    downloaded = sum(item["size"] for item in results if item["valid"] and not item.get("stream"))
+    count_s3_bytes("download", downloaded)
+    record_s3_throughput("download", downloaded, time.monotonic() - started)
+    return results
+
+
+# Playlists and MPDs are committed after every segment they reference
+MANIFEST_SUFFIXES = (".m3u8", ".mpd")
+
+
+def _small_file_config() -> TransferConfig:
+    """Segments: single PUT, no per-file thread pool (parallelism comes from the upload workers)."""
+    return TransferConfig(multipart_threshold=settings.S3_MULTIPART_THRESHOLD, use_threads=False)
+
+
+def _large_file_config() -> TransferConfig:
+    """Large media/fragmented files: concurrent multipart parts."""
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.S3_MULTIPART_CONCURRENCY,
+        use_threads=True
+    )
+
+
+def is_manifest(path: Union[str, Path]) -> bool:
+    return str(path).lower().endswith(MANIFEST_SUFFIXES)
+
+
+def upload_file_with_retry(s3, local_path: Path, bucket: str, s3_key: str) -> int:
+    """Upload one file, retrying transient failures with exponential backoff. Returns bytes sent."""
+    size = local_path.stat().st_size
+    config = _small_file_config() if size < settings.S3_MULTIPART_THRESHOLD else _large_file_config()
+    attempts = max(1, settings.S3_UPLOAD_RETRIES + 1)
+    for attempt in range(1, attempts + 1):
+        try:
+            logger.debug(f"⬆️ Uploading file {local_path} to s3://{bucket}/{s3_key}")
+            s3.upload_file(str(local_path), bucket, s3_key, Config=config)
+            count_s3_bytes("upload", size)
+            return size
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in AUTH_ERROR_CODES or attempt == attempts:
+                raise
+            error = e
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            error = e
+        delay = settings.S3_UPLOAD_RETRY_BACKOFF * (2 ** (attempt - 1))
+        logger.warning(f"Upload of {local_path} failed (attempt {attempt}/{attempts}): {error}. Retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def upload_files_to_s3(s3, files: List[Tuple[Path, str]], bucket: str, max_workers: Optional[int] = None) -> Dict:
+    """
+    Upload (local_path, s3_key) pairs on a worker pool, manifests last.
+
+    Returns:
+        Summary dict with ``files``, ``bytes``, ``seconds`` and ``bytes_per_second``.
+
+    Raises:
+        Exception: The first upload failure. Remaining segments are cancelled and no
+            manifest is uploaded.
+    """
+    started = time.monotonic()
+    segments = [item for item in files if not is_manifest(item[0])]
+    manifests = [item for item in files if is_manifest(item[0])]
+    total_bytes = 0
+
+    for batch in (segments, manifests):
+        if not batch:
+            continue
+        workers = max(1, min(max_workers or settings.S3_UPLOAD_CONCURRENCY, len(batch)))
+        with observe_stage("upload", "manifests" if batch is manifests else "segments"), ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(upload_file_with_retry, s3, local_path, bucket, s3_key) for local_path, s3_key in batch]
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = next((f for f in futures if f in done and f.exception() is not None), None)
+            if failed is not None:
+                for future in pending:
+                    future.cancel()
+                raise failed.exception()
+            total_bytes += sum(future.result() for future in futures)
+
+    seconds = time.monotonic() - started
+    record_s3_throughput("upload", total_bytes, seconds)
+    return {
+        "files": len(files),
+        "manifests": len(manifests),
+        "bytes": total_bytes,
+        "seconds": round(seconds, 3),
+        "bytes_per_second": round(total_bytes / seconds, 1) if seconds > 0 else 0.0
+    }
+
+
 def upload_to_s3(path: str, s3_url: str, s3_credential_id: int, db: Session):
     """
     Upload a file or directory to S3.
@@ -176,6 +503,9 @@ def upload_to_s3(path: str, s3_url: str, s3_credential_id: int, db: Session):
         s3_url: S3 destination URL (e.g., s3://bucket/prefix/).
         s3_credential_id: ID for S3 credentials.
         db: Database session.
+
+    Returns:
+        Upload summary from ``upload_files_to_s3`` (file count, bytes, throughput).
         
     Raises:
         ValueError: If S3 URL is invalid.
@@ -188,12 +518,7 @@ def upload_to_s3(path: str, s3_url: str, s3_credential_id: int, db: Session):
         raise ValueError(f"Invalid S3 URL: {s3_url}")
     base_key = parsed.path.lstrip("/").rstrip("/")
 
-    credentials = get_s3_credentials_from_db(s3_credential_id, db)
-    s3 = get_s3_client(
-        aws_access_key_id=credentials["access_key"],
-        aws_secret_access_key=credentials["secret_key"],
-        region_name=credentials["region"]
-    )
+    s3 = get_cached_s3_client(s3_credential_id, db)
 
     path = Path(path)
     if not path.exists():
@@ -203,23 +528,30 @@ def upload_to_s3(path: str, s3_url: str, s3_credential_id: int, db: Session):
         if path.is_file():
             # Upload single file
             s3_key = f"{base_key}/{path.name}" if base_key else path.name
-            logger.info(f"⬆️ Uploading file {path} to s3://{bucket}/{s3_key}")
-            s3.upload_file(str(path), bucket, s3_key)
+            files = [(path, s3_key)]
         elif path.is_dir():
-            # Upload directory recursively
-            for root, _, files in os.walk(path):
-                for file in files:
-                    local_path = Path(root) / file
+            # Upload directory recursively, keeping the folder name in the key
+            files = []
+            for root, _, names in os.walk(path):
+                for name in names:
+                    local_path = Path(root) / name
                     relative_path = local_path.relative_to(path.parent)
-                    s3_key = f"{base_key}/{relative_path}".replace("\\", "/")
-                    logger.info(f"⬆️ Uploading file {local_path} to s3://{bucket}/{s3_key}")
-                    s3.upload_file(str(local_path), bucket, s3_key)
+                    files.append((local_path, f"{base_key}/{relative_path}".replace("\\", "/")))
         else:
             raise ValueError(f"Path is neither a file nor directory: {path}")
+
+        logger.info(f"⬆️ Uploading {len(files)} files from {path} to s3://{bucket}/{base_key}")
+        summary = upload_files_to_s3(s3, files, bucket)
+        logger.info(
+            f"✅ Uploaded {summary['files']} files ({summary['bytes'] / 1e6:.1f} MB) to {s3_url} "
+            f"in {summary['seconds']:.1f}s ({summary['bytes_per_second'] / 1e6:.2f} MB/s)"
+        )
+        return summary
     except ClientError as e:
         error_code = e.response['Error']['Code']
         logger.error(f"S3 ClientError uploading to {s3_url}: {error_code} - {e}")
+        _invalidate_on_auth_error(e, s3_credential_id)
         raise
     except Exception as e:
-        logger.error(f"Failed to upload {path} to s3://{bucket}/{s3_key}: {e}")
+        logger.error(f"Failed to upload {path} to s3://{bucket}/{base_key}: {e}")
         raise
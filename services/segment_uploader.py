@@ -0,0 +1,181 @@
+# worker/services/segment_uploader.py
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from services.s3_service import get_cached_s3_client, is_manifest, upload_files_to_s3, upload_file_with_retry
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentUploader:
+    """
+    Upload packaging output to S3 while the packager is still writing it.
+
+    A background thread polls ``watch_dir`` and uploads every non-manifest file
+    whose size and mtime have stopped changing. ``finish()`` re-uploads anything
+    that changed after it was sent, then commits the playlists/MPDs last, so the
+    published manifests only ever reference uploaded segments.
+
+    Keys match ``upload_to_s3`` for the same directory: ``<prefix>/<dir name>/<relative path>``.
+    """
+
+    def __init__(self, watch_dir: str, s3_url: str, s3_credential_id, db: Session,
+                 poll_interval: Optional[float] = None, settle_seconds: Optional[float] = None):
+        parsed = urlparse(s3_url)
+        if not parsed.netloc:
+            raise ValueError(f"Invalid S3 URL: {s3_url}")
+        self.bucket = parsed.netloc
+        self.base_key = parsed.path.lstrip("/").rstrip("/")
+        self.watch_dir = Path(watch_dir)
+        self.s3_url = s3_url
+        self.poll_interval = poll_interval if poll_interval is not None else settings.STREAMING_UPLOAD_POLL_INTERVAL
+        self.settle_seconds = settle_seconds if settle_seconds is not None else settings.STREAMING_UPLOAD_SETTLE_SECONDS
+        # Resolve the client on the calling thread; the DB session is not shared with workers
+        self.s3 = get_cached_s3_client(s3_credential_id, db)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool = ThreadPoolExecutor(max_workers=settings.S3_UPLOAD_CONCURRENCY)
+        self._lock = threading.Lock()
+        self._seen: Dict[Path, Tuple[int, int]] = {}
+        self._uploaded: Dict[Path, Tuple[int, int]] = {}
+        self._in_flight: Dict[Path, Tuple[int, int]] = {}
+        self._ignored: Dict[Path, Tuple[int, int]] = {}
+        self._bytes = 0
+        self._error: Optional[BaseException] = None
+        self._started_at = 0.0
+
+    def _key_for(self, local_path: Path) -> str:
+        relative_path = local_path.relative_to(self.watch_dir.parent)
+        return f"{self.base_key}/{relative_path}".replace("\\", "/")
+
+    def _snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        files = {}
+        if not self.watch_dir.exists():
+            return files
+        for root, _, names in os.walk(self.watch_dir):
+            for name in names:
+                if name.startswith("tmp"):
+                    continue  # Packager scratch files
+                local_path = Path(root) / name
+                try:
+                    stat = local_path.stat()
+                except FileNotFoundError:
+                    continue
+                files[local_path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def start(self) -> "SegmentUploader":
+        # Whatever is already on disk belongs to an earlier run; only upload it once it changes
+        self._ignored = self._snapshot()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"segment-uploader-{self.watch_dir.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"👀 Streaming upload of {self.watch_dir} to {self.s3_url} started")
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._poll()
+            except Exception as e:
+                logger.warning(f"Segment watcher scan of {self.watch_dir} failed: {e}")
+
+    def _poll(self) -> None:
+        now_ns = time.time_ns()
+        current = self._snapshot()
+        for local_path, version in current.items():
+            if is_manifest(local_path) or version[0] == 0:
+                continue
+            if self._ignored.get(local_path) == version:
+                continue
+            stable = self._seen.get(local_path) == version
+            settled = (now_ns - version[1]) / 1e9 >= self.settle_seconds
+            with self._lock:
+                already_sent = self._uploaded.get(local_path) == version or self._in_flight.get(local_path) == version
+            if stable and settled and not already_sent:
+                self._submit(local_path, version)
+        self._seen = current
+
+    def _submit(self, local_path: Path, version: Tuple[int, int]) -> None:
+        with self._lock:
+            self._in_flight[local_path] = version
+        future = self._pool.submit(upload_file_with_retry, self.s3, local_path, self.bucket, self._key_for(local_path))
+        future.add_done_callback(lambda f, p=local_path, v=version: self._on_done(f, p, v))
+
+    def _on_done(self, future, local_path: Path, version: Tuple[int, int]) -> None:
+        with self._lock:
+            self._in_flight.pop(local_path, None)
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Streaming upload of {local_path} failed: {error}")
+                if self._error is None:
+                    self._error = error
+                return
+            self._uploaded[local_path] = version
+            self._bytes += future.result()
+
+    def abort(self) -> None:
+        """Stop watching without committing manifests (packaging failed)."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        logger.info(f"Streaming upload of {self.watch_dir} aborted")
+
+    def finish(self) -> Dict:
+        """
+        Upload whatever is left, then the manifests.
+
+        Returns:
+            Summary dict with ``files``, ``bytes``, ``seconds``, ``bytes_per_second`` and
+            ``overlapped_files`` (segments already uploaded while packaging was running).
+
+        Raises:
+            FileNotFoundError: If the watched directory was never created.
+            Exception: The first upload failure.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._pool.shutdown(wait=True)
+        if self._error is not None:
+            raise self._error
+        if not self.watch_dir.exists():
+            raise FileNotFoundError(f"Path does not exist: {self.watch_dir}")
+
+        final = self._snapshot()
+        overlapped = sum(1 for p, v in final.items() if self._uploaded.get(p) == v)
+        remaining: List[Tuple[Path, str]] = [
+            (local_path, self._key_for(local_path))
+            for local_path, version in final.items()
+            if self._uploaded.get(local_path) != version
+        ]
+        tail = upload_files_to_s3(self.s3, remaining, self.bucket)
+
+        seconds = time.monotonic() - self._started_at
+        total_bytes = self._bytes + tail["bytes"]
+        summary = {
+            "files": len(final),
+            "manifests": tail["manifests"],
+            "overlapped_files": overlapped,
+            "bytes": total_bytes,
+            "seconds": round(seconds, 3),
+            "bytes_per_second": round(total_bytes / seconds, 1) if seconds > 0 else 0.0
+        }
+        logger.info(
+            f"✅ Streaming upload of {self.watch_dir} committed: {summary['files']} files, "
+            f"{overlapped} uploaded during packaging, {tail['files']} after"
+        )
+        return summary
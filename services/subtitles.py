@@ -0,0 +1,265 @@
+# worker/services/subtitles.py
+import codecs
+import logging
+import math
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import chardet
+
+from config.settings import settings
+from services.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_RE = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})")
+TIMING_RE = re.compile(rf"^\s*({TIMESTAMP_RE.pattern})\s*-->\s*({TIMESTAMP_RE.pattern})(.*)$")
+# SRT styling WebVTT doesn't understand: <font ...> tags and ASS overrides such as {\an8}
+UNSUPPORTED_TAGS_RE = re.compile(r"</?font[^>]*>|\{\\[^}]*\}", re.IGNORECASE)
+
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+# BOM-less UTF-16: share of 2-byte units whose high byte is NUL (SRT numbering and
+# timings are ASCII), and how much rarer NULs must be at the other position
+UTF16_MIN_NUL_RATIO = 0.25
+UTF16_MAX_OTHER_NUL_RATIO = 0.1
+
+
+@dataclass
+class Cue:
+    start: float
+    end: float
+    text: str
+    identifier: str = ""
+    settings: str = ""
+
+
+def parse_timestamp(value: str) -> float:
+    match = TIMESTAMP_RE.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    hours, minutes, seconds, millis = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+
+def format_timestamp(seconds: float) -> str:
+    millis = int(round(max(seconds, 0) * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def parse_timing_line(line: str) -> Optional[tuple]:
+    """``(start, end, cue settings)`` for a cue timing line, or None."""
+    match = TIMING_RE.match(line)
+    if not match:
+        return None
+    return parse_timestamp(match.group(1)), parse_timestamp(match.group(6)), match.group(11).strip()
+
+
+def iter_vtt_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """Parse WebVTT cues, skipping the header and NOTE/STYLE/REGION blocks."""
+    block: List[str] = []
+
+    def flush() -> Optional[Cue]:
+        for idx, line in enumerate(block[:2]):
+            timing = parse_timing_line(line)
+            if timing:
+                start, end, cue_settings = timing
+                identifier = block[0] if idx == 1 else ""
+                return Cue(start, end, "\n".join(block[idx + 1:]), identifier, cue_settings)
+        return None
+
+    for raw_line in lines:
+        line = raw_line.rstrip("\r\n").lstrip("\ufeff")
+        if line.strip():
+            block.append(line)
+            continue
+        if block:
+            cue = flush()
+            if cue:
+                yield cue
+            block = []
+    if block:
+        cue = flush()
+        if cue:
+            yield cue
+
+
+def read_vtt(vtt_path: str) -> List[Cue]:
+    with open(vtt_path, "r", encoding="utf-8-sig", errors="replace") as f:
+        return list(iter_vtt_cues(f))
+
+
+def format_cue(cue: Cue) -> str:
+    timing = f"{format_timestamp(cue.start)} --> {format_timestamp(cue.end)}"
+    if cue.settings:
+        timing += f" {cue.settings}"
+    lines = [cue.identifier] if cue.identifier else []
+    lines.extend([timing, cue.text])
+    return "\n".join(lines) + "\n\n"
+
+
+def segment_webvtt(vtt_path: str, output_dir: str, duration: float, hls_time: int = 6,
+                   mpegts_offset: Optional[int] = None) -> Path:
+    """
+    Split a WebVTT file into HLS segments and write their media playlist.
+
+    Cues are assigned to every ``hls_time`` window they overlap and keep their
+    original timestamps; each segment carries an ``X-TIMESTAMP-MAP`` tying local
+    time zero to the MPEG-TS timestamp the video segments start at. Every window
+    up to ``duration`` gets a segment (empty ones hold only the header) so players
+    never hit a gap in the playlist.
+
+    Args:
+        vtt_path: Source WebVTT file.
+        output_dir: Directory for ``playlist{i}.vtt`` segments and ``playlist.m3u8``.
+        duration: Programme duration in seconds; extended if cues run past it.
+        hls_time: Target segment duration in seconds.
+        mpegts_offset: 90 kHz timestamp of media time zero, defaults to
+            ``settings.HLS_SUBTITLE_MPEGTS_OFFSET``.
+
+    Returns:
+        Path to the written playlist.
+    """
+    if mpegts_offset is None:
+        mpegts_offset = settings.HLS_SUBTITLE_MPEGTS_OFFSET
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    cues = read_vtt(vtt_path)
+    total = max([duration or 0] + [cue.end for cue in cues])
+    count = max(1, math.ceil(total / hls_time))
+    windows: List[List[Cue]] = [[] for _ in range(count)]
+    for cue in cues:
+        if cue.end <= cue.start:
+            continue
+        first = int(cue.start // hls_time)
+        last = min(count - 1, int(math.ceil(cue.end / hls_time)) - 1)
+        for idx in range(first, last + 1):
+            windows[idx].append(cue)
+
+    header = f"WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:{mpegts_offset},LOCAL:00:00:00.000\n\n"
+    playlist = [
+        "#EXTM3U\n",
+        "#EXT-X-VERSION:6\n",
+        f"#EXT-X-TARGETDURATION:{hls_time}\n",
+        "#EXT-X-MEDIA-SEQUENCE:0\n",
+        "#EXT-X-PLAYLIST-TYPE:VOD\n"
+    ]
+    for idx, window in enumerate(windows):
+        segment_name = f"playlist{idx}.vtt"
+        with open(output_dir / segment_name, "w", encoding="utf-8") as f:
+            f.write(header)
+            f.writelines(format_cue(cue) for cue in window)
+        segment_duration = min(hls_time, total - idx * hls_time)
+        playlist.append(f"#EXTINF:{segment_duration:.6f},\n")
+        playlist.append(f"{segment_name}\n")
+    playlist.append("#EXT-X-ENDLIST\n")
+
+    playlist_path = output_dir / "playlist.m3u8"
+    with open(playlist_path, "w", encoding="utf-8") as f:
+        f.writelines(playlist)
+    logger.info(f"Segmented {vtt_path} into {count} WebVTT segments ({len(cues)} cues) at {playlist_path}")
+    return playlist_path
+
+
+def _utf16_without_bom(sample: bytes) -> Optional[str]:
+    """UTF-16 byte order of a BOM-less sample, judged by which byte of each unit is mostly NUL."""
+    units = len(sample) // 2
+    if units < 2:
+        return None
+    even_nuls = sample[0:units * 2:2].count(0)
+    odd_nuls = sample[1:units * 2:2].count(0)
+    if even_nuls >= units * UTF16_MIN_NUL_RATIO and odd_nuls <= even_nuls * UTF16_MAX_OTHER_NUL_RATIO:
+        encoding = "utf-16-be"
+    elif odd_nuls >= units * UTF16_MIN_NUL_RATIO and even_nuls <= odd_nuls * UTF16_MAX_OTHER_NUL_RATIO:
+        encoding = "utf-16-le"
+    else:
+        return None
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return None
+    return encoding
+
+
+def detect_encoding(path: str, sample_bytes: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Work out a subtitle file's text encoding from its first ``sample_bytes``.
+
+    A byte-order mark wins outright, then the NUL pattern of BOM-less UTF-16 (which
+    strict UTF-8 would accept as ASCII with NULs), then strict UTF-8, then chardet on
+    the sample; windows-1252 (decoded with replacement) is the last resort.
+
+    Returns:
+        ``(encoding, how)`` where ``how`` says which rule matched, for logging.
+    """
+    if sample_bytes is None:
+        sample_bytes = settings.SUBTITLE_DETECT_SAMPLE_BYTES
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, "bom"
+
+    encoding = _utf16_without_bom(sample)
+    if encoding:
+        return encoding, "utf-16 nul pattern"
+
+    try:
+        # The sample may end inside a multi-byte character, so don't finalise
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8", "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    result = chardet.detect(sample)
+    encoding = result.get("encoding")
+    if encoding and result.get("confidence", 0) >= 0.5:
+        try:
+            codecs.lookup(encoding)
+            return encoding, f"chardet {result['confidence']:.2f}"
+        except LookupError:
+            pass
+    return "windows-1252", "fallback"
+
+
+def iter_srt_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """Parse SRT blocks into cues; sequence numbers and positioning are dropped."""
+    for cue in iter_vtt_cues(lines):
+        text = UNSUPPORTED_TAGS_RE.sub("", cue.text).replace("-->", "->")
+        yield Cue(cue.start, cue.end, text)
+
+
+def convert_srt_to_vtt(srt_path: str, vtt_path: str) -> str:
+    """
+    Convert an SRT file to UTF-8 WebVTT, streaming one cue at a time.
+
+    Returns:
+        The encoding the SRT was read with.
+    """
+    encoding, how = detect_encoding(srt_path)
+    logger.info(f"Reading {srt_path} as {encoding} ({how})")
+    count = 0
+    with observe_stage("subtitle_convert"), \
+            open(srt_path, "r", encoding=encoding, errors="replace", newline=None) as src, \
+            open(vtt_path, "w", encoding="utf-8") as dst:
+        dst.write("WEBVTT\n\n")
+        for cue in iter_srt_cues(src):
+            if cue.end <= cue.start:
+                continue
+            dst.write(format_cue(cue))
+            count += 1
+    logger.info(f"Converted {srt_path} to WebVTT: {vtt_path} ({count} cues)")
+    return encoding
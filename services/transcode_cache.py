@@ -0,0 +1,188 @@
+# worker/services/transcode_cache.py
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config.settings import settings
+from core.checkpoint import digest_of
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link when source and destination share a filesystem, otherwise copy."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class TranscodeCache:
+    """
+    Local content-addressed store of transcode outputs shared by all jobs on the node.
+
+    Entries live in ``<root>/<key>/`` where the key hashes the source content and the
+    encoding parameters. Entries are published with an atomic rename, so a reader
+    never sees a partial entry, and evicted least-recently-used first once the
+    store exceeds ``max_bytes``.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def key(source_id: str, params: Dict) -> str:
+        return digest_of({"source": source_id, "params": params})
+
+    @contextmanager
+    def locked(self, key: str) -> Iterator[None]:
+        """Serialise work on one key so a second job waits for the first encode instead of repeating it."""
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            yield
+
+    @staticmethod
+    def _fingerprint(path: Path) -> Dict:
+        stat = path.stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _intact(self, entry: Path, meta: Dict) -> bool:
+        """Every file still has the size and mtime it was stored with (hard links can be rewritten in place)."""
+        fingerprints = meta.get("fingerprints", {})
+        for name in meta["files"]:
+            try:
+                if name not in fingerprints or self._fingerprint(entry / name) != fingerprints[name]:
+                    return False
+            except FileNotFoundError:
+                return False
+        return True
+
+    def lookup(self, key: str, dest_dir: str) -> Optional[List[str]]:
+        """
+        Materialise a cached entry into ``dest_dir``. Returns the restored paths, or None on a miss.
+
+        Call it inside ``locked(key)``: files are restored under the key's lock only, so a
+        slow cross-filesystem copy doesn't hold up other keys. Entries whose files changed
+        since they were stored are evicted.
+        """
+        entry = self.root / key
+        meta_path = entry / META_FILE
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            meta = None
+        except ValueError:
+            meta = {"files": []}  # Unreadable meta: treat like a modified entry
+        if meta is not None and not (meta["files"] and self._intact(entry, meta)):
+            logger.warning(f"Transcode cache entry {key[:12]} was modified, evicting it")
+            shutil.rmtree(entry, ignore_errors=True)
+            with self._lock:
+                self.stats["evictions"] += 1
+            meta = None
+        if meta is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            meta["last_used"] = time.time()
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        restored = []
+        try:
+            for name in meta["files"]:
+                _link_or_copy(entry / name, dest_dir / name)
+                restored.append(str(dest_dir / name).replace("\\", "/"))
+        except FileNotFoundError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        logger.info(f"🎯 Transcode cache hit {key[:12]}: restored {len(restored)} files into {dest_dir}")
+        return restored
+
+    def store(self, key: str, files: List[str]) -> None:
+        """Publish outputs under ``key``; an existing entry for the key is left as is."""
+        entry = self.root / key
+        staging = self.root / f".tmp-{uuid.uuid4().hex}"
+        staging.mkdir(parents=True)
+        try:
+            fingerprints = {}
+            for path in map(Path, files):
+                _link_or_copy(path, staging / path.name)
+                fingerprints[path.name] = self._fingerprint(staging / path.name)
+            size = sum(f["size"] for f in fingerprints.values())
+            meta = {"files": [Path(f).name for f in files], "fingerprints": fingerprints, "bytes": size,
+                    "created": time.time(), "last_used": time.time()}
+            (staging / META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+            with self._lock:
+                if entry.exists():
+                    return
+                os.rename(staging, entry)
+                self.stats["stores"] += 1
+            logger.info(f"Stored {len(files)} files ({size / 1e6:.1f} MB) in transcode cache {key[:12]}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def _entries(self) -> List[Dict]:
+        entries = []
+        for entry in self.root.iterdir():
+            meta_path = entry / META_FILE
+            if entry.name.startswith(".") or not meta_path.exists():
+                continue
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            entries.append({"path": entry, "bytes": meta.get("bytes", 0), "last_used": meta.get("last_used", 0)})
+        return entries
+
+    def evict(self) -> None:
+        """Drop least-recently-used entries until the store fits its byte budget."""
+        with self._lock:
+            if not self.root.exists():
+                return
+            entries = sorted(self._entries(), key=lambda e: e["last_used"])
+            total = sum(e["bytes"] for e in entries)
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                key_lock = self._key_locks.get(entry["path"].name)
+                if key_lock is not None and key_lock.locked():
+                    continue  # Being restored or built right now
+                shutil.rmtree(entry["path"], ignore_errors=True)
+                total -= entry["bytes"]
+                self.stats["evictions"] += 1
+                logger.info(f"Evicted transcode cache entry {entry['path'].name[:12]} ({entry['bytes'] / 1e6:.1f} MB)")
+
+    def usage(self) -> Dict:
+        with self._lock:
+            entries = self._entries() if self.root.exists() else []
+            return {
+                **self.stats,
+                "entries": len(entries),
+                "bytes": sum(e["bytes"] for e in entries),
+                "max_bytes": self.max_bytes
+            }
+
+
+transcode_cache = TranscodeCache(settings.TRANSCODE_CACHE_DIR, settings.TRANSCODE_CACHE_MAX_BYTES)
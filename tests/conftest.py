@@ -0,0 +1,14 @@
+# worker/tests/conftest.py
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Settings are read at import time: point the worker at throwaway storage before any module loads
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OUTPUT_DIR", tempfile.mkdtemp(prefix="drm-worker-tests-"))
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
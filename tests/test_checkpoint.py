@@ -0,0 +1,65 @@
+# worker/tests/test_checkpoint.py
+import hashlib
+import os
+
+import pytest
+
+import core.checkpoint
+from core.checkpoint import JobCheckpoint
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Paths sha256_file was called on; media above 64 bytes counts as large."""
+    calls = []
+    sha256_file = core.checkpoint.sha256_file
+    monkeypatch.setattr(core.checkpoint, "HASH_MAX_BYTES", 64)
+    monkeypatch.setattr(core.checkpoint, "sha256_file", lambda path: calls.append(path.name) or sha256_file(path))
+    return calls
+
+
+def test_large_outputs_are_fingerprinted_without_reading_them(tmp_path, hashed):
+    (tmp_path / "input.mp4").write_bytes(b"v" * 1000)
+    (tmp_path / "master.m3u8").write_text("#EXTM3U\n")
+    checkpoint = JobCheckpoint(tmp_path)
+    checkpoint.record("fetch", "key", outputs=[str(tmp_path / "input.mp4"), str(tmp_path / "master.m3u8")])
+
+    assert hashed == ["master.m3u8"]
+    assert JobCheckpoint(tmp_path).is_valid("fetch", "key")
+    assert hashed == ["master.m3u8"]
+
+
+def test_touched_outputs(tmp_path, hashed):
+    media, manifest = tmp_path / "input.mp4", tmp_path / "master.m3u8"
+    media.write_bytes(b"v" * 1000)
+    manifest.write_text("#EXTM3U\n")
+    checkpoint = JobCheckpoint(tmp_path)
+    checkpoint.record("package", "key", outputs=[str(manifest)])
+    checkpoint.record("fetch", "key", outputs=[str(media)])
+
+    os.utime(manifest, ns=(1, 1))  # Same content: the recorded hash proves it
+    assert checkpoint.is_valid("package", "key")
+    os.utime(media, ns=(1, 1))  # No hash to compare against: treated as changed
+    assert not checkpoint.is_valid("fetch", "key")
+
+
+def test_content_hash_is_computed_on_demand_and_remembered(tmp_path, hashed):
+    media = tmp_path / "input.mp4"
+    media.write_bytes(b"v" * 1000)
+    JobCheckpoint(tmp_path).record("fetch", "key", outputs=[str(media)])
+
+    expected = hashlib.sha256(b"v" * 1000).hexdigest()
+    assert JobCheckpoint(tmp_path).file_sha256("fetch", str(media)) == expected
+    assert JobCheckpoint(tmp_path).file_sha256("fetch", str(media)) == expected
+    assert hashed == ["input.mp4"]
+
+
+def test_no_content_hash_for_a_changed_file(tmp_path, hashed):
+    media = tmp_path / "en.wav"
+    media.write_bytes(b"a" * 1000)
+    checkpoint = JobCheckpoint(tmp_path)
+    checkpoint.record("fetch", "key", outputs=[str(media)])
+    media.write_bytes(b"b" * 999)
+
+    assert checkpoint.file_sha256("fetch", str(media)) is None
+    assert checkpoint.file_sha256("fetch", str(tmp_path / "unknown.wav")) is None
@@ -0,0 +1,20 @@
+# worker/tests/test_drm_service.py
+from types import SimpleNamespace
+
+import pytest
+
+import services.drm_service
+from services.drm_service import DRMService
+from services.probe import StreamInfo
+
+
+@pytest.mark.parametrize("profile, level, expected", [
+    ("Main", 31, "avc1.4d0031"),
+    ("Main", None, "avc1.64001f"),
+    ("", 31, "avc1.64001f"),
+    ("High", -99, "avc1.64001f"),
+])
+def test_video_codec_falls_back_without_profile_or_level(tmp_path, monkeypatch, profile, level, expected):
+    video = StreamInfo(index=0, codec_type="video", codec_name="h264", profile=profile, level=level)
+    monkeypatch.setattr(services.drm_service, "probe", lambda path: SimpleNamespace(video=video))
+    assert DRMService(str(tmp_path))._get_video_codec("output_720p.mp4") == expected
@@ -0,0 +1,80 @@
+# worker/tests/test_ffmpeg_service.py
+import math
+
+import pytest
+
+import services.ffmpeg_service
+from services.ffmpeg_service import _split_threads, select_ladder
+from services.probe import ProbeResult, StreamInfo
+
+LADDER = [
+    {"resolution": "1920x1080", "bitrate": "5000k"},
+    {"resolution": "1280x720", "bitrate": "2800k"},
+    {"resolution": "854x480", "bitrate": "1400k"},
+    {"resolution": "640x360", "bitrate": "800k"},
+]
+
+
+@pytest.fixture(autouse=True)
+def rung_demand(monkeypatch):
+    # Independent of the core budget of the machine running the tests: one thread per 360p worth of pixels
+    def threads_for_resolution(resolution):
+        width, height = (int(v) for v in resolution.split("x"))
+        return math.ceil(width * height / (640 * 360))
+    monkeypatch.setattr(services.ffmpeg_service, "threads_for_resolution", threads_for_resolution)
+
+
+@pytest.mark.parametrize("cores", [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 16])
+def test_split_threads_never_exceeds_cores(cores):
+    shares = _split_threads(LADDER, cores)
+    assert len(shares) == len(LADDER)
+    assert all(share >= 1 for share in shares)
+    assert sum(shares) <= max(cores, len(LADDER))
+
+
+def test_split_threads_gives_leftover_to_largest_rung():
+    shares = _split_threads(LADDER[:3], 5)
+    assert sum(shares) == 5
+    assert shares[0] == max(shares)
+
+
+def _source(width, height, bit_rate=None):
+    return ProbeResult(path="in.mp4", format_name="mov,mp4", duration=60.0, bit_rate=bit_rate, size=None,
+                       streams=[StreamInfo(index=0, codec_type="video", width=width, height=height, bit_rate=bit_rate)])
+
+
+def test_select_ladder_drops_rungs_above_the_source():
+    ladder = select_ladder(_source(1280, 720), cap_to_source_bitrate=False)
+    assert [rung["resolution"] for rung in ladder] == ["1280x720", "854x480", "640x360"]
+    assert ladder[0] == {"resolution": "1280x720", "bitrate": "2000k", "output_name": "output_720p.mp4"}
+
+
+def test_select_ladder_without_video_uses_every_rung():
+    assert len(select_ladder(None)) == 4
+
+
+def test_select_ladder_tiny_source_gets_one_even_rendition():
+    ladder = select_ladder(_source(321, 241), cap_to_source_bitrate=False)
+    assert ladder == [{"resolution": "320x240", "bitrate": "600k", "output_name": "output_240p.mp4"}]
+
+
+def test_select_ladder_caps_bitrate_to_the_source():
+    ladder = select_ladder(_source(1920, 1080, bit_rate=1_500_000), cap_to_source_bitrate=True)
+    assert [rung["bitrate"] for rung in ladder] == ["1500k", "1500k", "1000k", "600k"]
+
+
+def test_select_ladder_override_is_sorted_highest_first():
+    override = [{"resolution": "640x360", "bitrate": "0.5M"}, {"resolution": "1280x720", "bitrate": "2500k"}]
+    ladder = select_ladder(_source(1920, 1080), override, cap_to_source_bitrate=False)
+    assert [(rung["resolution"], rung["bitrate"]) for rung in ladder] == [("1280x720", "2500k"), ("640x360", "500k")]
+
+
+@pytest.mark.parametrize("override", [
+    [{"resolution": "1280x720"}],
+    [{"resolution": "wide", "bitrate": "1000k"}],
+    [{"resolution": "1280x0", "bitrate": "1000k"}],
+    [{"resolution": "1280x720", "bitrate": "1000k"}, {"resolution": "960x720", "bitrate": "800k"}],
+])
+def test_select_ladder_rejects_malformed_overrides(override):
+    with pytest.raises(ValueError):
+        select_ladder(None, override)
@@ -0,0 +1,121 @@
+# worker/tests/test_job_queue.py
+import sqlite3
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from config.settings import settings
+from core.job_queue import COMPLETED, QUEUED, RUNNING, JobQueue, QueueFullError, QueueUnavailableError
+
+
+class NeverAdmit:
+    def try_admit(self, job_id, payload):
+        return False
+
+    def release(self, job_id):
+        pass
+
+
+def _wait_for(queue, job_id, state, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if queue.get(job_id)["state"] == state:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} never reached {state}: {queue.get(job_id)}")
+
+
+def test_enqueue_before_start_is_unavailable(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3", handler=lambda payload: None, max_depth=4, max_workers=1)
+    with pytest.raises(QueueUnavailableError):
+        queue.enqueue("1", {})
+
+
+def test_full_queue_rejects_with_retry_after(tmp_path):
+    queue = JobQueue(tmp_path / "queue.sqlite3", handler=lambda payload: None, max_depth=1, max_workers=1,
+                     retry_after=7, admission=NeverAdmit(), poll_interval=0.01)
+    queue.start()
+    try:
+        assert queue.enqueue("1", {})["state"] == QUEUED
+        assert queue.enqueue("1", {})["state"] == QUEUED  # Duplicate submission is a no-op
+        with pytest.raises(QueueFullError) as e:
+            queue.enqueue("2", {})
+        assert (e.value.depth, e.value.retry_after) == (1, 7)
+    finally:
+        queue.stop()
+
+
+def test_restart_requeues_interrupted_jobs(tmp_path):
+    db_path = tmp_path / "queue.sqlite3"
+    first = JobQueue(db_path, handler=lambda payload: None, max_depth=4, max_workers=1,
+                     admission=NeverAdmit(), poll_interval=0.01)
+    first.start()
+    first.enqueue("1", {"job_id": "1"})
+    first.stop()
+    first._execute("UPDATE jobs SET state = ? WHERE job_id = ?", (RUNNING, "1"))  # Died mid-job
+
+    handled = []
+    second = JobQueue(db_path, handler=handled.append, max_depth=4, max_workers=1, poll_interval=0.01)
+    second.start()
+    try:
+        _wait_for(second, "1", COMPLETED)
+    finally:
+        second.stop()
+    assert handled == [{"job_id": "1"}]
+    assert second.get("1")["attempts"] == 1
+
+
+def test_dispatcher_survives_database_errors(tmp_path):
+    handled = []
+    queue = JobQueue(tmp_path / "queue.sqlite3", handler=handled.append, max_depth=4, max_workers=1,
+                     poll_interval=0.01, dispatch_backoff=0.01)
+    execute = queue._execute
+    failures = []
+
+    def flaky_execute(sql, params=()):
+        if sql.lstrip().startswith("UPDATE jobs SET state = ?, started_at") and not failures:
+            failures.append(sql)
+            raise sqlite3.OperationalError("database is locked")
+        return execute(sql, params)
+
+    queue._execute = flaky_execute
+    queue.start()
+    try:
+        queue.enqueue("1", {"job_id": "1"})
+        _wait_for(queue, "1", COMPLETED)
+    finally:
+        queue.stop()
+    assert failures and handled == [{"job_id": "1"}]
+    assert queue.running_count() == 0
+
+
+JOB = dict(job_id="42", content_id="c", client_id="c", s3_input_id="1", s3_output_id="1", is_paid=False,
+           upload_to_s3=False, s3_source="s3://media/in.mp4", s3_destination="s3://media/out/",
+           already_transcoded=False)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_QUEUE_PATH", tmp_path / "queue.sqlite3")
+    monkeypatch.setattr(main, "admission", NeverAdmit())
+    monkeypatch.setattr(main, "job_queue", None)
+    return TestClient(main.app)
+
+
+def test_run_job_answers_503_before_startup(api):
+    response = api.post("/api/run-job", json=JOB)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.JOB_QUEUE_RETRY_AFTER)
+
+
+def test_run_job_queues_then_answers_429_when_full(api, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_QUEUE_MAX_DEPTH", 1)
+    with api:
+        assert api.post("/api/run-job", json=JOB).json()["state"] == QUEUED
+        assert api.get("/api/jobs/42").json()["position"] == 1
+        response = api.post("/api/run-job", json={**JOB, "job_id": "43"})
+    assert response.status_code == 429
+    assert response.json()["queue_depth"] == 1
+    assert response.headers["Retry-After"] == str(settings.JOB_QUEUE_RETRY_AFTER)
@@ -0,0 +1,27 @@
+# worker/tests/test_metrics.py
+from prometheus_client import REGISTRY
+
+from services.metrics import add_stage_listener, observe_stage, remove_stage_listener, render_metrics
+
+
+def test_one_step_writing_several_rungs_times_each_rung():
+    seen = []
+    listener = lambda stage, rung, seconds: seen.append((stage, rung))
+    add_stage_listener(listener)
+    try:
+        with observe_stage("test_transcode", "1920x1080", "1280x720"):
+            pass
+        with observe_stage("test_probe"):
+            pass
+    finally:
+        remove_stage_listener(listener)
+    assert seen == [("test_transcode", "1920x1080"), ("test_transcode", "1280x720"), ("test_probe", "")]
+    for rung in ("1920x1080", "1280x720"):
+        labels = {"stage": "test_transcode", "rung": rung}
+        assert REGISTRY.get_sample_value("drm_worker_stage_seconds_count", labels) == 1
+
+
+def test_scratch_gauge_reports_workspace_bytes():
+    body, _ = render_metrics()
+    assert b"drm_worker_scratch_disk_bytes " in body
+    assert b'drm_worker_output_filesystem_bytes{kind="free"}' in body
@@ -0,0 +1,128 @@
+# worker/tests/test_notify_controller.py
+import threading
+import time
+
+import requests
+
+from services.notify_controller import ControllerNotifier
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Records posts and answers them from a scripted list of status codes (or exceptions)."""
+
+    def __init__(self, responses=(), gate=None):
+        self.responses = list(responses)
+        self.gate = gate
+        self.posts = []
+
+    def post(self, url, json=None, timeout=None):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.posts.append((url, json))
+        result = self.responses.pop(0) if self.responses else 200
+        if isinstance(result, Exception):
+            raise result
+        return FakeResponse(result)
+
+
+def _notifier(session, **kwargs):
+    notifier = ControllerNotifier(base_url="http://controller", backoff=0, **kwargs)
+    notifier._session = session
+    return notifier
+
+
+def test_queued_progress_updates_coalesce_behind_status():
+    gate = threading.Event()
+    session = FakeSession(gate=gate)
+    notifier = _notifier(session)
+
+    notifier.submit("1", "status", {"status": "processing"})
+    for percent in (10, 20, 30):
+        notifier.submit("1", "progress", {"progress": percent})
+    gate.set()
+
+    assert notifier.flush("1", timeout=5)
+    assert [payload for _, payload in session.posts] == [{"status": "processing"}, {"progress": 30}]
+    assert session.posts[1][0] == "http://controller/queue/1/progress"
+    assert notifier.snapshot()["coalesced"] == 2
+
+
+def test_status_is_never_coalesced_into_progress():
+    gate = threading.Event()
+    session = FakeSession(gate=gate)
+    notifier = _notifier(session)
+
+    notifier.submit("1", "progress", {"progress": 0})
+    notifier.submit("1", "progress", {"progress": 50})
+    notifier.submit("1", "status", {"status": "completed"})
+    notifier.submit("1", "progress", {"progress": 100})
+    gate.set()
+
+    assert notifier.flush(timeout=5)
+    kinds = [url.rsplit("/", 1)[1] for url, _ in session.posts]
+    assert kinds[-2:] == ["status", "progress"]
+    assert session.posts[-1][1] == {"progress": 100}
+
+
+def test_transient_failures_are_retried_until_delivered():
+    session = FakeSession([503, requests.ConnectionError("refused"), 429, 200])
+    notifier = _notifier(session, retries=3)
+
+    notifier.submit("1", "status", {"status": "completed"})
+
+    assert notifier.flush("1", timeout=5)
+    assert len(session.posts) == 4
+    stats = notifier.snapshot()
+    assert (stats["retried"], stats["sent"], stats["failed"]) == (3, 1, 0)
+
+
+def test_retries_give_up_and_client_errors_are_not_retried():
+    session = FakeSession([500, 500, 404])
+    notifier = _notifier(session, retries=1)
+
+    notifier.submit("1", "status", {"status": "failed"})
+    notifier.submit("2", "status", {"status": "failed"})
+
+    assert notifier.flush(timeout=5)
+    assert len(session.posts) == 3
+    stats = notifier.snapshot()
+    assert (stats["retried"], stats["sent"], stats["failed"]) == (1, 0, 2)
+    assert stats["jobs_pending"] == 0
+
+
+def test_flush_times_out_while_updates_are_stuck():
+    gate = threading.Event()
+    session = FakeSession(gate=gate)
+    notifier = _notifier(session)
+
+    notifier.submit("1", "status", {"status": "processing"})
+
+    assert not notifier.flush("1", timeout=0.05)
+    assert notifier.flush("2", timeout=0.05)
+    gate.set()
+    assert notifier.flush("1", timeout=5)
+
+
+def test_full_outbox_drops_progress_before_status():
+    gate = threading.Event()
+    session = FakeSession(gate=gate)
+    notifier = _notifier(session, max_outbox=2)
+
+    notifier.submit("1", "status", {"status": "processing"})
+    # Wait until the (blocked) sender has taken the first entry off the outbox.
+    deadline = time.monotonic() + 5
+    while notifier.snapshot()["outbox"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    notifier.submit("2", "progress", {"progress": 10})
+    notifier.submit("3", "status", {"status": "processing"})
+    notifier.submit("4", "status", {"status": "processing"})
+    gate.set()
+
+    assert notifier.flush(timeout=5)
+    assert [url.rsplit("/", 2)[1] for url, _ in session.posts] == ["1", "3", "4"]
+    assert notifier.snapshot()["dropped"] == 1
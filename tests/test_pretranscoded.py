@@ -0,0 +1,33 @@
+# worker/tests/test_pretranscoded.py
+import subprocess
+from types import SimpleNamespace
+
+import services.pretranscoded
+from services.pretranscoded import prepare_renditions
+
+
+def test_failed_remux_falls_back_and_removes_partial_outputs(tmp_path, monkeypatch):
+    sources = []
+    for height in (1080, 720):
+        path = tmp_path / f"{height}.mp4"
+        path.write_bytes(b"v" * height)
+        sources.append(str(path))
+    heights = {source: int(source.rsplit("/", 1)[-1].split(".")[0]) for source in sources}
+
+    def fake_probe(path):
+        return SimpleNamespace(video=SimpleNamespace(height=heights[path]), has_audio=True)
+
+    def fake_run_ffmpeg(cmd, *args, **kwargs):
+        with open(cmd[-1], "wb") as f:
+            f.write(b"partial")
+        if "720" in cmd[3]:
+            raise subprocess.CalledProcessError(1, cmd, stderr="moov atom not found")
+
+    monkeypatch.setattr(services.pretranscoded, "probe", fake_probe)
+    monkeypatch.setattr(services.pretranscoded, "check_renditions", lambda paths: None)
+    monkeypatch.setattr(services.pretranscoded, "run_ffmpeg", fake_run_ffmpeg)
+    transcoding_dir = tmp_path / "transcoded"
+    transcoding_dir.mkdir()
+
+    assert prepare_renditions(sources, str(transcoding_dir)) is None
+    assert list(transcoding_dir.iterdir()) == []
@@ -0,0 +1,21 @@
+# worker/tests/test_probe.py
+import subprocess
+
+import pytest
+
+from services.ffmpeg_service import get_video_stream_info, has_audio_stream, validate_input_file
+from services.probe import probe
+
+
+def test_missing_file_fails_like_ffprobe(tmp_path):
+    missing = str(tmp_path / "missing.mp4")
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        probe(missing)
+    assert "missing.mp4" in e.value.stderr
+
+
+def test_helpers_return_failure_values_for_missing_file(tmp_path):
+    missing = str(tmp_path / "missing.mp4")
+    assert has_audio_stream(missing) is False
+    assert get_video_stream_info(missing) == {"pix_fmt": "", "profile": ""}
+    assert validate_input_file(missing) is False
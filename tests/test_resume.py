@@ -0,0 +1,111 @@
+# worker/tests/test_resume.py
+from types import SimpleNamespace
+
+import pytest
+
+import core.processor
+import core.progress
+from core.checkpoint import JobCheckpoint
+from core.processor import DRMProcessor
+from core.workspace import JobWorkspace, WorkspaceManager
+
+
+class StubProcessor(DRMProcessor):
+    """Pipeline whose stages write small files instead of downloading and encoding."""
+
+    def __init__(self, workspace: JobWorkspace, fail_package: bool):
+        self.job = SimpleNamespace(
+            job_id="resume", s3_source="s3://bucket/input.mp4", s3_destination="s3://bucket/out/",
+            is_paid=False, package_cmaf=False, ladder=None, already_transcoded=False, upload_to_s3=False,
+        )
+        self.workspace = workspace
+        self.output_dir = workspace.root
+        self.audio_tracks = []
+        self.subtitle_tracks = []
+        self.output_credential_id = None
+        self.checkpoint = JobCheckpoint(workspace.root)
+        self.state = {}
+        self.completed_stages = set()
+        self.progress = core.progress.JobProgress(self.job.job_id)
+        self.fail_package = fail_package
+        self.ran = []
+
+    _mp4_audio = False
+    _fragmented_mp4 = False
+
+    def _write(self, name: str) -> str:
+        path = self.workspace.root / name
+        path.write_text(name)
+        return str(path)
+
+    def _stage_fetch(self):
+        self.ran.append("fetch")
+        return {"outputs": [self._write("input.mp4")], "data": {"video_source": "input.mp4", "video_duration": 12.5}}
+
+    def _stage_subtitles(self):
+        self.ran.append("subtitles")
+        return {"outputs": [self._write("en.vtt")], "data": {"vtt_paths": ["en.vtt"]}}
+
+    def _stage_transcode(self):
+        self.ran.append("transcode")
+        return {"outputs": [self._write("output_720p.mp4")], "data": {"transcoded_files": ["output_720p.mp4"]}}
+
+    def _stage_package(self):
+        self.ran.append("package")
+        assert self.state["video_duration"] == 12.5
+        assert self.state["transcoded_files"] and self.state["vtt_paths"]
+        if self.fail_package:
+            raise RuntimeError("DRM/HLS processing failed")
+        return {"outputs": [self._write("master.m3u8")]}
+
+    def _stage_upload(self):
+        self.ran.append("upload")
+        return {"outputs": []}
+
+
+@pytest.fixture(autouse=True)
+def no_controller(monkeypatch):
+    monkeypatch.setattr(core.progress, "update_progress", lambda *args, **kwargs: None)
+
+
+def test_retry_after_package_failure_resumes_from_checkpoints(tmp_path):
+    workspace = JobWorkspace("resume", tmp_path / "job_resume", tmp_path / "job_resume")
+
+    first = StubProcessor(workspace, fail_package=True)
+    with pytest.raises(RuntimeError):
+        first._materialize("upload")
+    assert first.ran == ["fetch", "subtitles", "transcode", "package"]
+
+    retry = StubProcessor(workspace, fail_package=False)
+    retry._materialize("upload")
+    assert retry.ran == ["package", "upload"]
+    assert retry.state["video_duration"] == 12.5
+
+
+class FakeUploader:
+    aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+def test_failed_job_aborts_streaming_uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.processor, "update_status", lambda *args: None)
+    monkeypatch.setattr(core.processor, "flush_notifications", lambda *args: None)
+    monkeypatch.setattr(core.processor, "workspace_manager", WorkspaceManager(tmp_path))
+    monkeypatch.setattr(core.processor, "get_db", lambda: iter([SimpleNamespace(
+        query=lambda model: SimpleNamespace(filter=lambda *args: SimpleNamespace(all=lambda: [])),
+        close=lambda: None,
+    )]))
+    uploader = FakeUploader()
+
+    def materialize(self, stage):
+        self.segment_uploaders = [uploader]  # Packaging started streaming, then a later step failed
+        raise RuntimeError("upload failed")
+
+    monkeypatch.setattr(DRMProcessor, "_materialize", materialize)
+    job = SimpleNamespace(job_id="7", s3_source="s3://bucket/in.mp4", s3_destination="s3://bucket/out/",
+                          s3_input_id=1, s3_output_id=1, upload_to_s3=True)
+    with pytest.raises(RuntimeError):
+        DRMProcessor().process(job)
+    assert uploader.aborted
@@ -0,0 +1,72 @@
+# worker/tests/test_s3_download.py
+import pytest
+
+moto = pytest.importorskip("moto")
+
+import boto3
+
+import services.s3_service
+from core.database import Base, SessionLocal, engine
+from core.models import S3Credential
+from services.s3_service import download_many_from_s3, invalidate_s3_cache, list_s3_objects
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    session.add(S3Credential(id=1, access_key="testing", secret_key="testing", region="us-east-1"))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine)
+    invalidate_s3_cache()
+
+
+@pytest.fixture
+def bucket():
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="media")
+        s3.put_object(Bucket="media", Key="title/renditions/1080p.mp4", Body=b"a" * 2048)
+        s3.put_object(Bucket="media", Key="title/renditions/720p.mp4", Body=b"b" * 1024)
+        s3.put_object(Bucket="media", Key="title/renditions/notes.txt", Body=b"skip me")
+        s3.put_object(Bucket="media", Key="title/renditions/empty.mp4", Body=b"")
+        yield "media"
+
+
+def test_download_prefix_into_missing_directory(tmp_path, db, bucket):
+    objects = list_s3_objects(f"s3://{bucket}/title/renditions/", 1, db, suffix=".mp4")
+    assert [obj["key"] for obj in objects] == ["title/renditions/1080p.mp4", "title/renditions/720p.mp4"]
+
+    renditions_dir = tmp_path / "job_1" / "renditions"
+    transfers = [{"s3_url": obj["s3_url"], "destination": str(renditions_dir / obj["key"].rsplit("/", 1)[-1])}
+                 for obj in objects]
+    results = download_many_from_s3(transfers, 1, db)
+
+    assert all(item["valid"] for item in results)
+    assert [item["size"] for item in results] == [2048, 1024]
+    assert (renditions_dir / "1080p.mp4").read_bytes() == b"a" * 2048
+    assert (renditions_dir / "720p.mp4").stat().st_size == 1024
+
+
+def test_client_cache_builds_outside_the_lock(monkeypatch, db):
+    cache = services.s3_service._S3ClientCache(ttl_seconds=60)
+    lookups = []
+
+    def credentials_from_db(s3_credential_id, session):
+        assert not cache._lock.locked()
+        lookups.append(s3_credential_id)
+        return {"access_key": "testing", "secret_key": "testing", "region": "us-east-1"}
+
+    def client(**kwargs):
+        assert not cache._lock.locked()
+        return object()
+
+    monkeypatch.setattr(services.s3_service, "get_s3_credentials_from_db", credentials_from_db)
+    monkeypatch.setattr(services.s3_service, "get_s3_client", client)
+
+    first = cache.get_client(1, db)
+    assert cache.get_client(1, db) is first
+    assert lookups == [1]
+    assert cache.stats == {"credential_hits": 1, "credential_misses": 1, "client_hits": 1, "client_misses": 1}
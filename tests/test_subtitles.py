@@ -0,0 +1,71 @@
+# worker/tests/test_subtitles.py
+import pytest
+
+from services.subtitles import detect_encoding, segment_webvtt
+
+SRT = "1\n00:00:01,000 --> 00:00:02,500\nПривет, мир — «café»\n\n2\n00:00:03,000 --> 00:00:04,000\nSecond cue\n"
+
+
+@pytest.mark.parametrize("encoding", ["utf-16-le", "utf-16-be"])
+def test_detects_utf16_without_bom(tmp_path, encoding):
+    path = tmp_path / "en.srt"
+    path.write_bytes(SRT.encode(encoding))
+    assert detect_encoding(str(path)) == (encoding, "utf-16 nul pattern")
+    assert path.read_bytes().decode(detect_encoding(str(path))[0]) == SRT
+
+
+def test_utf8_is_not_mistaken_for_utf16(tmp_path):
+    path = tmp_path / "en.srt"
+    path.write_bytes(SRT.encode("utf-8"))
+    assert detect_encoding(str(path)) == ("utf-8", "utf-8")
+
+
+def test_odd_length_sample_of_utf16(tmp_path):
+    path = tmp_path / "en.srt"
+    path.write_bytes(SRT.encode("utf-16-le"))
+    assert detect_encoding(str(path), sample_bytes=41)[0] == "utf-16-le"
+
+
+VTT = """WEBVTT
+
+intro
+00:00:01.000 --> 00:00:02.000 align:start
+First cue
+
+00:00:05.500 --> 00:00:07.250
+Spans two segments
+
+00:00:14.000 --> 00:00:15.000
+Third segment
+"""
+
+
+def test_segment_webvtt_splits_cues_across_segments(tmp_path):
+    vtt = tmp_path / "en.vtt"
+    vtt.write_text(VTT, encoding="utf-8")
+    playlist = segment_webvtt(str(vtt), str(tmp_path / "sub_en"), duration=20, hls_time=6, mpegts_offset=900000)
+
+    segments = [(tmp_path / "sub_en" / f"playlist{idx}.vtt").read_text(encoding="utf-8") for idx in range(4)]
+    for segment in segments:
+        assert segment.startswith("WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:900000,LOCAL:00:00:00.000\n")
+    assert "First cue" in segments[0] and "align:start" in segments[0] and "intro" in segments[0]
+    # A cue overlapping a boundary is repeated in both windows with its original timing
+    assert "00:00:05.500 --> 00:00:07.250" in segments[0] and "00:00:05.500 --> 00:00:07.250" in segments[1]
+    assert "Third segment" in segments[2]
+    assert "-->" not in segments[3]  # Empty window up to the programme duration
+
+    lines = playlist.read_text(encoding="utf-8").splitlines()
+    assert lines[:3] == ["#EXTM3U", "#EXT-X-VERSION:6", "#EXT-X-TARGETDURATION:6"]
+    assert [line for line in lines if line.startswith("#EXTINF")] == [
+        "#EXTINF:6.000000,", "#EXTINF:6.000000,", "#EXTINF:6.000000,", "#EXTINF:2.000000,"
+    ]
+    assert lines[-1] == "#EXT-X-ENDLIST"
+
+
+def test_segment_webvtt_extends_past_duration_for_late_cues(tmp_path):
+    vtt = tmp_path / "en.vtt"
+    vtt.write_text("WEBVTT\n\n00:00:09.000 --> 00:00:13.000\nLate\n", encoding="utf-8")
+    playlist = segment_webvtt(str(vtt), str(tmp_path / "sub_en"), duration=8, hls_time=6)
+
+    assert playlist.read_text(encoding="utf-8").count("#EXTINF") == 3
+    assert "Late" in (tmp_path / "sub_en" / "playlist2.vtt").read_text(encoding="utf-8")
@@ -0,0 +1,88 @@
+# worker/tests/test_transcode_cache.py
+import os
+import subprocess
+
+import pytest
+
+import services.ffmpeg_service
+from services.ffmpeg_service import transcode_audio
+from services.transcode_cache import TranscodeCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TranscodeCache(tmp_path / "cache", max_bytes=10_000)
+
+
+def _outputs(directory, **files):
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, size in files.items():
+        path = directory / f"{name}.mp4"
+        path.write_bytes(b"v" * size)
+        paths.append(str(path))
+    return paths
+
+
+def test_store_then_lookup_restores_files(tmp_path, cache):
+    files = _outputs(tmp_path / "job_1", output_720p=1000, output_360p=500)
+    key = cache.key("sha:abc", {"ladder": "default"})
+    with cache.locked(key):
+        assert cache.lookup(key, str(tmp_path / "job_2")) is None
+        cache.store(key, files)
+
+    with cache.locked(key):
+        restored = cache.lookup(key, str(tmp_path / "job_2"))
+    assert [os.path.basename(p) for p in restored] == ["output_720p.mp4", "output_360p.mp4"]
+    assert (tmp_path / "job_2" / "output_720p.mp4").stat().st_size == 1000
+    assert cache.stats == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path, cache):
+    first, second, third = (cache.key(f"sha:{n}", {}) for n in range(3))
+    cache.store(first, _outputs(tmp_path / "a", output_720p=4000))
+    cache.store(second, _outputs(tmp_path / "b", output_720p=4000))
+    with cache.locked(first):
+        assert cache.lookup(first, str(tmp_path / "restore"))  # first is now the most recently used
+    cache.store(third, _outputs(tmp_path / "c", output_720p=4000))
+
+    assert (cache.root / first).exists()
+    assert not (cache.root / second).exists()
+    assert (cache.root / third).exists()
+    assert cache.usage()["bytes"] == 8000
+
+
+def test_entry_rewritten_through_a_hard_link_is_evicted(tmp_path, cache):
+    files = _outputs(tmp_path / "job_1", output_720p=1000)
+    key = cache.key("sha:abc", {})
+    cache.store(key, files)
+    # What "ffmpeg -y" onto the job's own output did: truncate and rewrite the shared inode
+    with open(files[0], "wb") as f:
+        f.write(b"other encode")
+
+    with cache.locked(key):
+        assert cache.lookup(key, str(tmp_path / "job_2")) is None
+    assert not (cache.root / key).exists()
+    assert cache.stats["evictions"] == 1
+
+
+def test_reencoding_does_not_touch_cached_audio(tmp_path, cache, monkeypatch):
+    def fake_run_ffmpeg(cmd, duration=None, on_progress=None):
+        for output in (arg for arg in cmd if arg.endswith(".aac")):
+            with open(output, "wb") as f:  # Like ffmpeg -y: rewrite in place
+                f.write(b"new encode")
+
+    def no_probe(path):
+        raise subprocess.CalledProcessError(1, "ffprobe")
+
+    monkeypatch.setattr(services.ffmpeg_service, "run_ffmpeg", fake_run_ffmpeg)
+    monkeypatch.setattr(services.ffmpeg_service, "probe", no_probe)
+    ladder = {"128k": ["-b:a", "128k", "-ac", "2"]}
+
+    outputs = transcode_audio("en.wav", str(tmp_path / "audio"), "en", isPaid=False, ladder=ladder)
+    key = cache.key("sha:en", {"ladder": ladder})
+    cache.store(key, list(outputs.values()))
+
+    transcode_audio("en.wav", str(tmp_path / "audio"), "en", isPaid=False, ladder=ladder)
+    with cache.locked(key):
+        assert cache.lookup(key, str(tmp_path / "job_2")) is not None
@@ -0,0 +1,25 @@
+# worker/tests/test_workspace.py
+from core.workspace import WorkspaceManager
+
+
+def _finished_job(root, job_id, size=1024):
+    job_dir = root / f"job_{job_id}"
+    job_dir.mkdir(parents=True)
+    (job_dir / "input.mp4").write_bytes(b"x" * size)
+    return job_dir
+
+
+def test_reclaim_keeps_excluded_and_pinned_jobs(tmp_path):
+    manager = WorkspaceManager(tmp_path)
+    finished = _finished_job(tmp_path, "finished")
+    admitted = _finished_job(tmp_path, "admitted")
+    queued = _finished_job(tmp_path, "queued")
+    manager.pinned = lambda: ["queued"]
+    running = manager.open("running")
+    (running.root / "input.mp4").write_bytes(b"x" * 1024)
+
+    freed = manager.reclaim(10 ** 9, exclude=["admitted"])
+
+    assert freed == 1024
+    assert not finished.exists()
+    assert admitted.exists() and queued.exists() and running.root.exists()